@@ -1,11 +1,19 @@
 from django.contrib import admin
+from app import history_cache
+from app.admin_paging import LargeTableAdmin
 from app.models.models_alarm import Alert
 from app.models.models_telemetry import Telemetry
 from app.models.model_firefighter import Firefighter
+from app.models.models_occupancy import OccupancySnapshot
+from app.models.models_beacon import Beacon
+from app.models.models_zone import Zone
+from app.models.models_incident import Incident
+from app.models.models_archive import ArchiveSegment
+from app.models.models_checkpoint import IngestCheckpoint
 
 
 @admin.register(Telemetry)
-class TelemetryAdmin(admin.ModelAdmin):
+class TelemetryAdmin(LargeTableAdmin):
     list_display = (
         "id",
         "type",
@@ -16,13 +24,15 @@ class TelemetryAdmin(admin.ModelAdmin):
         "heading_deg",
         "position"
     )
-    list_filter = ("type", "firefighter", "timestamp")
-    search_fields = ("tag_id", "firefighter__name")
-    ordering = ("-timestamp",)
+    list_select_related = ("firefighter", "position")
+    # Czas - przez date_hierarchy; filtr "type" robiłby DISTINCT po całej tabeli
+    list_filter = ("firefighter",)
+    # Tag dokładnie (indeks tag_id + timestamp), nazwisko przez małą tabelę strażaków
+    search_fields = ("=tag_id", "firefighter__name")
 
 
 @admin.register(Alert)
-class AlertAdmin(admin.ModelAdmin):
+class AlertAdmin(LargeTableAdmin):
     list_display = (
         "id",
         "alert_type",
@@ -34,11 +44,70 @@ class AlertAdmin(admin.ModelAdmin):
         "acknowledged",
         "position"
     )
+    list_select_related = ("firefighter", "position")
     list_filter = ("severity", "alert_type", "resolved", "acknowledged")
     search_fields = ("id", "tag_id", "alert_type", "firefighter__name")
-    ordering = ("-timestamp",)
+
+    # Zmiana alertu w adminie unieważnia historię alertów jego tagu (app/history_cache.py)
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        history_cache.bump({obj.tag_id: obj.firefighter_id})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        history_cache.bump({obj.tag_id: obj.firefighter_id})
+
+    def delete_queryset(self, request, queryset):
+        tags = dict(queryset.values_list('tag_id', 'firefighter_id'))
+        super().delete_queryset(request, queryset)
+        history_cache.bump(tags)
+
 
 @admin.register(Firefighter)
 class FirefighterAdmin(admin.ModelAdmin):
     list_display = ("id", "name")
     search_fields = ("name",)
+
+
+@admin.register(OccupancySnapshot)
+class OccupancySnapshotAdmin(admin.ModelAdmin):
+    list_display = ("id", "floor", "start", "end", "rows", "cols")
+    list_filter = ("floor",)
+    exclude = ("data",)
+    ordering = ("-start",)
+
+
+@admin.register(Beacon)
+class BeaconAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "floor", "range_count", "los_ratio", "mean_rssi_dbm", "last_seen")
+    list_filter = ("floor", "type")
+    search_fields = ("id", "name")
+
+
+@admin.register(Zone)
+class ZoneAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "floor", "zone_type", "severity", "max_dwell_s", "active")
+    list_filter = ("floor", "zone_type", "active")
+    search_fields = ("name",)
+
+
+@admin.register(Incident)
+class IncidentAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "started_at", "ended_at", "opened_manually", "frame_count")
+    list_filter = ("opened_manually",)
+    search_fields = ("name",)
+    ordering = ("-started_at",)
+
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ("id", "tag_id", "day", "rows", "size_bytes", "start", "end")
+    search_fields = ("tag_id",)
+    ordering = ("-day",)
+
+
+@admin.register(IngestCheckpoint)
+class IngestCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("tag_id", "timestamp", "sequence", "updated_at")
+    search_fields = ("tag_id",)
+    ordering = ("tag_id",)
@@ -0,0 +1,186 @@
+# app/admin_paging.py
+"""
+Listy admina dla dużych tabel (Telemetry, Alert - miliony wierszy).
+
+Domyślna lista admina robi dwa pełne COUNT(*), DISTINCT po wszystkich
+datach dla date_hierarchy i OFFSET przy dalekich stronach. Tutaj:
+- liczba wyników jest dokładna tylko do ADMIN_EXACT_COUNT_LIMIT, powyżej
+  (bez filtrów) szacowana ze statystyk bazy,
+- date_hierarchy sonduje indeks czasu (EXISTS na każdy rok / miesiąc / dzień),
+- "Starsze »" przewija listę kursorem (czas, id) ostatniego wiersza zamiast OFFSET.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import F, Max, Min, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_VAR = 'cursor'
+
+
+def table_estimate(model, using='default'):
+    """Przybliżona liczba wierszy tabeli bez jej skanowania."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+        elif connection.vendor == 'sqlite':
+            # Statystyki są tylko po ANALYZE (PRAGMA optimize)
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+            except DatabaseError:
+                row = None
+            if row:
+                return int(row[0].split()[0])
+    # Rozpiętość kluczy - dwa odczyty z indeksu głównego, zawyżona o usunięte wiersze
+    bounds = model._default_manager.using(using).aggregate(low=Min('pk'), high=Max('pk'))
+    return bounds['high'] - bounds['low'] + 1 if bounds['high'] is not None else 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Liczy dokładnie co najwyżej ADMIN_EXACT_COUNT_LIMIT + 1 wierszy (COUNT z LIMIT).
+    Większa lista bez filtrów dostaje liczbę szacowaną, z filtrami - ucięta do limitu
+    (dalsze wiersze są osiągalne kursorem).
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        exact = queryset.order_by()[:limit + 1].count()
+        if exact <= limit or queryset.query.where:
+            return exact
+        return max(table_estimate(queryset.model, queryset.db), exact)
+
+
+def period_start(value, kind):
+    return value.replace(
+        month=1 if kind == 'year' else value.month, day=1 if kind in ('year', 'month') else value.day,
+        hour=0, minute=0, second=0, microsecond=0,
+    )
+
+
+def next_period(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start + timedelta(days=1)
+
+
+class ProbedDatesQuerySet(QuerySet):
+    """
+    `datetimes()` dla date_hierarchy bez DISTINCT po wszystkich wierszach:
+    zakres z MIN / MAX, potem jedno EXISTS (zakres na indeksie czasu) na każdy okres.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        """
+        Same MIN / MAX pól (tak liczy zakres tag date_hierarchy) jako osobne odczyty
+        skrajnych wierszy indeksu - SQLite nie optymalizuje MIN i MAX w jednym zapytaniu.
+        """
+        fields = {
+            alias: (aggregate.source_expressions[0].name, isinstance(aggregate, Max))
+            for alias, aggregate in kwargs.items()
+            if type(aggregate) in (Min, Max) and isinstance(aggregate.source_expressions[0], F)
+            and not aggregate.filter
+        }
+        if args or not kwargs or len(fields) < len(kwargs):
+            return super().aggregate(*args, **kwargs)
+        return {
+            alias: self.filter(**{f'{name}__isnull': False}).order_by(f'-{name}' if last else name)
+            .values_list(name, flat=True).first()
+            for alias, (name, last) in fields.items()
+        }
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        first, last = bounds['first'], bounds['last']
+        if settings.USE_TZ:
+            tz = tzinfo or timezone.get_current_timezone()
+            first, last = timezone.localtime(first, tz), timezone.localtime(last, tz)
+        periods = []
+        start = period_start(first, kind)
+        while start <= last:
+            end = next_period(start, kind)
+            # Zakres okresu na początku WHERE: SQLite przeszukuje indeks pierwszą parą warunków
+            # na kolumnie, a lista ma już szerszy zakres (rok / miesiąc wybrany w date_hierarchy)
+            period = QuerySet(self.model, using=self.db).filter(**{f'{field_name}__gte': start, f'{field_name}__lt': end})
+            if (period & self).exists():
+                periods.append(start)
+            start = end
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class CursorFilter(admin.SimpleListFilter):
+    """
+    Wiersze starsze niż kursor `czas,id` (kolejność listy: od najnowszych).
+    Zawężenie zakresem na indeksie czasu, więc koszt nie rośnie z głębokością jak OFFSET.
+    """
+    title = 'przewijanie'
+    parameter_name = CURSOR_VAR
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.field = model_admin.date_hierarchy
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        return [(value, f"od {value.rsplit(',', 1)[0]}")] if value else []
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            value, pk = self.value().rsplit(',', 1)
+            timestamp, pk = parse_datetime(value), int(pk)
+        except ValueError:
+            return queryset
+        if timestamp is None:
+            return queryset
+        return queryset.filter(**{f'{self.field}__lte': timestamp}).exclude(**{self.field: timestamp, 'pk__gte': pk})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Admin listy dużej tabeli z kolumną czasu `date_hierarchy`. Sortowanie po kolumnach
+    jest wyłączone - lista zawsze idzie od najnowszych po indeksie czasu.
+    """
+    date_hierarchy = 'timestamp'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    sortable_by = ()
+    change_list_template = 'admin/large_change_list.html'
+
+    def get_ordering(self, request):
+        return ('-' + self.date_hierarchy, '-pk')
+
+    def get_queryset(self, request):
+        queryset = ProbedDatesQuerySet(self.model)
+        return queryset.order_by(*self.get_ordering(request))
+
+    def get_list_filter(self, request):
+        return (*super().get_list_filter(request), CursorFilter)
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        cl = getattr(response, 'context_data', {}).get('cl')
+        # result_list to wycinek querysetu - len() go wykonuje, szablon użyje tej samej kopii wyników
+        if cl is not None and ORDER_VAR not in request.GET and len(cl.result_list) >= cl.list_per_page:
+            last = list(cl.result_list)[-1]
+            cursor = f"{getattr(last, self.date_hierarchy).isoformat()},{last.pk}"
+            response.context_data['next_cursor_url'] = cl.get_query_string({CURSOR_VAR: cursor}, [PAGE_VAR])
+        return response
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class AppConfig(AppConfig):
     name = 'app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from app import timing
+        connection_created.connect(timing.install, dispatch_uid='app.timing.install')
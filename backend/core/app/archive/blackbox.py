@@ -0,0 +1,292 @@
+# archive/blackbox.py
+"""
+Binarny format "czarnej skrzynki" - strumień telemetrii jednego tagu w jednym pliku.
+
+Układ pliku (little-endian):
+    nagłówek   HEADER (magic, wersja, rozmiar chunku, tag, strażak, liczba rekordów,
+               offset indeksu, offset i długość metadanych)
+    chunki     każdy: liczba rekordów, katalog kolumn (pierwsza wartość, baza, szerokość)
+               i kolumny jedna po drugiej; kolumna z brakami (NULL) poprzedzona jest
+               bitmapą braków (np.packbits), a szerokość ma wtedy ustawiony bit NULLS
+    indeks     INDEX_DTYPE na chunk: offset, pierwszy i ostatni znacznik czasu, liczba rekordów
+    metadane   JSON: słowniki kolumn kategorycznych
+
+Czas i pozycje kodowane są różnicowo, pozostałe wartości kwantyzowane do liczb
+całkowitych. W obrębie chunku każda kolumna zapisywana jest względem swojego
+minimum (frame-of-reference) na najmniejszej wystarczającej szerokości (1-8 B).
+Braki w kolumnie liczbowej wypełniane są sąsiednią wartością (żeby nie psuć delt)
+i odtwarzane z bitmapy przy odczycie jako NaN (`read`) albo None (`records`).
+Czytanie odbywa się przez mmap, a indeks chunków pozwala przeskoczyć do zakresu czasu.
+"""
+import json
+import math
+import mmap
+import struct
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+
+MAGIC = b'PSPBBX\x00\x01'
+VERSION = 2
+VERSIONS = (1, 2)     # wersja 1 nie ma bitmap braków
+HEADER = struct.Struct('<8sHI32s32sQQQI')
+CHUNK = struct.Struct('<I')
+COLUMN = struct.Struct('<qqB')
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('first_ms', '<i8'), ('last_ms', '<i8'), ('rows', '<u4')])
+
+# nazwa, ścieżka ORM, skala kwantyzacji, kodowanie różnicowe
+FIELDS = (
+    ('timestamp_ms', 'timestamp', 1, True),
+    ('x', 'position__x', 1000, True),
+    ('y', 'position__y', 1000, True),
+    ('z', 'position__z', 1000, True),
+    ('floor', 'position__floor', 1, False),
+    ('heading_deg', 'heading_deg', 10, False),
+    ('accuracy_m', 'position__accuracy_m', 100, False),
+    ('heart_rate', 'vitals__heart_rate_bpm', 1, False),
+    ('hrv', 'vitals__heart_rate_variability_ms', 1, False),
+    ('skin_temperature', 'vitals__skin_temperature_c', 100, False),
+    ('scba_pressure', 'scba__cylinder_pressure_bar', 1, False),
+)
+CATEGORICAL = (
+    ('motion_state', 'vitals__motion_state'),
+    ('stress_level', 'vitals__stress_level'),
+)
+VALUES = tuple(path for _, path, _, _ in FIELDS) + tuple(path for _, path in CATEGORICAL)
+
+WIDTHS = (np.uint8, np.uint16, np.uint32, np.uint64)
+NULLS = 0x80    # bit w kodzie szerokości: kolumna ma bitmapę braków
+
+
+class BlackBoxError(ValueError):
+    pass
+
+
+def width_code(span):
+    for code, dtype in enumerate(WIDTHS):
+        if span <= np.iinfo(dtype).max:
+            return code
+    raise BlackBoxError("Zakres wartości poza int64")
+
+
+def missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def fill_missing(values, mask):
+    """Braki zastępowane poprzednią wartością (na początku - pierwszą znaną)."""
+    known = np.flatnonzero(~mask)
+    if not len(known):
+        return np.zeros(len(values))
+    previous = np.maximum.accumulate(np.where(mask, 0, np.arange(len(values))))
+    previous[:known[0]] = known[0]
+    return values[previous]
+
+
+class BlackBoxWriter:
+    """
+    Zapis strumieniowy: `append` przyjmuje krotki `values_list(*VALUES)`
+    (np. z `.iterator()`), a pełne chunki trafiają od razu do pliku.
+    Plik musi być otwarty do zapisu binarnego i obsługiwać seek (nagłówek jest uzupełniany w `close`).
+    """
+
+    def __init__(self, f, tag_id, firefighter_id=None, chunk_size=1024):
+        self.f = f
+        self.tag_id = tag_id
+        self.firefighter_id = firefighter_id or ''
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.index = []
+        self.labels = {name: {} for name, _ in CATEGORICAL}
+        self.count = 0
+        self.f.write(b'\x00' * HEADER.size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    def append(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def flush(self):
+        if not self.pending:
+            return
+        rows, self.pending = self.pending, []
+        columns = list(zip(*rows))
+        n = len(rows)
+        parts = [CHUNK.pack(n)]
+        blocks = []
+        for k, (_, _, scale, delta) in enumerate(FIELDS):
+            nulls = b''
+            if k == 0:
+                values = np.array([round(t.timestamp() * 1000) for t in columns[0]], dtype=np.int64)
+            else:
+                mask = np.array([missing(v) for v in columns[k]])
+                values = np.array([np.nan if m else v for v, m in zip(columns[k], mask)], dtype=np.float64)
+                if mask.any():
+                    values = fill_missing(values, mask)
+                    nulls = np.packbits(mask).tobytes()
+                values = np.round(values * scale).astype(np.int64)
+            first = int(values[0])
+            if delta:
+                values = np.diff(values, prepend=values[0])
+            base = int(values.min())
+            code = width_code(int(values.max()) - base)
+            parts.append(COLUMN.pack(first, base, code | (NULLS if nulls else 0)))
+            blocks.append(nulls + (values - base).astype(WIDTHS[code]).tobytes())
+            if k == 0:
+                timestamps = first + np.cumsum(values)
+        for j, (name, _) in enumerate(CATEGORICAL):
+            labels = self.labels[name]
+            codes = [labels.setdefault(v, len(labels)) for v in columns[len(FIELDS) + j]]
+            if len(labels) > 256:
+                raise BlackBoxError(f"Za dużo różnych wartości {name}")
+            blocks.append(np.array(codes, dtype=np.uint8).tobytes())
+
+        offset = self.f.tell()
+        self.f.write(b''.join(parts) + b''.join(blocks))
+        self.index.append((offset, int(timestamps[0]), int(timestamps[-1]), n))
+        self.count += n
+
+    def close(self):
+        self.flush()
+        index_offset = self.f.tell()
+        self.f.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        meta = json.dumps({
+            'labels': {name: list(labels) for name, labels in self.labels.items()},
+            'fields': [[name, scale, delta] for name, _, scale, delta in FIELDS],
+        }).encode()
+        meta_offset = self.f.tell()
+        self.f.write(meta)
+        self.f.seek(0)
+        self.f.write(HEADER.pack(
+            MAGIC, VERSION, self.chunk_size, self.tag_id.encode()[:32], self.firefighter_id.encode()[:32],
+            self.count, index_offset, meta_offset, len(meta),
+        ))
+        self.f.seek(0, 2)
+
+
+class BlackBoxReader:
+    """
+    Odczyt przez mmap. `index` (tablica INDEX_DTYPE) jest widokiem na plik,
+    a chunki dekodowane są dopiero przy dostępie. Braki w kolumnach liczbowych to NaN.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise BlackBoxError("Pusty plik")
+        if len(self.mm) < HEADER.size:
+            self.close()
+            raise BlackBoxError("Plik krótszy niż nagłówek")
+        (magic, version, self.chunk_size, tag_id, firefighter_id, self.count,
+         index_offset, meta_offset, meta_length) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version not in VERSIONS:
+            self.close()
+            raise BlackBoxError("To nie jest plik czarnej skrzynki (albo nieobsługiwana wersja)")
+        self.tag_id = tag_id.rstrip(b'\x00').decode()
+        self.firefighter_id = firefighter_id.rstrip(b'\x00').decode() or None
+        chunks = (meta_offset - index_offset) // INDEX_DTYPE.itemsize
+        self.index = np.frombuffer(self.mm, dtype=INDEX_DTYPE, count=chunks, offset=index_offset)
+        meta = json.loads(self.mm[meta_offset:meta_offset + meta_length])
+        self.labels = {name: np.array(values, dtype=object) for name, values in meta['labels'].items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        # Widoki numpy trzymają bufor mmap - zwalniamy je przed zamknięciem
+        self.index = None
+        self.mm.close()
+        self.file.close()
+
+    def chunk(self, i):
+        """Zdekodowany chunk jako słownik kolumn (wartości rzeczywiste, etykiety tekstowe)."""
+        offset = int(self.index[i]['offset'])
+        (n,) = CHUNK.unpack_from(self.mm, offset)
+        directory = offset + CHUNK.size
+        position = directory + COLUMN.size * len(FIELDS)
+        columns = {}
+        for k, (name, _, scale, delta) in enumerate(FIELDS):
+            first, base, code = COLUMN.unpack_from(self.mm, directory + k * COLUMN.size)
+            mask = None
+            if code & NULLS:
+                size = (n + 7) // 8
+                mask = np.unpackbits(np.frombuffer(self.mm, dtype=np.uint8, count=size, offset=position), count=n)
+                position += size
+            dtype = WIDTHS[code & ~NULLS]
+            values = np.frombuffer(self.mm, dtype=dtype, count=n, offset=position).astype(np.int64) + base
+            position += n * np.dtype(dtype).itemsize
+            if delta:
+                values = first + np.cumsum(values)
+            if scale != 1 or mask is not None:
+                values = values / scale
+            if mask is not None:
+                values[mask.astype(bool)] = np.nan
+            columns[name] = values
+        for name, _ in CATEGORICAL:
+            codes = np.frombuffer(self.mm, dtype=np.uint8, count=n, offset=position)
+            position += n
+            columns[name] = self.labels[name][codes]
+        return columns
+
+    def read(self, start_ms=None, end_ms=None):
+        """Kolumny z zakresu czasu; dekodowane są tylko chunki wskazane przez indeks."""
+        first = 0 if start_ms is None else int(np.searchsorted(self.index['last_ms'], start_ms, side='left'))
+        last = len(self.index) if end_ms is None else int(np.searchsorted(self.index['first_ms'], end_ms, side='right'))
+        chunks = [self.chunk(i) for i in range(first, last)]
+        names = [name for name, _, _, _ in FIELDS] + [name for name, _ in CATEGORICAL]
+        if not chunks:
+            return {name: np.array([]) for name in names}
+        columns = {name: np.concatenate([c[name] for c in chunks]) for name in names}
+        ts = columns['timestamp_ms']
+        mask = np.ones(len(ts), dtype=bool)
+        if start_ms is not None:
+            mask &= ts >= start_ms
+        if end_ms is not None:
+            mask &= ts <= end_ms
+        return {name: values[mask] for name, values in columns.items()}
+
+    def records(self, start_ms=None, end_ms=None):
+        """Rekordy w postaci płaskich słowników (jak w eksporcie NDJSON)."""
+        for i in range(len(self.index)):
+            if start_ms is not None and self.index[i]['last_ms'] < start_ms:
+                continue
+            if end_ms is not None and self.index[i]['first_ms'] > end_ms:
+                break
+            columns = self.chunk(i)
+            values = {name: column.tolist() for name, column in columns.items()}
+            for k, ts in enumerate(values['timestamp_ms']):
+                if (start_ms is not None and ts < start_ms) or (end_ms is not None and ts > end_ms):
+                    continue
+                record = {'timestamp': datetime.fromtimestamp(ts / 1000, tz=dt_timezone.utc).isoformat(),
+                          'tag_id': self.tag_id, 'firefighter_id': self.firefighter_id}
+                for name, column in values.items():
+                    if name != 'timestamp_ms':
+                        record[name] = None if missing(column[k]) else column[k]
+                yield record
+
+
+def write_queryset(f, queryset, tag_id, firefighter_id=None, chunk_size=1024):
+    """Zapis strumieniowy ramek tagu z bazy (queryset Telemetry) do pliku czarnej skrzynki."""
+    with BlackBoxWriter(f, tag_id, firefighter_id, chunk_size) as writer:
+        rows = queryset.filter(tag_id=tag_id).order_by('timestamp').values_list(*VALUES)
+        writer.extend(rows.iterator(chunk_size=chunk_size))
+    return writer.count
@@ -0,0 +1,207 @@
+# archive/columnar.py
+import hashlib
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from app.models.models_archive import ArchiveSegment
+from app.models.models_incident import Incident
+
+# kolumna -> (ścieżka ORM, typ w pliku). NULL: NaN dla float, minimum typu dla int.
+NUMERIC = (
+    ('id', 'id', np.int64),
+    ('sequence', 'sequence', np.int32),
+    ('incident_id', 'incident_id', np.int64),
+    ('x', 'position__x', np.float32),
+    ('y', 'position__y', np.float32),
+    ('z', 'position__z', np.float32),
+    ('floor', 'position__floor', np.int16),
+    ('heading_deg', 'heading_deg', np.float32),
+    ('accuracy_m', 'position__accuracy_m', np.float32),
+    ('heart_rate', 'vitals__heart_rate_bpm', np.int16),
+    ('hrv', 'vitals__heart_rate_variability_ms', np.int16),
+    ('skin_temperature', 'vitals__skin_temperature_c', np.float32),
+    ('scba_pressure', 'scba__cylinder_pressure_bar', np.int16),
+    ('scba_remaining_min', 'scba__remaining_time_min', np.float32),
+)
+# Kolumny tekstowe o niewielu wartościach - w pliku kody uint8 + słownik
+CATEGORICAL = (
+    ('motion_state', 'vitals__motion_state'),
+    ('stress_level', 'vitals__stress_level'),
+)
+
+# Tagi, które mogą być wprost nazwą pliku segmentu
+SAFE_NAME = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+
+# Kolejność pól rekordu płaskiego (eksport, track, archiwum)
+FLAT_VALUES = ('timestamp', 'tag_id', 'firefighter_id') + tuple(path for _, path, _ in NUMERIC) \
+    + tuple(path for _, path in CATEGORICAL)
+FLAT_KEYS = ('timestamp', 'tag_id', 'firefighter_id') + tuple(name for name, _, _ in NUMERIC) \
+    + tuple(name for name, _ in CATEGORICAL)
+
+
+def null_value(dtype):
+    return np.nan if np.issubdtype(dtype, np.floating) else np.iinfo(dtype).min
+
+
+def flat_record(row):
+    """Rekord płaski z krotki `values_list(*FLAT_VALUES)`."""
+    record = dict(zip(FLAT_KEYS, row))
+    record['timestamp'] = record['timestamp'].isoformat()
+    return record
+
+
+def encode(rows):
+    """Krotki `values_list(*FLAT_VALUES)` jednego tagu -> słownik kolumn do np.savez_compressed."""
+    columns = list(zip(*rows))
+    ts = np.array([t.timestamp() * 1000 for t in columns[0]], dtype=np.int64)
+    order = np.argsort(ts, kind='stable')
+    out = {'timestamp_ms': ts[order]}
+    offset = 3
+    for k, (name, _, dtype) in enumerate(NUMERIC):
+        null = null_value(dtype)
+        values = np.array([null if v is None else v for v in columns[offset + k]], dtype=dtype)
+        out[name] = values[order]
+    offset += len(NUMERIC)
+    for k, (name, _) in enumerate(CATEGORICAL):
+        labels, codes = np.unique(np.array([v or '' for v in columns[offset + k]], dtype=str), return_inverse=True)
+        out[name] = codes.astype(np.uint8)[order]
+        out[f'{name}__labels'] = labels
+    return out
+
+
+def merge(existing, new):
+    """Łączy kolumny dwóch plików tego samego tagu/dnia, bez duplikatów po id."""
+    out = {}
+    ids = np.concatenate([existing['id'], new['id']])
+    _, first = np.unique(ids, return_index=True)
+    ts = np.concatenate([existing['timestamp_ms'], new['timestamp_ms']])
+    order = first[np.argsort(ts[first], kind='stable')]
+    out['timestamp_ms'] = ts[order]
+    for name, _, _ in NUMERIC:
+        out[name] = np.concatenate([existing[name], new[name]])[order]
+    for name, _ in CATEGORICAL:
+        labels = np.union1d(existing[f'{name}__labels'], new[f'{name}__labels'])
+        remap_old = np.searchsorted(labels, existing[f'{name}__labels'])
+        remap_new = np.searchsorted(labels, new[f'{name}__labels'])
+        codes = np.concatenate([remap_old[existing[name]], remap_new[new[name]]])
+        out[name] = codes.astype(np.uint8)[order]
+        out[f'{name}__labels'] = labels
+    return out
+
+
+def segment_path(tag_id, day):
+    """
+    Ścieżka pliku segmentu względem ARCHIVE_DIR. Tag jest nazwą pliku tylko wtedy, gdy jest
+    bezpieczny (bez '/', '..' itp.); inaczej czytelny prefiks + skrót - prawdziwy tag jest w ArchiveSegment.
+    """
+    if SAFE_NAME.fullmatch(tag_id) and not tag_id.startswith('.'):
+        name = tag_id
+    else:
+        digest = hashlib.blake2b(tag_id.encode(), digest_size=8).hexdigest()
+        name = f"{re.sub(r'[^A-Za-z0-9_-]', '_', tag_id)[:32]}-{digest}"
+    return os.path.join(day.isoformat(), f"{name}.npz")
+
+
+def write_segment(tag_id, firefighter_id, day, columns):
+    """Zapisuje (lub dopisuje do istniejącego) plik segmentu i aktualizuje ArchiveSegment."""
+    relative = segment_path(tag_id, day)
+    path = os.path.join(settings.ARCHIVE_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        with np.load(path) as existing:
+            columns = merge(existing, columns)
+
+    # Zapis przez plik tymczasowy - czytelnicy nigdy nie widzą niepełnego pliku
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, **columns)
+    os.replace(tmp, path)
+
+    ts = columns['timestamp_ms']
+    ArchiveSegment.objects.update_or_create(
+        tag_id=tag_id, day=day,
+        defaults={
+            'firefighter_id': firefighter_id,
+            'path': relative,
+            'start': datetime.fromtimestamp(ts[0] / 1000, tz=dt_timezone.utc),
+            'end': datetime.fromtimestamp(ts[-1] / 1000, tz=dt_timezone.utc),
+            'rows': len(ts),
+            'size_bytes': os.path.getsize(path),
+        },
+    )
+
+
+def segments(start=None, end=None, firefighter=None, tag_id=None):
+    """Segmenty archiwum nakładające się na zakres i pasujące do filtrów."""
+    queryset = ArchiveSegment.objects.all()
+    if start:
+        queryset = queryset.filter(end__gte=start)
+    if end:
+        queryset = queryset.filter(start__lte=end)
+    if firefighter:
+        queryset = queryset.filter(Q(firefighter__name__icontains=firefighter) | Q(tag_id__icontains=firefighter))
+    if tag_id:
+        queryset = queryset.filter(tag_id=tag_id)
+    return queryset.order_by('start')
+
+
+def read(start=None, end=None, firefighter=None, tag_id=None, incident=None, floor=None):
+    """
+    Płaskie rekordy z archiwum, posortowane po czasie w obrębie segmentu.
+    Filtry czasu, akcji i piętra nakładane są jako maski na kolumny;
+    dla akcji zakres segmentów zawężany jest do czasu jej trwania.
+    """
+    if incident is not None:
+        window = Incident.objects.filter(pk=incident).values_list('started_at', 'ended_at').first()
+        if window is None:
+            return
+        start = max(start, window[0]) if start else window[0]
+        if window[1]:
+            end = min(end, window[1]) if end else window[1]
+    start_ms = start.timestamp() * 1000 if start else None
+    end_ms = end.timestamp() * 1000 if end else None
+    for segment in segments(start, end, firefighter, tag_id):
+        with np.load(os.path.join(settings.ARCHIVE_DIR, segment.path)) as data:
+            ts = data['timestamp_ms']
+            mask = np.ones(len(ts), dtype=bool)
+            if start_ms is not None:
+                mask &= ts >= start_ms
+            if end_ms is not None:
+                mask &= ts <= end_ms
+            if incident is not None:
+                mask &= data['incident_id'] == incident
+            if floor is not None:
+                mask &= data['floor'] == floor
+            if not mask.any():
+                continue
+            yield from decode(segment, data, mask)
+
+
+def decode(segment, data, mask):
+    columns = {}
+    for name, _, dtype in NUMERIC:
+        values = data[name][mask]
+        if np.issubdtype(dtype, np.floating):
+            values = np.round(values.astype(np.float64), 3)
+            columns[name] = [None if v != v else v for v in values.tolist()]
+        else:
+            null = null_value(dtype)
+            columns[name] = [None if v == null else v for v in values.tolist()]
+    for name, _ in CATEGORICAL:
+        labels = data[f'{name}__labels']
+        columns[name] = [str(v) or None for v in labels[data[name][mask]]]
+    timestamps = data['timestamp_ms'][mask].tolist()
+    for k, ts in enumerate(timestamps):
+        record = {
+            'timestamp': datetime.fromtimestamp(ts / 1000, tz=dt_timezone.utc).isoformat(),
+            'tag_id': segment.tag_id,
+            'firefighter_id': segment.firefighter_id,
+        }
+        for name, values in columns.items():
+            record[name] = values[k]
+        record['archived'] = True
+        yield record
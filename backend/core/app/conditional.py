@@ -0,0 +1,71 @@
+# app/conditional.py
+"""
+Warunkowe GET (ETag / Last-Modified) dla endpointów historii.
+
+Walidatory liczone są jednym zapytaniem agregującym po zakresie z indeksu:
+liczba wierszy, max(id), max(timestamp) - bez serializacji czegokolwiek -
+do tego segmenty archiwum z tego zakresu i epoka cache historii.
+"""
+import hashlib
+import json
+from functools import wraps
+from django.db.models import Count, Max, Q, Sum
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from app import history_cache
+from app.archive import columnar
+
+
+def validators(queryset, archive=None, extra=None, variant=None):
+    """
+    (etag, last_modified) dla querysetu i opcjonalnie argumentów `columnar.read`.
+    `variant` rozróżnia reprezentacje tych samych danych (np. json / msgpack).
+    """
+    values = queryset.order_by().aggregate(n=Count('id'), last_id=Max('id'), last_ts=Max('timestamp'), **(extra or {}))
+    last_modified = values['last_ts']
+    if archive is not None:
+        segments = columnar.segments(archive.get('start'), archive.get('end'), archive.get('firefighter'),
+                                     archive.get('tag_id'))
+        archived = segments.aggregate(segments=Count('id'), rows=Sum('rows'), last_end=Max('end'))
+        values.update(archived)
+        if archived['last_end'] and (last_modified is None or archived['last_end'] > last_modified):
+            last_modified = archived['last_end']
+    values['epoch'] = history_cache.epoch()
+    values['variant'] = variant
+    digest = hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+    return f'W/"{digest}"', last_modified
+
+
+def conditional_history(history, extra=None):
+    """
+    Dekorator widoku GET. `history(request)` zwraca (queryset, argumenty archiwum albo None),
+    czyli ten sam zakres, który widok serializuje. Odpowiada 304, jeśli walidatory się zgadzają.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            queryset, archive = history(request)
+            renderer = getattr(request, 'accepted_renderer', None)
+            etag, last_modified = validators(queryset, archive, extra, renderer and renderer.format)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = func(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+                # Przeglądarka ma zawsze pytać warunkowo, zamiast używać kopii bez sprawdzenia
+                response['Cache-Control'] = 'no-cache'
+                patch_vary_headers(response, ('Accept',))
+            return response
+        return wrapper
+    return decorator
+
+
+# Alerty zmieniają się także przez rozwiązanie / potwierdzenie, nie tylko przez nowe wiersze
+ALERT_EXTRA = {
+    'resolved': Count('id', filter=Q(resolved=True)),
+    'acknowledged': Count('id', filter=Q(acknowledged=True)),
+}
@@ -0,0 +1,117 @@
+# filters/trilateration.py
+import numpy as np
+
+
+DOP_LIMIT = 99.0
+
+
+class TrilaterationEngine:
+    """
+    Wyznaczanie pozycji tagów z odległości UWB do beaconów.
+
+    Pozycje beaconów pochodzą z wiadomości `beacons_config`. Rozwiązania dla
+    wszystkich ramek z ticku liczone są jednocześnie ważoną metodą Gaussa-Newtona
+    (z lekkim tłumieniem Levenberga-Marquardta, bo beacony zwykle leżą prawie
+    w jednej płaszczyźnie). Pomiary są ważone przez 1 - nlos_probability.
+    """
+
+    algorithm = 'weighted_gauss_newton'
+
+    def __init__(self, max_iterations=10, tolerance_m=1e-3, damping=1e-3, min_beacons=3):
+        self.max_iterations = max_iterations
+        self.tolerance_m = tolerance_m
+        self.damping = damping
+        self.min_beacons = min_beacons
+        self.beacons = {}
+
+    def set_beacons(self, beacons):
+        """Zapamiętuje pozycje beaconów z konfiguracji: {beacon_id: (x, y, z)}."""
+        positions = {}
+        for beacon in beacons:
+            pos = beacon.get('position') or {}
+            if 'x' in pos and 'y' in pos:
+                positions[beacon['id']] = (pos['x'], pos['y'], pos.get('z', 0.0))
+        self.beacons = positions
+
+    def pack(self, measurements_list):
+        """
+        Układa pomiary wszystkich ramek w tablice [N, M] dopełnione zerowymi wagami.
+        Pomiary do nieznanych beaconów są pomijane.
+        """
+        beacons = self.beacons
+        usable = [[m for m in ms if m.get('beacon_id') in beacons and m.get('range_m') is not None]
+                  for ms in measurements_list]
+        n = len(usable)
+        m = max((len(ms) for ms in usable), default=0)
+
+        B = np.zeros((n, m, 3))
+        r = np.zeros((n, m))
+        w = np.zeros((n, m))
+        ids = []
+        for i, ms in enumerate(usable):
+            for j, meas in enumerate(ms):
+                B[i, j] = beacons[meas['beacon_id']]
+                r[i, j] = meas['range_m']
+                w[i, j] = max(1.0 - (meas.get('nlos_probability') or 0.0), 0.05)
+            ids.append([meas['beacon_id'] for meas in ms])
+        return B, r, w, ids
+
+    def solve(self, B, r, w, initial=None):
+        """
+        Ważony Gauss-Newton dla paczki: B [N, M, 3], r [N, M], w [N, M].
+        Zwraca słownik tablic: position, residual, gdop, hdop, vdop, iterations, converged.
+        """
+        n = len(B)
+        mask = w > 0
+        w_sum = np.maximum(w.sum(axis=1), 1e-12)
+
+        if initial is None:
+            p = np.einsum('nm,nmi->ni', w, B) / w_sum[:, None]
+        else:
+            p = np.array(initial, dtype=float)
+
+        iterations = np.zeros(n, dtype=int)
+        converged = np.zeros(n, dtype=bool)
+        eye = np.eye(3)
+
+        for _ in range(self.max_iterations):
+            active = ~converged
+            if not active.any():
+                break
+            d = p[active, None, :] - B[active]
+            rho = np.maximum(np.linalg.norm(d, axis=2), 1e-6)
+            J = d / rho[..., None]
+            res = (rho - r[active]) * mask[active]
+            JtW = J * w[active, :, None]
+            H = np.einsum('nmi,nmj->nij', JtW, J)
+            H = H + self.damping * (H * eye + eye)
+            g = np.einsum('nmi,nm->ni', JtW, res)
+            step = np.linalg.solve(H, g[..., None])[..., 0]
+
+            p[active] -= step
+            iterations[active] += 1
+            converged[active] = np.linalg.norm(step, axis=1) < self.tolerance_m
+
+        d = p[:, None, :] - B
+        rho = np.maximum(np.linalg.norm(d, axis=2), 1e-6)
+        res = (rho - r) * mask
+        residual = np.sqrt((w * res ** 2).sum(axis=1) / w_sum)
+
+        # DOP z samej geometrii (bez wag), z minimalną regularyzacją
+        J = d / rho[..., None] * mask[..., None]
+        G = np.einsum('nmi,nmj->nij', J, J) + 1e-9 * eye
+        Q = np.linalg.inv(G)
+        diag = np.clip(np.diagonal(Q, axis1=1, axis2=2), 0.0, None)
+        gdop = np.minimum(np.sqrt(diag.sum(axis=1)), DOP_LIMIT)
+        hdop = np.minimum(np.sqrt(diag[:, 0] + diag[:, 1]), DOP_LIMIT)
+        vdop = np.minimum(np.sqrt(diag[:, 2]), DOP_LIMIT)
+
+        return {
+            'position': p,
+            'residual': residual,
+            'gdop': gdop,
+            'hdop': hdop,
+            'vdop': vdop,
+            'iterations': iterations,
+            'converged': converged,
+        }
@@ -0,0 +1,151 @@
+# filters/ukf_filter.py
+import numpy as np
+
+
+STATE_DIM = 6    # [x, y, z, vx, vy, vz]
+MEAS_DIM = 3     # [x, y, z]
+
+
+class BatchedUKF:
+    """
+    Bezśladowy filtr Kalmana (UKF) pozycji i prędkości dla wielu tagów naraz.
+
+    Stan wszystkich tagów trzymany jest w stosowanych tablicach NumPy
+    (x: [N, 6], P: [N, 6, 6]), a jeden krok filtra liczy predykcję
+    i korektę dla całej paczki tagów bez pętli w Pythonie.
+    Model ruchu: stała prędkość z szumem przyspieszenia.
+    """
+
+    def __init__(self, process_noise=0.5, initial_velocity_var=1.0, max_gap_s=10.0,
+                 alpha=0.3, beta=2.0, kappa=0.0, capacity=16):
+        self.process_noise = process_noise
+        self.initial_velocity_var = initial_velocity_var
+        self.max_gap_s = max_gap_s
+
+        n = STATE_DIM
+        self.lam = alpha ** 2 * (n + kappa) - n
+        self.Wm = np.full(2 * n + 1, 1.0 / (2 * (n + self.lam)))
+        self.Wc = self.Wm.copy()
+        self.Wm[0] = self.lam / (n + self.lam)
+        self.Wc[0] = self.lam / (n + self.lam) + (1 - alpha ** 2 + beta)
+
+        self.x = np.zeros((capacity, n))
+        self.P = np.tile(np.eye(n), (capacity, 1, 1))
+        self.t = np.zeros(capacity)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def ensure_capacity(self, size):
+        """Powiększa tablice stanu, jeśli pojawiły się nowe tagi."""
+        capacity = len(self.x)
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2)
+        extra = new_capacity - capacity
+        self.x = np.concatenate([self.x, np.zeros((extra, STATE_DIM))])
+        self.P = np.concatenate([self.P, np.tile(np.eye(STATE_DIM), (extra, 1, 1))])
+        self.t = np.concatenate([self.t, np.zeros(extra)])
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+
+    def reset(self, rows):
+        """Następny pomiar tych wierszy zaczyna filtr od nowa (np. po odrzuconej paczce)."""
+        self.active[rows] = False
+
+    # ---- Model -------------------------------------------------------------
+
+    @staticmethod
+    def fx(sigmas, dt):
+        """Propagacja punktów sigma modelem stałej prędkości. sigmas: [N, 2n+1, 6]."""
+        out = sigmas.copy()
+        out[..., :3] += sigmas[..., 3:] * dt[:, None, None]
+        return out
+
+    @staticmethod
+    def hx(sigmas):
+        """Pomiar to sama pozycja."""
+        return sigmas[..., :3]
+
+    def process_covariance(self, dt):
+        """Dyskretny szum białego przyspieszenia dla każdej osi. Zwraca [N, 6, 6]."""
+        q = self.process_noise
+        Q = np.zeros((len(dt), STATE_DIM, STATE_DIM))
+        pp = q * dt ** 4 / 4
+        pv = q * dt ** 3 / 2
+        vv = q * dt ** 2
+        for axis in range(3):
+            Q[:, axis, axis] = pp
+            Q[:, axis, axis + 3] = pv
+            Q[:, axis + 3, axis] = pv
+            Q[:, axis + 3, axis + 3] = vv
+        return Q
+
+    def sigma_points(self, x, P):
+        """Punkty sigma Merwe'a dla paczki stanów. Zwraca [N, 2n+1, 6]."""
+        n = STATE_DIM
+        S = np.linalg.cholesky((n + self.lam) * P)
+        offsets = np.swapaxes(S, 1, 2)
+        return np.concatenate([x[:, None, :], x[:, None, :] + offsets, x[:, None, :] - offsets], axis=1)
+
+    # ---- Krok filtra -------------------------------------------------------
+
+    def step(self, rows, z, t, r_var):
+        """
+        Predykcja + korekta dla wierszy `rows` (unikalnych w obrębie wywołania).
+
+        z: [N, 3] pomiar pozycji, t: [N] czas pomiaru w sekundach,
+        r_var: [N] wariancja pomiaru (m^2). Zwraca (x, P) po korekcie.
+        """
+        rows = np.asarray(rows)
+        z = np.asarray(z, dtype=float)
+        t = np.asarray(t, dtype=float)
+        r_var = np.asarray(r_var, dtype=float)
+
+        # Nowe tagi lub tagi po dłuższej przerwie startują od pomiaru
+        dt = t - self.t[rows]
+        fresh = ~self.active[rows] | (dt > self.max_gap_s)
+        if fresh.any():
+            fresh_rows = rows[fresh]
+            self.x[fresh_rows] = 0.0
+            self.x[fresh_rows, :3] = z[fresh]
+            P0 = np.zeros((len(fresh_rows), STATE_DIM, STATE_DIM))
+            P0[:, [0, 1, 2], [0, 1, 2]] = r_var[fresh][:, None]
+            P0[:, [3, 4, 5], [3, 4, 5]] = self.initial_velocity_var
+            self.P[fresh_rows] = P0
+            self.t[fresh_rows] = t[fresh]
+            self.active[fresh_rows] = True
+
+        upd = ~fresh
+        if upd.any():
+            r = rows[upd]
+            dt_u = np.clip(dt[upd], 0.0, None)
+            x, P = self.x[r], self.P[r]
+
+            # Predykcja
+            sigmas = self.fx(self.sigma_points(x, P), dt_u)
+            x_pred = np.einsum('k,nki->ni', self.Wm, sigmas)
+            dX = sigmas - x_pred[:, None, :]
+            P_pred = np.einsum('k,nki,nkj->nij', self.Wc, dX, dX) + self.process_covariance(dt_u)
+
+            # Korekta
+            Z = self.hx(sigmas)
+            z_pred = np.einsum('k,nki->ni', self.Wm, Z)
+            dZ = Z - z_pred[:, None, :]
+            S = np.einsum('k,nki,nkj->nij', self.Wc, dZ, dZ)
+            S[:, [0, 1, 2], [0, 1, 2]] += r_var[upd][:, None]
+            Pxz = np.einsum('k,nki,nkj->nij', self.Wc, dX, dZ)
+            K = np.swapaxes(np.linalg.solve(S, np.swapaxes(Pxz, 1, 2)), 1, 2)
+
+            innovation = z[upd] - z_pred
+            x_new = x_pred + np.einsum('nij,nj->ni', K, innovation)
+            P_new = P_pred - np.einsum('nij,njk,nlk->nil', K, S, K)
+            P_new = 0.5 * (P_new + np.swapaxes(P_new, 1, 2))
+
+            self.x[r] = x_new
+            self.P[r] = P_new
+            self.t[r] = t[upd]
+
+        return self.x[rows], self.P[rows]
+
+    @staticmethod
+    def accuracy(P):
+        """Dokładność pozycji [m] jako pierwiastek ze śladu bloku kowariancji pozycji."""
+        return np.sqrt(np.trace(P[:, :3, :3], axis1=1, axis2=2))
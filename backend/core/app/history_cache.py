@@ -0,0 +1,146 @@
+# app/history_cache.py
+"""
+Cache wyników endpointów historii (telemetria, alerty, trasy).
+
+Wyniki trzymane są w lokalnym cache 'history' (LocMemCache: LRU z limitem
+MAX_ENTRIES). Zakresy kończące się w przeszłości są niezmienne i trzymane bez
+limitu czasu; zakresy obejmujące "teraz" mają w kluczu znaczniki generacji tagów,
+które listener zmienia po każdym zapisie paczki. Znaczniki są w cache
+'generations' (na dysku), bo listener i serwer API to osobne procesy.
+Znacznik to losowa wartość, a nie licznik - kilka procesów ingestu zapisujących
+naraz nie może więc "zgubić" zmiany tak jak przy równoległym odczycie i +1.
+Retencja / archiwizacja / import zmieniają przeszłość - podbijają wtedy epokę
+wspólną dla wszystkich kluczy. Alerty zmieniają się także po czasie (rozwiązanie
+przez etapy potoku, edycja w adminie), więc ich zakresy zawsze mają znaczniki generacji.
+"""
+import hashlib
+import json
+import uuid
+from datetime import timedelta, timezone as dt_timezone
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.response import Response
+
+from app.models.model_firefighter import Firefighter
+
+ALL = '*'
+EPOCH = 'epoch'
+TAGS = 'tags'
+
+# Parametry zapytań historii, które wpływają na wynik (reszta jest ignorowana w kluczu)
+PARAMS = ('start_time', 'end_time', 'firefighter', 'tag', 'floor', 'session', 'fill', 'step')
+
+# Widoki, których zakresy z przeszłości nadal się zmieniają
+MUTABLE_VIEWS = {'alerts'}
+
+_known_tags = {}
+
+
+def generation_key(tag_id):
+    return f'gen:{tag_id}'
+
+
+def bump(tags):
+    """
+    Po zapisie paczki: zmienia znaczniki generacji tagów i znacznik globalny.
+    `tags`: tag_id -> firefighter_id (do rejestru nazw używanego przy filtrze ?firefighter=).
+    """
+    generations = caches['generations']
+    if not tags:
+        return
+    new = {tag: ff for tag, ff in tags.items() if tag not in _known_tags}
+    if new:
+        names = dict(Firefighter.objects.filter(pk__in=set(new.values())).values_list('pk', 'name'))
+        entries = {tag: names.get(ff, '') for tag, ff in new.items()}
+        # Rejestr mogą naraz dopisywać inne procesy ingestu - sprawdzamy, czy nasze wpisy przetrwały
+        for _ in range(3):
+            registry = generations.get(TAGS) or {}
+            if entries.items() <= registry.items():
+                break
+            registry.update(entries)
+            generations.set(TAGS, registry)
+        _known_tags.update(registry)
+
+    token = uuid.uuid4().hex
+    generations.set_many({key: token for key in [generation_key(tag) for tag in tags] + [generation_key(ALL)]})
+
+
+def epoch():
+    return caches['generations'].get(EPOCH) or 0
+
+
+def bump_epoch():
+    """Unieważnia wszystkie wpisy, także zakresy z przeszłości (retencja, archiwizacja, import)."""
+    generations = caches['generations']
+    generations.set(EPOCH, (generations.get(EPOCH) or 0) + 1)
+
+
+def scope_tags(params):
+    """Tagi, których dotyczy zapytanie, albo None (= wszystkie, znacznik globalny)."""
+    if params.get('tag'):
+        return [params['tag']]
+    needle = params.get('firefighter')
+    if not needle:
+        return None
+    registry = caches['generations'].get(TAGS) or {}
+    return sorted(tag for tag, name in registry.items() if needle in tag.lower() or needle in name.lower())
+
+
+def normalized(request):
+    params = {}
+    for name in PARAMS:
+        value = request.GET.get(name)
+        if not value:
+            continue
+        if name in ('start_time', 'end_time'):
+            parsed = parse_datetime(value)
+            if parsed is None:
+                continue
+            value = parsed.astimezone(dt_timezone.utc).isoformat() if timezone.is_aware(parsed) else parsed.isoformat()
+        elif name == 'firefighter':
+            value = value.lower()
+        params[name] = value
+    return params
+
+
+def is_immutable(params):
+    """Zakres kończący się w przeszłości (z zapasem na spóźnione ramki) już się nie zmieni."""
+    end = parse_datetime(params.get('end_time') or '')
+    if end is None or not timezone.is_aware(end):
+        return False
+    return end < timezone.now() - timedelta(seconds=settings.HISTORY_CACHE_SETTLE_S)
+
+
+def cache_key(view, params):
+    generations = caches['generations']
+    parts = {'view': view, 'params': params, 'epoch': epoch()}
+    if view in MUTABLE_VIEWS or not is_immutable(params):
+        tags = scope_tags(params)
+        keys = [generation_key(ALL)] if tags is None else [generation_key(tag) for tag in tags]
+        current = generations.get_many(keys)
+        parts['generations'] = [current.get(key, 0) for key in keys]
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+    return f'history:{view}:{digest}'
+
+
+def cached_history(view):
+    """Dekorator widoku GET zwracającego Response z listą / słownikiem danych."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            cache = caches['history']
+            key = cache_key(view, normalized(request))
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = func(request, *args, **kwargs)
+            data = response.data
+            rows = len(data['points']) if isinstance(data, dict) and 'points' in data else len(data)
+            if response.status_code == 200 and rows <= settings.HISTORY_CACHE_MAX_ROWS:
+                cache.set(key, data, None)
+            return response
+        return wrapper
+    return decorator
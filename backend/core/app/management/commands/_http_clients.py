@@ -0,0 +1,59 @@
+# Klienci HTTP benchmarków - bez Django, uruchamiani w osobnym procesie (nie dzielą GIL z ingestem)
+import http.client
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode, urlsplit
+
+
+def get(base, path, params, timeout):
+    """Jedno żądanie GET na nowym połączeniu. Zwraca (status, bajty)."""
+    connection = http.client.HTTPConnection(base.hostname, base.port, timeout=timeout)
+    try:
+        connection.request('GET', f'{path}?{urlencode(params)}')
+        response = connection.getresponse()
+        return response.status, len(response.read())
+    finally:
+        connection.close()
+
+
+def run_clients(base_url, targets, start_at, seconds, window=None, timeout=30.0):
+    """
+    Każdy klient (wątek) od chwili `start_at` przez `seconds` s odpytuje w pętli na zmianę
+    swoje cele `(etykieta, ścieżka, parametry)` - tak jak operatorzy przeglądający historię.
+    Z `window` [s] zapytania dostają start_time = teraz - window (przesuwane okno ostatnich ramek).
+    Zwraca {etykieta: [czasy odpowiedzi 200 w s]} i {etykieta: liczba błędów}.
+    """
+    base = urlsplit(base_url)
+    times, errors = {}, {}
+    lock = threading.Lock()
+
+    def client(own_targets):
+        while time.time() < start_at:
+            time.sleep(0.01)
+        stop = start_at + seconds
+        k = 0
+        while time.time() < stop:
+            label, path, params = own_targets[k % len(own_targets)]
+            k += 1
+            if window:
+                since = datetime.now(timezone.utc) - timedelta(seconds=window)
+                params = {**params, 'start_time': since.isoformat()}
+            start = time.perf_counter()
+            try:
+                status, _ = get(base, path, params, timeout)
+            except (OSError, http.client.HTTPException):
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    times.setdefault(label, []).append(elapsed)
+                else:
+                    errors[label] = errors.get(label, 0) + 1
+
+    threads = [threading.Thread(target=client, args=(own,)) for own in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return times, errors
@@ -0,0 +1,61 @@
+# Generator syntetycznych ramek w formacie symulatora, używany przez benchmarki
+import math
+import random
+from datetime import datetime, timezone
+
+
+BEACONS = [
+    {'id': f'BCN-{i:02d}', 'name': f'Beacon {i}', 'type': 'uwb', 'floor': 0,
+     'position': {'x': x, 'y': y, 'z': 2.5}}
+    for i, (x, y) in enumerate([(0, 0), (40, 0), (40, 30), (0, 30), (20, 15)])
+]
+
+
+def make_uwb(x, y, z, rng):
+    """Pomiary odległości do BEACONS z szumem; część beaconów raportuje NLOS."""
+    measurements = []
+    for beacon in BEACONS:
+        p = beacon['position']
+        distance = math.dist((x, y, z), (p['x'], p['y'], p['z']))
+        nlos = rng.random() < 0.2
+        measurements.append({
+            'beacon_id': beacon['id'], 'beacon_name': beacon['name'],
+            'range_m': distance + rng.gauss(0, 0.1) + (rng.uniform(0.5, 2.0) if nlos else 0.0),
+            'rssi_dbm': int(-60 - distance), 'fp_power_dbm': int(-65 - distance), 'rx_power_dbm': int(-58 - distance),
+            'los': not nlos, 'nlos_probability': 0.8 if nlos else 0.1,
+            'timestamp': 0, 'quality': 'good',
+        })
+    return measurements
+
+
+def make_telemetry(tag_index, t, seed=None, uwb=False):
+    """Ramka `tag_telemetry` dla tagu poruszającego się po okręgu, z szumem pomiaru."""
+    rng = random.Random(seed)
+    angle = 0.1 * t + tag_index
+    x = 20 + 10 * math.cos(angle) + rng.gauss(0, 0.3)
+    y = 15 + 10 * math.sin(angle) + rng.gauss(0, 0.3)
+    floor = tag_index % 4
+    frame = {
+        'type': 'tag_telemetry',
+        'timestamp': datetime.fromtimestamp(t, tz=timezone.utc).isoformat(),
+        'sequence': int(t),
+        'tag_id': f'TAG-{tag_index:04d}',
+        'firefighter': {'id': f'FF-{tag_index:04d}', 'name': f'Strażak {tag_index}'},
+        'position': {'x': x, 'y': y, 'z': floor * 3.2 + rng.gauss(0, 0.2), 'floor': floor, 'accuracy_m': 0.3},
+        'heading_deg': math.degrees(angle) % 360,
+        'vitals': {
+            'heart_rate_bpm': 90 + rng.randint(-5, 5),
+            'heart_rate_variability_ms': 45 + rng.randint(-5, 5),
+            'skin_temperature_c': 36.5 + rng.gauss(0, 0.1),
+            'stress_level': 'low',
+            'motion_state': 'walking',
+            'stationary_duration_s': 0,
+        },
+        'scba': {'cylinder_pressure_bar': max(0.0, 300 - t * 0.1)},
+        'device': {'battery_percent': 80, 'sos_button_pressed': False},
+        'environment': {'temperature_c': 35.0},
+    }
+    if uwb:
+        frame['uwb_measurements'] = make_uwb(x, y, floor * 3.2, rng)
+    return frame
+
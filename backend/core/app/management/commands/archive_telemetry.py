@@ -0,0 +1,68 @@
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from itertools import groupby
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app import history_cache
+from app.archive.columnar import FLAT_VALUES, encode, write_segment
+from app.models.models_incident import Incident
+from app.models.models_telemetry import Telemetry
+from .prune_telemetry import delete_telemetry
+
+ID = FLAT_VALUES.index('id')
+
+
+class Command(BaseCommand):
+    help = (
+        "Przenosi starą telemetrię (pełne dni UTC starsze niż ARCHIVE_AFTER_DAYS) albo zamknięte akcje "
+        "do plików kolumnowych .npz (tag/dzień) w ARCHIVE_DIR i usuwa ją z bazy. "
+        "Głębsze osierocone podrekordy sprząta prune_telemetry."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--incident', type=int, action='append', help="Archiwizuj daną (zamkniętą) akcję")
+        parser.add_argument('--closed-incidents', action='store_true', help="Archiwizuj wszystkie zamknięte akcje")
+        parser.add_argument('--batch-size', type=int, default=settings.RETENTION_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['incident'] or options['closed_incidents']:
+            incidents = Incident.objects.exclude(ended_at=None)
+            if options['incident']:
+                incidents = incidents.filter(pk__in=options['incident'])
+            ids = list(incidents.values_list('pk', flat=True))
+            if options['incident'] and len(ids) != len(set(options['incident'])):
+                raise CommandError("Archiwizować można tylko istniejące, zamknięte akcje")
+            queryset = Telemetry.objects.filter(incident_id__in=ids)
+            scope = f"akcje {ids}"
+        else:
+            today = datetime.combine(timezone.now().date(), dt_time(), tzinfo=dt_timezone.utc)
+            cutoff = today - timedelta(days=options['older_than_days'])
+            queryset = Telemetry.objects.filter(timestamp__lt=cutoff)
+            scope = f"ramki sprzed {cutoff:%Y-%m-%d}"
+
+        total = files = 0
+        tags = list(queryset.order_by().values_list('tag_id', flat=True).distinct())
+        for tag_id in tags:
+            rows = (
+                queryset.filter(tag_id=tag_id).order_by('timestamp')
+                .values_list(*FLAT_VALUES).iterator(chunk_size=options['batch_size'])
+            )
+            for day, group in groupby(rows, key=lambda row: row[0].astimezone(dt_timezone.utc).date()):
+                group = list(group)
+                total += len(group)
+                files += 1
+                if options['dry_run']:
+                    continue
+                firefighter_id = next((row[2] for row in group if row[2]), None)
+                write_segment(tag_id, firefighter_id, day, encode(group))
+                ids = [row[ID] for row in group]
+                for k in range(0, len(ids), options['batch_size']):
+                    delete_telemetry(ids[k:k + options['batch_size']])
+
+        if not options['dry_run']:
+            history_cache.bump_epoch()
+        verb = "Do archiwizacji" if options['dry_run'] else "Zarchiwizowano"
+        self.stdout.write(self.style.SUCCESS(f"{verb} ({scope}): {total} ramek w {files} plikach"))
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import statistics
+import threading
+import time
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+
+from app.models.models_telemetry import Telemetry
+from app.pipeline.pipeline import Frame, IngestPipeline
+from ._synthetic import make_telemetry
+from .prune_telemetry import delete_telemetry
+
+PREFIX = 'BENCH-'
+
+PATHS = {
+    'sync': ('/api/telemetry/', '/api/state/'),
+    'async': ('/api/async/telemetry/', '/api/async/state/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark współbieżności pod ASGI (aplikacja wołana w procesie, bez serwera): "
+        "wolne zapytania o historię telemetrii równolegle z krótkimi zapytaniami o stan, "
+        "dla widoków synchronicznych (DRF) i async. Ramki benchmarku (tagi BENCH-*) są na końcu usuwane."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--frames', type=int, default=300, help="Ramek na tag")
+        parser.add_argument('--slow', type=int, default=16, help="Równoległych klientów historii")
+        parser.add_argument('--seconds', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        # Każde zapytanie ma liczyć historię od nowa, a nie trafiać w cache
+        settings.HISTORY_CACHE_MAX_ROWS = -1
+        self.tags = options['tags']
+        self.seed(options['frames'])
+        self.stdout.write(f"CPU: {os.cpu_count()}, ASYNC_HISTORY_CONCURRENCY={settings.ASYNC_HISTORY_CONCURRENCY}")
+        try:
+            app = get_asgi_application()
+            for mode, (history, state) in PATHS.items():
+                result = asyncio.run(self.run(app, history, state, options['slow'], options['seconds']))
+                self.report(mode, options['slow'], *result)
+        finally:
+            ids = list(Telemetry.objects.filter(tag_id__startswith=PREFIX).values_list('id', flat=True))
+            for k in range(0, len(ids), 2000):
+                delete_telemetry(ids[k:k + 2000])
+
+    def seed(self, frames):
+        pipeline = IngestPipeline()
+        t0 = time.time() - frames
+        for t in range(frames):
+            batch = []
+            for i in range(self.tags):
+                frame = Frame.from_message(make_telemetry(i, t0 + t, seed=t * self.tags + i))
+                frame.payload['tag_id'] = f"{PREFIX}{i:04d}"
+                batch.append(frame)
+            pipeline.run(batch)
+        self.stdout.write(f"Zapisano {frames * self.tags} ramek ({self.tags} tagów)")
+
+    async def request(self, app, path, query=''):
+        """Jedno żądanie GET przez ASGI. Zwraca (status, czas do pierwszego bajtu, czas całkowity, bajty)."""
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        done = asyncio.Event()
+        received = False
+        result = {'status': None, 'first': None, 'size': 0}
+        start = time.perf_counter()
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                result['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                if result['first'] is None:
+                    result['first'] = time.perf_counter() - start
+                result['size'] += len(message.get('body', b''))
+
+        await app(scope, receive, send)
+        done.set()
+        return result['status'], result['first'], time.perf_counter() - start, result['size']
+
+    async def run(self, app, history, state, slow, seconds):
+        stop = time.perf_counter() + seconds
+        slow_times, first_bytes, state_times, errors = [], [], [], [0]
+        threads = [threading.active_count()]
+
+        async def history_client(k):
+            tag = f"{PREFIX}{k % self.tags:04d}"
+            while time.perf_counter() < stop:
+                status, first, total, _ = await self.request(app, history, f'tag={tag}')
+                if status != 200:
+                    errors[0] += 1
+                slow_times.append(total)
+                first_bytes.append(first)
+
+        async def state_client():
+            while time.perf_counter() < stop:
+                status, _, total, _ = await self.request(app, state)
+                if status != 200:
+                    errors[0] += 1
+                state_times.append(total)
+                threads[0] = max(threads[0], threading.active_count())
+                await asyncio.sleep(0.05)
+
+        await asyncio.gather(state_client(), *(history_client(k) for k in range(slow)))
+        return slow_times, first_bytes, state_times, errors[0], threads[0]
+
+    def report(self, mode, slow, slow_times, first_bytes, state_times, errors, threads):
+        line = (
+            f"{mode:5s} historia x{slow}: {len(slow_times):5d} odpowiedzi, p50 {self.p(slow_times, 50):7.1f} ms, "
+            f"pierwszy bajt p50 {self.p(first_bytes, 50):7.1f} ms | /state: p50 {self.p(state_times, 50):7.1f} ms, "
+            f"p95 {self.p(state_times, 95):7.1f} ms, max {max(state_times, default=0) * 1e3:7.1f} ms "
+            f"({len(state_times)} zapytań) | wątki max {threads}"
+        )
+        if errors:
+            line += f" | błędy: {errors}"
+        self.stdout.write(line)
+
+    @staticmethod
+    def p(values, q):
+        if len(values) < 2:
+            return values[0] * 1e3 if values else 0.0
+        return statistics.quantiles(values, n=100)[q - 1] * 1e3
@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.archive import columnar
+from app.archive.blackbox import BlackBoxReader, write_queryset
+from app.models.models_telemetry import Telemetry
+from app.pipeline.pipeline import Frame, IngestPipeline
+from ._synthetic import make_telemetry
+
+
+class Command(BaseCommand):
+    help = (
+        "Porównuje rozmiar i czas zapisu/odczytu czarnej skrzynki (.bbx) z eksportem NDJSON. "
+        "Bez --tag generuje syntetyczną telemetrię w transakcji, która jest na końcu wycofywana."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tag', help="Użyj istniejącej telemetrii tego tagu")
+        parser.add_argument('--frames', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tag_id = options['tag']
+            if not tag_id:
+                tag_id = 'TAG-0000'
+                pipeline = IngestPipeline()
+                for start in range(0, options['frames'], 500):
+                    pipeline.run([
+                        Frame.from_message(make_telemetry(0, 1000 + t, seed=t))
+                        for t in range(start, min(start + 500, options['frames']))
+                    ])
+            self.compare(Telemetry.objects.filter(tag_id=tag_id), tag_id)
+            transaction.set_rollback(not options['tag'])
+
+    def compare(self, queryset, tag_id):
+        directory = tempfile.mkdtemp()
+        ndjson_path = os.path.join(directory, 'export.ndjson')
+        bbx_path = os.path.join(directory, 'export.bbx')
+
+        start = time.perf_counter()
+        with open(ndjson_path, 'w') as f:
+            rows = queryset.order_by('timestamp').values_list(*columnar.FLAT_VALUES)
+            for row in rows.iterator(chunk_size=2000):
+                f.write(json.dumps(columnar.flat_record(row)) + '\n')
+        ndjson_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(bbx_path, 'wb') as f:
+            count = write_queryset(f, queryset, tag_id)
+        bbx_write = time.perf_counter() - start
+        if not count:
+            self.stdout.write(self.style.ERROR(f"Brak telemetrii dla {tag_id}"))
+            return
+
+        start = time.perf_counter()
+        with open(ndjson_path) as f:
+            records = [json.loads(line) for line in f]
+        ndjson_read = time.perf_counter() - start
+        # Okno 1% ze środka przebiegu
+        t0, t1 = records[len(records) // 2]['timestamp'], records[min(len(records) // 2 + len(records) // 100, len(records) - 1)]['timestamp']
+
+        start = time.perf_counter()
+        with open(ndjson_path) as f:
+            window = [r for r in map(json.loads, f) if t0 <= r['timestamp'] <= t1]
+        ndjson_range = time.perf_counter() - start
+
+        with BlackBoxReader(bbx_path) as reader:
+            start = time.perf_counter()
+            reader.read()
+            bbx_read = time.perf_counter() - start
+            lo, hi = reader.read()['timestamp_ms'][[len(records) // 2, len(records) // 2 + len(window) - 1]]
+            start = time.perf_counter()
+            bbx_window = reader.read(lo, hi)
+            bbx_range = time.perf_counter() - start
+
+        ndjson_size = os.path.getsize(ndjson_path)
+        bbx_size = os.path.getsize(bbx_path)
+        with open(ndjson_path, 'rb') as f:
+            gzip_size = len(gzip.compress(f.read()))
+
+        self.stdout.write(f"Ramek: {count} ({tag_id}), okno: {len(window)}/{len(bbx_window['timestamp_ms'])}")
+        self.stdout.write(f"Rozmiar  NDJSON: {ndjson_size / 1024:8.1f} KiB  NDJSON.gz: {gzip_size / 1024:8.1f} KiB  "
+                          f"BBX: {bbx_size / 1024:8.1f} KiB ({ndjson_size / bbx_size:.1f}x mniej)")
+        self.stdout.write(f"Zapis    NDJSON: {ndjson_write * 1e3:8.1f} ms  BBX: {bbx_write * 1e3:8.1f} ms")
+        self.stdout.write(f"Odczyt   NDJSON: {ndjson_read * 1e3:8.1f} ms  BBX: {bbx_read * 1e3:8.1f} ms")
+        self.stdout.write(f"Zakres   NDJSON: {ndjson_range * 1e3:8.1f} ms  BBX: {bbx_range * 1e3:8.1f} ms")
+        os.remove(ndjson_path)
+        os.remove(bbx_path)
+        os.rmdir(directory)
@@ -0,0 +1,272 @@
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from app.models.models_alarm import Alert
+from app.models.models_checkpoint import IngestCheckpoint
+from app.models.models_incident import Incident
+from app.models.models_occupancy import OccupancySnapshot
+from app.models.models_telemetry import Telemetry
+from app.pipeline.pipeline import Frame, IngestPipeline, build_pipeline
+from app.pipeline.stage_occupancy import OccupancyStage
+from ._http_clients import run_clients
+from ._synthetic import make_telemetry
+from .prune_telemetry import delete_telemetry
+
+PREFIX = 'BENCH-'
+# Ramki innych tagów z ostatnich sekund oznaczają działający listener
+ACTIVE_WRITER_S = 60
+
+PATHS = {
+    False: {'telemetry': '/api/telemetry/', 'alerts': '/api/alerts/'},
+    True: {'telemetry': '/api/async/telemetry/', 'alerts': '/api/async/alerts/'},
+}
+
+
+class TrackedOccupancyStage(OccupancyStage):
+    """Zapamiętuje identyfikatory zatwierdzonych snapshotów - sprzątanie usuwa tylko je."""
+
+    def __init__(self, created):
+        super().__init__()
+        self.created = created
+        self.uncommitted = []
+
+    def process(self, frames):
+        # Poprzednia paczka się powiodła (po błędzie rollback() wyczyścił listę)
+        self.created += self.uncommitted
+        self.uncommitted = []
+        super().process(frames)
+
+    def write(self, frames):
+        pending = self.pending
+        super().write(frames)
+        self.uncommitted = [snapshot.pk for snapshot in pending if snapshot.pk is not None]
+
+    def rollback(self):
+        super().rollback()
+        self.uncommitted = []
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark rywalizacji zapisu z odczytem: ingest pełnym potokiem w tym procesie ze stałą "
+        "częstotliwością ramek (paczki jak w listenerze) i równolegle pula klientów HTTP odpytujących "
+        "historię telemetrii i alertów na lokalnym serwerze (runserver albo --url). "
+        "Fazy: sam ingest, samo API, oba naraz. Podaje opóźnienie ingestu (od nadejścia ramki do "
+        "zatwierdzenia paczki) i percentyle czasu odpowiedzi API. Ramki benchmarku (tagi BENCH-*) "
+        "oraz utworzone przez niego alerty, punkty kontrolne, akcje i snapshoty są na końcu usuwane."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--rate', type=float, default=1.0, help="Ramek na sekundę na tag")
+        parser.add_argument('--clients', type=int, default=8, help="Równoległych klientów HTTP")
+        parser.add_argument('--seconds', type=float, default=20.0, help="Czas każdej fazy")
+        parser.add_argument('--history', type=int, default=600, help="Sekundy historii zapisane przed pomiarem")
+        parser.add_argument('--window', type=float, default=300.0, help="Okno historii w zapytaniach klientów [s]")
+        parser.add_argument('--url', help="Adres działającego serwera (domyślnie runserver uruchamiany przez benchmark)")
+        parser.add_argument('--async', dest='async_views', action='store_true', help="Widoki /api/async/...")
+
+    def handle(self, *args, **options):
+        if Incident.current() is not None:
+            raise CommandError("Jest otwarta akcja - zamknij ją przed benchmarkiem")
+        recent = datetime.now(timezone.utc) - timedelta(seconds=ACTIVE_WRITER_S)
+        if Telemetry.objects.filter(timestamp__gte=recent).exclude(tag_id__startswith=PREFIX).exists():
+            raise CommandError(f"Inny proces zapisywał telemetrię w ciągu {ACTIVE_WRITER_S} s - zatrzymaj listener")
+        self.options = options
+        self.tags = options['tags']
+        self.snapshots = []
+        server = None
+        self.describe()
+        try:
+            self.seed(options['history'])
+            if options['url']:
+                url = options['url'].rstrip('/')
+            else:
+                server, url = self.start_server()
+            self.sequence = options['history']
+            # Klienci w osobnym procesie - wątki HTTP nie zabierają GIL ingestowi
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                # Start procesu klientów poza pomiarem
+                executor.submit(time.sleep, 0).result()
+                self.report_ingest('sam ingest', self.ingest(time.time() + 0.5))
+                start_at = time.time() + 0.5
+                self.report_api('samo API', *executor.submit(
+                    run_clients, url, self.targets(), start_at, options['seconds'], options['window'],
+                ).result())
+                start_at = time.time() + 0.5
+                clients = executor.submit(
+                    run_clients, url, self.targets(), start_at, options['seconds'], options['window'],
+                )
+                self.report_ingest('ingest + API', self.ingest(start_at))
+                self.report_api('ingest + API', *clients.result())
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            self.cleanup()
+
+    def cleanup(self):
+        """
+        Usuwa tylko to, co zapisał benchmark: ramki i alerty tagów BENCH-*, ich punkty kontrolne,
+        snapshoty zajętości z potoku benchmarku i akcje, w których nie ma innych ramek.
+        """
+        frames = Telemetry.objects.filter(tag_id__startswith=PREFIX)
+        incidents = set(frames.exclude(incident=None).values_list('incident_id', flat=True).distinct())
+        ids = list(frames.values_list('id', flat=True))
+        for k in range(0, len(ids), 2000):
+            delete_telemetry(ids[k:k + 2000])
+        Alert.objects.filter(tag_id__startswith=PREFIX).delete()
+        IngestCheckpoint.objects.filter(tag_id__startswith=PREFIX).delete()
+        OccupancySnapshot.objects.filter(id__in=self.snapshots).delete()
+        shared = Incident.objects.filter(id__in=incidents).filter(
+            Exists(Telemetry.objects.filter(incident=OuterRef('pk'))) | Exists(Alert.objects.filter(incident=OuterRef('pk')))
+        )
+        for incident in shared:
+            self.stderr.write(f"Akcja {incident.pk} ma ramki spoza benchmarku - nie została usunięta")
+        Incident.objects.filter(id__in=incidents).exclude(id__in=shared.values('id')).delete()
+
+    def describe(self):
+        options = self.options
+        line = (
+            f"CPU: {os.cpu_count()}, baza: {connection.vendor}, {self.tags} tagów x {options['rate']:g} Hz, "
+            f"paczki do {settings.INGEST_MAX_BATCH_SIZE} / {settings.INGEST_FLUSH_INTERVAL_S} s, "
+            f"{options['clients']} klientów HTTP (okno {options['window']:g} s)"
+        )
+        if settings.INGEST_DEADBAND:
+            line += ", deadband"
+        self.stdout.write(line)
+
+    def message(self, i, t, n):
+        data = make_telemetry(i, t, seed=n * self.tags + i)
+        data['tag_id'] = f"{PREFIX}{i:04d}"
+        data['timestamp'] = datetime.fromtimestamp(t, tz=timezone.utc).isoformat()
+        data['sequence'] = n
+        return data
+
+    def seed(self, seconds):
+        """Historia z ostatnich `seconds` s (sam zapis telemetrii), żeby zapytania klientów miały co czytać."""
+        pipeline = IngestPipeline()
+        t0 = time.time() - seconds
+        for n in range(seconds):
+            pipeline.run([Frame.from_message(self.message(i, t0 + n, n)) for i in range(self.tags)])
+        self.stdout.write(f"Historia: {seconds * self.tags} ramek")
+
+    def start_server(self):
+        """runserver (wątkowy, bez autoreload) na wolnym porcie, z ustawieniami tego procesu."""
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', '--noreload', f'127.0.0.1:{port}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server, f'http://127.0.0.1:{port}'
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    server.kill()
+                    raise CommandError(f"Serwer nie wystartował (kod {server.poll()})")
+                time.sleep(0.2)
+
+    def targets(self):
+        """Cele każdego klienta: historia "jego" tagu i alerty ramek benchmarku."""
+        paths = PATHS[self.options['async_views']]
+        return [
+            [('telemetry', paths['telemetry'], {'tag': f"{PREFIX}{k % self.tags:04d}"}),
+             ('alerts', paths['alerts'], {'firefighter': PREFIX})]
+            for k in range(self.options['clients'])
+        ]
+
+    def ingest(self, start_at):
+        """
+        Ramki wszystkich tagów co 1/rate s od `start_at`; bufor zapisywany paczką po
+        INGEST_MAX_BATCH_SIZE ramek albo co INGEST_FLUSH_INTERVAL_S (jak flush_loop listenera).
+        Gdy zapis nie nadąża, zaległe ramki dochodzą do bufora od razu przy następnym obiegu.
+        Zwraca (opóźnienia ramek, czasy paczek, ramki, zapisane, błędy).
+        """
+        step = 1.0 / self.options['rate']
+        ticks = int(self.options['seconds'] * self.options['rate'])
+        pipeline = build_pipeline()
+        pipeline.stages = [
+            TrackedOccupancyStage(self.snapshots) if isinstance(stage, OccupancyStage) else stage
+            for stage in pipeline.stages
+        ]
+        buffer, lags, batches = [], [], []
+        frames = stored = errors = 0
+        while time.time() < start_at:
+            time.sleep(0.01)
+        origin = time.perf_counter() - (time.time() - start_at)
+        next_flush = origin + settings.INGEST_FLUSH_INTERVAL_S
+        tick = 0
+        while tick < ticks or buffer:
+            now = time.perf_counter()
+            while tick < ticks and origin + tick * step <= now:
+                due = origin + tick * step
+                t = start_at + tick * step
+                n = self.sequence + tick
+                buffer += [(due, Frame.from_message(self.message(i, t, n))) for i in range(self.tags)]
+                tick += 1
+            timed = now >= next_flush
+            if buffer and (timed or len(buffer) >= settings.INGEST_MAX_BATCH_SIZE or tick >= ticks):
+                batch, buffer = buffer, []
+                start = time.perf_counter()
+                try:
+                    stored += pipeline.run([frame for _, frame in batch])
+                except Exception as e:
+                    # Jak listener: paczka przepada, błąd trafia do raportu
+                    errors += 1
+                    self.stderr.write(f"Błąd zapisu paczki: {e}")
+                done = time.perf_counter()
+                batches.append(done - start)
+                lags += [done - due for due, _ in batch]
+                frames += len(batch)
+            if timed:
+                next_flush = time.perf_counter() + settings.INGEST_FLUSH_INTERVAL_S
+            if tick < ticks:
+                time.sleep(max(min(next_flush, origin + tick * step) - time.perf_counter(), 0))
+        self.sequence += ticks
+        return lags, batches, frames, stored, errors
+
+    def report_ingest(self, label, result):
+        lags, batches, frames, stored, errors = result
+        line = (
+            f"{label:14s} ingest: {frames} ramek ({stored} zapisanych), opóźnienie p50 {self.p(lags, 50):7.1f} ms, "
+            f"p95 {self.p(lags, 95):7.1f} ms, p99 {self.p(lags, 99):7.1f} ms, max {max(lags, default=0) * 1e3:7.1f} ms"
+            f" | paczka p50 {self.p(batches, 50):6.1f} ms, max {max(batches, default=0) * 1e3:6.1f} ms"
+        )
+        if errors:
+            line += f" | utracone paczki: {errors}"
+        self.stdout.write(line)
+
+    def report_api(self, label, times, errors):
+        for target in ('telemetry', 'alerts'):
+            values = times.get(target, [])
+            line = (
+                f"{label:14s} {target:9s}: {len(values):5d} odpowiedzi ({len(values) / self.options['seconds']:6.1f}/s), "
+                f"p50 {self.p(values, 50):7.1f} ms, p95 {self.p(values, 95):7.1f} ms, "
+                f"p99 {self.p(values, 99):7.1f} ms, max {max(values, default=0) * 1e3:7.1f} ms"
+            )
+            if errors.get(target):
+                line += f" | błędy: {errors[target]}"
+            self.stdout.write(line)
+
+    @staticmethod
+    def p(values, q):
+        if len(values) < 2:
+            return values[0] * 1e3 if values else 0.0
+        # inclusive: przy małej próbie p99 nie wychodzi poza max
+        return statistics.quantiles(values, n=100, method='inclusive')[q - 1] * 1e3
@@ -0,0 +1,124 @@
+import statistics
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+
+from app.models.models_telemetry import Telemetry
+from app.pipeline.pipeline import Frame, IngestPipeline
+from ._synthetic import make_telemetry
+from .prune_telemetry import delete_telemetry
+
+PREFIX = 'BENCH-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark skonfigurowanego backendu bazy: przepustowość zapisu paczek telemetrii "
+        "(na PostgreSQL COPY vs INSERT) oraz opóźnienia odczytów API w trakcie zapisu. "
+        "Ramki benchmarku (tagi BENCH-*) są na końcu usuwane."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--readers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        self.tags = options['tags']
+        self.tick = 0
+        self.describe()
+        try:
+            modes = [True, False] if connection.vendor == 'postgresql' else [settings.DB_BULK_COPY]
+            for copy in modes:
+                settings.DB_BULK_COPY = copy
+                label = 'COPY' if copy else 'INSERT'
+                writes = self.run(options['seconds'] / 2, readers=0)
+                self.report(f"{label}, sam zapis", writes, [], 0)
+                writes, reads, errors = self.run(options['seconds'], readers=options['readers'], mixed=True)
+                self.report(f"{label}, zapis + {options['readers']} czytelników", writes, reads, errors)
+        finally:
+            ids = list(Telemetry.objects.filter(tag_id__startswith=PREFIX).values_list('id', flat=True))
+            for k in range(0, len(ids), 2000):
+                delete_telemetry(ids[k:k + 2000])
+
+    def describe(self):
+        db = settings.DATABASES['default']
+        line = f"Backend: {connection.vendor} ({db['NAME']})"
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal = cursor.fetchone()[0]
+                cursor.execute('PRAGMA synchronous')
+                synchronous = cursor.fetchone()[0]
+            line += f", journal_mode={journal}, synchronous={synchronous}"
+        else:
+            line += f", CONN_MAX_AGE={db.get('CONN_MAX_AGE')}, pula={'pool' in db.get('OPTIONS', {})}"
+        self.stdout.write(line)
+
+    def batch(self):
+        t = time.time() + self.tick
+        self.tick += 1
+        frames = []
+        for i in range(self.tags):
+            frame = Frame.from_message(make_telemetry(i, t, seed=self.tick * self.tags + i))
+            frame.payload['tag_id'] = f"{PREFIX}{i:04d}"
+            frames.append(frame)
+        return frames
+
+    def run(self, seconds, readers=0, mixed=False):
+        stop = threading.Event()
+        writes, reads, errors = [], [], [0]
+        pipeline = IngestPipeline()
+
+        def writer():
+            try:
+                while not stop.is_set():
+                    frames = self.batch()
+                    start = time.perf_counter()
+                    try:
+                        pipeline.run(frames)
+                        writes.append(time.perf_counter() - start)
+                    except OperationalError:
+                        errors[0] += 1
+            finally:
+                connection.close()
+
+        def reader(k):
+            try:
+                while not stop.is_set():
+                    tag = f"{PREFIX}{k % self.tags:04d}"
+                    start = time.perf_counter()
+                    try:
+                        list(Telemetry.objects.filter(tag_id=tag).select_related('position', 'vitals')
+                             .order_by('-timestamp')[:50])
+                        reads.append(time.perf_counter() - start)
+                    except OperationalError:
+                        errors[0] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(k,)) for k in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return (writes, reads, errors[0]) if mixed else writes
+
+    def report(self, label, writes, reads, errors):
+        frames_s = len(writes) * self.tags / max(sum(writes), 1e-9)
+        line = f"{label:32s} zapis: {frames_s:8.0f} ramek/s, paczka p50 {self.p(writes, 50):6.1f} ms"
+        if reads:
+            line += f" | odczyt p50 {self.p(reads, 50):6.1f} ms, p95 {self.p(reads, 95):6.1f} ms, {len(reads)} zapytań"
+        if errors:
+            line += f" | błędy blokady: {errors}"
+        self.stdout.write(line)
+
+    @staticmethod
+    def p(values, q):
+        if len(values) < 2:
+            return values[0] * 1e3 if values else 0.0
+        return statistics.quantiles(values, n=100)[q - 1] * 1e3
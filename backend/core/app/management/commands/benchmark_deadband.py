@@ -0,0 +1,139 @@
+import math
+import statistics
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from app.models.models_alarm import Alert
+from app.models.models_checkpoint import IngestCheckpoint
+from app.models.models_incident import Incident
+from app.models.models_occupancy import OccupancySnapshot
+from app.models.models_telemetry import Telemetry
+from app.pipeline.pipeline import Frame, build_pipeline
+from app.resample import resample
+from ._synthetic import make_telemetry
+from .prune_telemetry import delete_telemetry
+
+PREFIX = 'BENCH-'
+TRACK_VALUES = ('timestamp', 'position__x', 'position__y', 'position__z', 'position__floor')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark filtra deadband: ten sam strumień ramek (tagi na zmianę w ruchu i w bezruchu) "
+        "przez pełny potok bez filtra i z filtrem. Podaje stopień kompresji, czas ingestu i błąd "
+        "trasy odtworzonej z ?fill=hold / linear względem zapisu pełnego. "
+        "Ramki benchmarku (tagi BENCH-*) i utworzone przez niego obiekty są na końcu usuwane."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--seconds', type=int, default=120)
+        parser.add_argument('--rate', type=float, default=4.0, help="Ramek na sekundę na tag")
+        parser.add_argument('--moving', type=float, default=30.0, help="Czas ruchu w cyklu [s]")
+        parser.add_argument('--stationary', type=float, default=60.0, help="Czas bezruchu w cyklu [s]")
+
+    def handle(self, *args, **options):
+        if Incident.current() is not None:
+            raise CommandError("Jest otwarta akcja - zamknij ją przed benchmarkiem")
+        last_incident = Incident.objects.aggregate(n=Max('id'))['n'] or 0
+        last_snapshot = OccupancySnapshot.objects.aggregate(n=Max('id'))['n'] or 0
+        deadband = settings.INGEST_DEADBAND
+        t0 = time.time() - options['seconds'] - 60
+        try:
+            results = {}
+            for enabled, prefix in ((False, f'{PREFIX}FULL-'), (True, f'{PREFIX}DB-')):
+                settings.INGEST_DEADBAND = enabled
+                frames = self.stream(prefix, t0, options)
+                results[enabled] = (len(frames), *self.ingest(frames))
+            self.report(results, options)
+        finally:
+            settings.INGEST_DEADBAND = deadband
+            ids = list(Telemetry.objects.filter(tag_id__startswith=PREFIX).values_list('id', flat=True))
+            for k in range(0, len(ids), 2000):
+                delete_telemetry(ids[k:k + 2000])
+            Alert.objects.filter(tag_id__startswith=PREFIX).delete()
+            IngestCheckpoint.objects.filter(tag_id__startswith=PREFIX).delete()
+            OccupancySnapshot.objects.filter(id__gt=last_snapshot).delete()
+            Incident.objects.filter(id__gt=last_incident).delete()
+
+    def stream(self, prefix, t0, options):
+        """
+        Ramki wszystkich tagów tick po ticku. W fazie bezruchu pozycja stoi w miejscu
+        (z szumem pomiaru), parametry życiowe zmieniają się powoli - jak u strażaka,
+        który czeka albo pracuje w jednym miejscu.
+        """
+        cycle = options['moving'] + options['stationary']
+        step = 1.0 / options['rate']
+        frames = []
+        for n in range(int(options['seconds'] * options['rate'])):
+            t = t0 + n * step
+            for i in range(options['tags']):
+                phase = (n * step + i * cycle / options['tags']) % cycle
+                # Pozycja zatrzymuje się na czas bezruchu w punkcie, w którym skończył się ruch
+                moved = (n * step + i * cycle / options['tags']) // cycle * options['moving'] \
+                    + min(phase, options['moving'])
+                data = make_telemetry(i, t0 + moved, seed=n * options['tags'] + i)
+                data['tag_id'] = f'{prefix}{i:04d}'
+                data['timestamp'] = datetime.fromtimestamp(t, tz=timezone.utc).isoformat()
+                data['sequence'] = n
+                data['vitals']['heart_rate_bpm'] = round(90 + 15 * math.sin(t / 90 + i))
+                data['vitals']['skin_temperature_c'] = round(36.5 + 0.3 * math.sin(t / 300 + i), 2)
+                data['vitals']['motion_state'] = 'walking' if phase < options['moving'] else 'stationary'
+                frames.append(Frame.from_message(data))
+        return frames
+
+    def ingest(self, frames):
+        """(zapisane ramki, czas [s]) - paczki jak w listenerze."""
+        pipeline = build_pipeline()
+        size = settings.INGEST_MAX_BATCH_SIZE
+        stored = 0
+        start = time.perf_counter()
+        for k in range(0, len(frames), size):
+            stored += pipeline.run(frames[k:k + size])
+        return stored, time.perf_counter() - start
+
+    def track(self, tag_id):
+        return [
+            {'timestamp': ts.isoformat(), 'x': x, 'y': y, 'z': z, 'floor': floor}
+            for ts, x, y, z, floor in Telemetry.objects.filter(tag_id=tag_id).order_by('timestamp')
+            .values_list(*TRACK_VALUES)
+        ]
+
+    def errors(self, options, mode):
+        """Odległości [m] punktów odtworzonych z zapisu z filtrem od punktów zapisu pełnego (ten sam czas)."""
+        step = 1.0 / options['rate']
+        distances, floors = [], 0
+        for i in range(options['tags']):
+            full = self.track(f'{PREFIX}FULL-{i:04d}')
+            filled = resample(self.track(f'{PREFIX}DB-{i:04d}'), step, mode)
+            for a, b in zip(full, filled):
+                if a['floor'] != b['floor']:
+                    floors += 1
+                distances.append(math.dist((a['x'], a['y'], a['z']), (b['x'], b['y'], b['z'])))
+        return distances, floors
+
+    def report(self, results, options):
+        frames, full_rows, full_time = results[False]
+        _, rows, elapsed = results[True]
+        self.stdout.write(
+            f"{options['tags']} tagów x {options['seconds']} s x {options['rate']:g} Hz, cykl: "
+            f"{options['moving']:g} s ruchu / {options['stationary']:g} s bezruchu"
+        )
+        self.stdout.write(
+            f"bez filtra: {full_rows:6d}/{frames} ramek zapisanych, ingest {full_time:6.2f} s "
+            f"({frames / full_time:5.0f} ramek/s)"
+        )
+        self.stdout.write(
+            f"deadband:   {rows:6d}/{frames} ramek zapisanych, ingest {elapsed:6.2f} s "
+            f"({frames / elapsed:5.0f} ramek/s), kompresja {frames / max(rows, 1):4.1f}x"
+        )
+        for mode in ('hold', 'linear'):
+            distances, floors = self.errors(options, mode)
+            quantiles = statistics.quantiles(distances, n=100)
+            self.stdout.write(
+                f"błąd trasy fill={mode:6s}: p50 {quantiles[49]:5.2f} m, p95 {quantiles[94]:5.2f} m, "
+                f"max {max(distances):5.2f} m, złe piętro: {floors}/{len(distances)}"
+            )
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+import orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from app.models.models_alarm import Alert
+from app.models.models_checkpoint import IngestCheckpoint
+from app.models.models_incident import Incident
+from app.models.models_occupancy import OccupancySnapshot
+from app.models.models_telemetry import Telemetry
+from app.pipeline.pipeline import Frame, IngestPipeline, build_pipeline
+from app.pipeline.workers import WorkerPool, telemetry_tag
+from ._synthetic import make_telemetry
+from .prune_telemetry import delete_telemetry
+
+PREFIX = 'BENCH-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark przepustowości ingestu: pełny potok w jednym procesie (jak listener) "
+        "vs. tryb wieloprocesowy z 1..N workerami (ramki dzielone po tag_id). "
+        "Ramki benchmarku (tagi BENCH-*) oraz utworzone przez niego alerty, punkty kontrolne, akcje "
+        "i snapshoty są na końcu usuwane."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=40)
+        parser.add_argument('--frames', type=int, default=100, help="Ramek na tag")
+        parser.add_argument('--workers', type=int, default=4, help="Największa liczba workerów")
+        parser.add_argument('--bare', action='store_true', help="Bez etapów potoku (sam zapis telemetrii)")
+
+    def handle(self, *args, **options):
+        # Benchmark otwiera własną akcję - nie może dopisywać ramek do prawdziwej
+        if Incident.current() is not None:
+            raise CommandError("Jest otwarta akcja - zamknij ją przed benchmarkiem")
+        stages = not options['bare']
+        tags, frames = options['tags'], options['frames']
+        # Każdy przebieg dostaje własny odcinek czasu (klucz SCBA zawiera znacznik czasu ramki)
+        t0 = time.time() - frames * (options['workers'] + 1)
+        self.stdout.write(
+            f"CPU: {os.cpu_count()}, {tags * frames} ramek ({tags} tagów), "
+            f"paczki do {settings.INGEST_MAX_BATCH_SIZE}, etapy: {'tak' if stages else 'nie'}"
+        )
+        last_incident = Incident.objects.aggregate(n=Max('id'))['n'] or 0
+        last_snapshot = OccupancySnapshot.objects.aggregate(n=Max('id'))['n'] or 0
+        try:
+            messages = self.messages(tags, frames, t0)
+            elapsed = self.in_process(messages, stages)
+            baseline = len(messages) / elapsed
+            self.stdout.write(f"{'w procesie':12s} {elapsed:7.2f} s {baseline:9.0f} ramek/s")
+            for workers in range(1, options['workers'] + 1):
+                messages = self.messages(tags, frames, t0 + workers * frames)
+                elapsed = self.with_workers(messages, workers, stages)
+                rate = len(messages) / elapsed
+                self.stdout.write(
+                    f"{f'workery: {workers}':12s} {elapsed:7.2f} s {rate:9.0f} ramek/s ({rate / baseline:4.2f}x)"
+                )
+        finally:
+            ids = list(Telemetry.objects.filter(tag_id__startswith=PREFIX).values_list('id', flat=True))
+            for k in range(0, len(ids), 2000):
+                delete_telemetry(ids[k:k + 2000])
+            Alert.objects.filter(tag_id__startswith=PREFIX).delete()
+            IngestCheckpoint.objects.filter(tag_id__startswith=PREFIX).delete()
+            OccupancySnapshot.objects.filter(id__gt=last_snapshot).delete()
+            Incident.objects.filter(id__gt=last_incident).delete()
+
+    def messages(self, tags, frames, t0):
+        """Surowe wiadomości `tag_telemetry` w kolejności nadawania (tick po ticku)."""
+        messages = []
+        for t in range(frames):
+            for i in range(tags):
+                data = make_telemetry(i, t0 + t, seed=t * tags + i)
+                data['tag_id'] = f"{PREFIX}{i:04d}"
+                messages.append(orjson.dumps(data))
+        return messages
+
+    def in_process(self, messages, stages):
+        """Jak listener bez workerów: dekodowanie i zapis paczkami w jednym procesie."""
+        pipeline = build_pipeline() if stages else IngestPipeline()
+        start = time.perf_counter()
+        batch = []
+        for message in messages:
+            batch.append(Frame.from_message(orjson.loads(message)))
+            if len(batch) >= settings.INGEST_MAX_BATCH_SIZE:
+                pipeline.run(batch)
+                batch = []
+        if batch:
+            pipeline.run(batch)
+        return time.perf_counter() - start
+
+    def with_workers(self, messages, workers, stages):
+        """Czas od pierwszej wysłanej ramki do zapisania ostatniej (bez startu procesów)."""
+        pool = WorkerPool(workers, stages=stages)
+        started = time.time()
+        pool.start()
+        try:
+            # Czekamy, aż każdy worker skończy django.setup i zacznie czytać kolejkę
+            while min(pool.heartbeats) <= started:
+                time.sleep(0.05)
+            return asyncio.run(self.feed(pool, messages))
+        finally:
+            pool.stop()
+
+    async def feed(self, pool, messages):
+        start = time.perf_counter()
+        for message in messages:
+            await pool.submit(telemetry_tag(message), message)
+        deadline = time.monotonic() + 300
+        while pool.total_processed() < len(messages):
+            if time.monotonic() > deadline:
+                raise CommandError(f"Workery przetworzyły tylko {pool.total_processed()}/{len(messages)} ramek")
+            await asyncio.sleep(0.01)
+        return time.perf_counter() - start
@@ -0,0 +1,80 @@
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from app.middleware import compress
+from app.models.models_telemetry import Telemetry
+from app.pipeline.pipeline import Frame, IngestPipeline
+from app.renderers import MessagePackRenderer, ORJSONRenderer
+from app.serializers.serializers_telemetry import TelemetrySerializer
+from app.views import TELEMETRY_PREFETCH, TELEMETRY_RELATED
+from ._synthetic import make_telemetry
+from .prune_telemetry import delete_telemetry
+
+PREFIX = 'BENCH-'
+
+RENDERERS = (
+    ('DRF JSON', JSONRenderer()),
+    ('orjson', ORJSONRenderer()),
+    ('MessagePack', MessagePackRenderer()),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark renderowania strony historii telemetrii: czas kodowania i liczba bajtów "
+        "dla JSON DRF, orjson i MessagePack, bez kompresji i z gzip / zstd. "
+        "Ramki benchmarku (tagi BENCH-*) są na końcu usuwane."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        try:
+            self.seed(rows)
+            queryset = (Telemetry.objects.filter(tag_id__startswith=PREFIX)
+                        .select_related(*TELEMETRY_RELATED).prefetch_related(*TELEMETRY_PREFETCH))
+            start = time.perf_counter()
+            data = TelemetrySerializer(queryset, many=True).data
+            self.stdout.write(f"{len(data)} wierszy, serializacja DRF: {(time.perf_counter() - start) * 1e3:.0f} ms")
+            self.stdout.write(f"{'format':12s} {'kodowanie':>11s} {'bajty':>12s} {'gzip':>27s} {'zstd':>27s}")
+            for label, renderer in RENDERERS:
+                self.report(label, renderer, data, options['repeat'])
+        finally:
+            ids = list(Telemetry.objects.filter(tag_id__startswith=PREFIX).values_list('id', flat=True))
+            for k in range(0, len(ids), 2000):
+                delete_telemetry(ids[k:k + 2000])
+
+    def seed(self, rows, tags=10):
+        pipeline = IngestPipeline()
+        t0 = time.time() - rows // tags
+        for t in range(0, rows // tags):
+            batch = []
+            for i in range(tags):
+                frame = Frame.from_message(make_telemetry(i, t0 + t, seed=t * tags + i, uwb=True))
+                frame.payload['tag_id'] = f"{PREFIX}{i:04d}"
+                batch.append(frame)
+            pipeline.run(batch)
+
+    def report(self, label, renderer, data, repeat):
+        content, encode = self.timed(lambda: renderer.render(data, renderer.media_type), repeat)
+        line = f"{label:12s} {encode:8.1f} ms {len(content):12,d}"
+        for encoding in ('gzip', 'zstd'):
+            compressed, elapsed = self.timed(lambda: compress(encoding, content), repeat)
+            ratio = len(content) / len(compressed)
+            line += f" {len(compressed):10,d} ({ratio:4.1f}x) {elapsed:5.1f} ms"
+        self.stdout.write(line)
+
+    @staticmethod
+    def timed(func, repeat):
+        """Wynik i najlepszy czas z `repeat` prób (ms)."""
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - start) * 1e3
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
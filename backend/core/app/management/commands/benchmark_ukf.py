@@ -0,0 +1,46 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from app.filters.ukf_filter import BatchedUKF
+from app.pipeline.pipeline import Frame
+from app.pipeline.stage_ukf import UKFStage
+from ._synthetic import make_telemetry
+
+
+class Command(BaseCommand):
+    help = "Mierzy koszt jednego ticku filtra UKF dla zadanej liczby tagów"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=100)
+        parser.add_argument('--ticks', type=int, default=500)
+
+    def handle(self, *args, **options):
+        tags, ticks = options['tags'], options['ticks']
+
+        # 1. Sam filtr na gotowych tablicach
+        ukf = BatchedUKF(capacity=tags)
+        rows = np.arange(tags)
+        r_var = np.full(tags, 0.09)
+        rng = np.random.default_rng(0)
+        ukf.step(rows, rng.normal(size=(tags, 3)), np.zeros(tags), r_var)
+        start = time.perf_counter()
+        for tick in range(1, ticks + 1):
+            ukf.step(rows, rng.normal(size=(tags, 3)), np.full(tags, tick * 0.5), r_var)
+        filter_s = (time.perf_counter() - start) / ticks
+
+        # 2. Cały etap potoku razem z budową tablic z ramek
+        stage = UKFStage()
+        batches = [
+            [Frame.from_message(make_telemetry(i, 1000 + tick * 0.5, seed=tick * tags + i)) for i in range(tags)]
+            for tick in range(ticks)
+        ]
+        stage.process(batches[0])
+        start = time.perf_counter()
+        for frames in batches[1:]:
+            stage.process(frames)
+        stage_s = (time.perf_counter() - start) / (ticks - 1)
+
+        self.stdout.write(f"Tagów: {tags}, ticków: {ticks}")
+        self.stdout.write(f"Filtr UKF:  {filter_s * 1e3:.3f} ms/tick, {filter_s / tags * 1e6:.2f} µs/ramkę")
+        self.stdout.write(f"Etap UKF:   {stage_s * 1e3:.3f} ms/tick, {stage_s / tags * 1e6:.2f} µs/ramkę")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.archive.blackbox import write_queryset
+from app.models.models_telemetry import Telemetry
+
+
+class Command(BaseCommand):
+    help = "Eksportuje telemetrię tagu (opcjonalnie jednej akcji) do pliku czarnej skrzynki (.bbx)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('tag_id')
+        parser.add_argument('output')
+        parser.add_argument('--incident', type=int)
+        parser.add_argument('--chunk-size', type=int, default=1024)
+
+    def handle(self, *args, **options):
+        queryset = Telemetry.objects.all()
+        if options['incident'] is not None:
+            queryset = queryset.filter(incident_id=options['incident'])
+        first = queryset.filter(tag_id=options['tag_id']).exclude(firefighter=None).values_list('firefighter_id', flat=True).first()
+        with open(options['output'], 'wb') as f:
+            count = write_queryset(f, queryset, options['tag_id'], first, options['chunk_size'])
+        if not count:
+            raise CommandError(f"Brak telemetrii dla {options['tag_id']}")
+        self.stdout.write(self.style.SUCCESS(f"Zapisano {count} ramek do {options['output']}"))
@@ -0,0 +1,89 @@
+from datetime import datetime, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+
+from app import history_cache
+from app.archive.blackbox import BlackBoxError, BlackBoxReader
+from app.models.models_telemetry import Telemetry
+from app.pipeline.pipeline import Frame, IngestPipeline
+
+
+# Pola rekordu -> payloadu, które mogą mieć braki (NULL w pliku); brak zostawiamy domyślnej wartości serializera
+OPTIONAL = (
+    ('accuracy_m', 'accuracy_m'), ('heading_deg', 'heading_deg'), ('heart_rate_variability', 'hrv'),
+    ('skin_temperature', 'skin_temperature'), ('stress_level', 'stress_level'),
+)
+
+
+def frame_payload(record, incident_id=None):
+    """
+    Płaski rekord czarnej skrzynki -> payload TelemetryLiteSerializer.
+    Plik nie zawiera baterii ani temperatury otoczenia - zostają puste (None).
+    """
+    payload = {
+        'firefighter_id': record['firefighter_id'],
+        'tag_id': record['tag_id'],
+        'timestamp': record['timestamp'],
+        'incident_id': incident_id,
+        'pos_x': record['x'],
+        'pos_y': record['y'],
+        'pos_z': record['z'],
+        'floor': record['floor'],
+        'heart_rate': record['heart_rate'],
+        'motion_state': record['motion_state'],
+        'scba_pressure': record['scba_pressure'],
+        'battery_level': None,
+        'temperature': None,
+        'source': 'blackbox',
+    }
+    payload.update((key, record[name]) for key, name in OPTIONAL if record[name] is not None)
+    return payload
+
+
+def timestamp_ms(value):
+    """Znacznik czasu [ms] - w tej rozdzielczości zapisuje go czarna skrzynka."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return round(value.timestamp() * 1000)
+
+
+class Command(BaseCommand):
+    help = (
+        "Importuje plik czarnej skrzynki (.bbx) do tabel telemetrii (bez etapów potoku). "
+        "Ramki, które już są w bazie (ten sam tag i znacznik czasu), są pomijane."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input')
+        parser.add_argument('--incident', type=int, help="Przypisz ramki do akcji")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            reader = BlackBoxReader(options['input'])
+        except (OSError, BlackBoxError) as e:
+            raise CommandError(str(e))
+
+        pipeline = IngestPipeline()
+        saved = 0
+        with reader:
+            existing = set()
+            if len(reader):
+                # ±1 ms: znaczniki w bazie mają µs, w pliku są zaokrąglone do ms
+                first = datetime.fromtimestamp((reader.index['first_ms'][0] - 1) / 1000, tz=dt_timezone.utc)
+                last = datetime.fromtimestamp((reader.index['last_ms'][-1] + 1) / 1000, tz=dt_timezone.utc)
+                existing = {
+                    timestamp_ms(t) for t in Telemetry.objects.filter(
+                        tag_id=reader.tag_id, timestamp__range=(first, last)).values_list('timestamp', flat=True)
+                }
+            batch = []
+            for record in reader.records():
+                if timestamp_ms(record['timestamp']) in existing:
+                    continue
+                batch.append(Frame({}, frame_payload(record, options['incident'])))
+                if len(batch) >= options['batch_size']:
+                    saved += pipeline.run(batch)
+                    batch = []
+            if batch:
+                saved += pipeline.run(batch)
+        history_cache.bump_epoch()
+        self.stdout.write(self.style.SUCCESS(f"Zaimportowano {saved}/{len(reader)} ramek {reader.tag_id}"))
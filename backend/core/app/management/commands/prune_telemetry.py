@@ -0,0 +1,173 @@
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app import history_cache
+from app.models.models_alarm import PositionLite, AlertDetails
+from app.models.models_telemetry import (
+    Telemetry, Position, Trilateration, RawPosition, Drift, GPS, UWBMeasurement, Vector3, Orientation, IMU,
+    PassStatus, Barometer, Vitals, ScbaAlarms, SCBA, Recco, BlackBox, Device,
+)
+
+# Bezpośrednie podrekordy Telemetry (pole FK -> model)
+TELEMETRY_CHILDREN = (
+    ('position_id', Position), ('imu_id', IMU), ('pass_status_id', PassStatus), ('barometer_id', Barometer),
+    ('vitals_id', Vitals), ('scba_id', SCBA), ('recco_id', Recco), ('black_box_id', BlackBox),
+    ('device_id', Device),
+)
+
+# Osierocone rekordy: model i warunek "nikt na mnie nie wskazuje".
+# Kolejność ma znaczenie - najpierw rodzice, potem ich podrekordy.
+ORPHANS = (
+    (Position, Q(telemetry__isnull=True)),
+    (Vitals, Q(telemetry__isnull=True)),
+    (IMU, Q(telemetry__isnull=True)),
+    (PassStatus, Q(telemetry__isnull=True)),
+    (Barometer, Q(telemetry__isnull=True)),
+    (SCBA, Q(telemetry__isnull=True)),
+    (Recco, Q(telemetry__isnull=True)),
+    (BlackBox, Q(telemetry__isnull=True)),
+    (Device, Q(telemetry__isnull=True)),
+    (UWBMeasurement, Q(telemetry__isnull=True)),
+    (Trilateration, Q(position__isnull=True)),
+    (Drift, Q(position__isnull=True)),
+    (GPS, Q(position__isnull=True)),
+    (RawPosition, Q(raw_of__isnull=True, filtered_of__isnull=True)),
+    (Orientation, Q(imu__isnull=True)),
+    (Vector3, Q(accel_of__isnull=True, gyro_of__isnull=True, mag_of__isnull=True)),
+    (ScbaAlarms, Q(scba__isnull=True)),
+    (PositionLite, Q(alert__isnull=True)),
+    (AlertDetails, Q(alert__isnull=True)),
+)
+
+
+def delete_telemetry(ids):
+    """Usuwa ramki razem z bezpośrednimi podrekordami. Głębsze sprząta `Command.sweep`."""
+    fields = [field for field, _ in TELEMETRY_CHILDREN]
+    children = list(Telemetry.objects.filter(id__in=ids).values_list(*fields))
+    with transaction.atomic():
+        Telemetry.objects.filter(id__in=ids).delete()
+        for k, (_, model) in enumerate(TELEMETRY_CHILDREN):
+            child_ids = [row[k] for row in children if row[k] is not None]
+            if child_ids:
+                model.objects.filter(pk__in=child_ids).delete()
+
+
+class Command(BaseCommand):
+    help = (
+        "Retencja telemetrii: przerzedza ramki starsze niż RETENTION_RAW_HOURS do jednej na tag "
+        "na RETENTION_DOWNSAMPLE_S, usuwa ramki starsze niż RETENTION_DELETE_DAYS i sprząta osierocone "
+        "podrekordy. Usuwa paczkami po --batch-size, każda w osobnej transakcji."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw-hours', type=float, default=settings.RETENTION_RAW_HOURS)
+        parser.add_argument('--downsample-s', type=float, default=settings.RETENTION_DOWNSAMPLE_S)
+        parser.add_argument('--delete-days', type=float, default=settings.RETENTION_DELETE_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.RETENTION_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Tylko policz, nic nie usuwaj")
+        parser.add_argument('--loop', action='store_true', help="Tryb cykliczny co RETENTION_INTERVAL_S")
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        while True:
+            self.run(options)
+            if not options['loop']:
+                break
+            try:
+                time.sleep(settings.RETENTION_INTERVAL_S)
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Zatrzymano retencję.'))
+                break
+
+    def run(self, options):
+        now = timezone.now()
+        deleted = 0
+        if options['delete_days'] is not None:
+            deleted = self.expire(now - timedelta(days=options['delete_days']))
+            self.stdout.write(f"Usunięto {deleted} ramek starszych niż {options['delete_days']} dni")
+
+        kept, dropped = self.downsample(now - timedelta(hours=options['raw_hours']), options['downsample_s'])
+        self.stdout.write(f"Przerzedzanie: zachowano {kept}, usunięto {dropped} ramek")
+
+        for model, orphaned in ORPHANS:
+            swept = self.sweep(model, orphaned)
+            if swept:
+                self.stdout.write(f"Osierocone {model.__name__}: {swept}")
+        if (deleted or dropped) and not self.dry_run:
+            history_cache.bump_epoch()
+        self.stdout.write(self.style.SUCCESS(f"Retencja zakończona w {(timezone.now() - now).total_seconds():.1f} s"))
+
+    def pause(self):
+        """Krótka przerwa między paczkami, żeby nie blokować zapisu listenera."""
+        time.sleep(settings.RETENTION_BATCH_PAUSE_S)
+
+    def expire(self, cutoff):
+        deleted = 0
+        while True:
+            queryset = Telemetry.objects.filter(timestamp__lt=cutoff)
+            if self.dry_run:
+                return queryset.count()
+            ids = list(queryset.order_by('timestamp').values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                return deleted
+            delete_telemetry(ids)
+            deleted += len(ids)
+            self.pause()
+
+    def downsample(self, cutoff, step_s):
+        """
+        Zostawia pierwszą ramkę każdego tagu w każdym przedziale `step_s` sekund.
+        Granica jest wyrównana do przedziału, więc kolejne uruchomienia nie dzielą przedziałów,
+        a zachowane ramki oznaczane są `downsampled=True` i nie są skanowane ponownie.
+        """
+        cutoff_ts = cutoff.timestamp() // step_s * step_s
+        cutoff = datetime.fromtimestamp(cutoff_ts, tz=cutoff.tzinfo)
+        last_bucket = {}
+        kept = dropped = 0
+        after = None
+        while True:
+            queryset = Telemetry.objects.filter(downsampled=False, timestamp__lt=cutoff)
+            if after is not None:
+                queryset = queryset.filter(Q(timestamp__gt=after[0]) | Q(timestamp=after[0], id__gt=after[1]))
+            rows = list(queryset.order_by('timestamp', 'id').values_list('id', 'tag_id', 'timestamp')[:self.batch_size])
+            if not rows:
+                return kept, dropped
+
+            keep, drop = [], []
+            for pk, tag_id, ts in rows:
+                bucket = int(ts.timestamp() // step_s)
+                if last_bucket.get(tag_id) == bucket:
+                    drop.append(pk)
+                else:
+                    last_bucket[tag_id] = bucket
+                    keep.append(pk)
+            kept += len(keep)
+            dropped += len(drop)
+            after = rows[-1][2], rows[-1][0]
+            if self.dry_run:
+                continue
+
+            with transaction.atomic():
+                Telemetry.objects.filter(id__in=keep).update(downsampled=True)
+                if drop:
+                    delete_telemetry(drop)
+            self.pause()
+
+    def sweep(self, model, orphaned):
+        swept = 0
+        while True:
+            queryset = model.objects.filter(orphaned)
+            if self.dry_run:
+                return queryset.count()
+            ids = list(queryset.values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return swept
+            model.objects.filter(pk__in=ids).delete()
+            swept += len(ids)
+            self.pause()
@@ -1,14 +1,22 @@
 import asyncio
-import json
+import contextlib
+import orjson
 import logging
+import signal
 import websockets
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from asgiref.sync import sync_to_async
 from django.db import transaction
 
-from app.serializers.serializers_telemetry_lite import TelemetryLiteSerializer, AlertLiteSerializer
+from app import history_cache
+from app.serializers.serializers_telemetry_lite import AlertLiteSerializer
 from app.serializers.serializers_firefighter import FirefighterSerializer 
 from app.models.model_firefighter import Firefighter
+from app.models.models_beacon import Beacon
+from app.models.models_incident import Incident
+from app.pipeline.pipeline import Frame, build_pipeline
+from app.pipeline.workers import WorkerPool, telemetry_tag
 
 logger = logging.getLogger(__name__)
 
@@ -18,14 +26,73 @@ WS_URL = "wss://niesmiertelnik.replit.app/ws"
 class Command(BaseCommand):
     help = "Uruchamia klienta WebSocket do zbierania danych z symulatora PSP"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help="Liczba procesów zapisujących telemetrię (ramki dzielone po tag_id); 0 = zapis w tym procesie",
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Uruchamianie nasłuchu telemetrii...'))
+        self.pool = None
+        if options['workers'] > 0:
+            self.pool = WorkerPool(options['workers'])
+            self.pool.start()
+            self.stdout.write(f"Uruchomiono {options['workers']} workerów ingestu")
         try:
             asyncio.run(self.listen_to_simulator())
         except KeyboardInterrupt:
-            self.stdout.write(self.style.WARNING('Zatrzymano nasłuch.'))
+            self.stdout.write(self.style.WARNING('Przerwano nasłuch.'))
+        finally:
+            if self.pool is not None:
+                # Workery zapisują wszystko, co jest w ich kolejkach, i swoje bufory
+                self.pool.stop(timeout=settings.INGEST_SHUTDOWN_TIMEOUT_S)
+        self.stdout.write(self.style.WARNING('Zatrzymano nasłuch.'))
 
     async def listen_to_simulator(self):
+        """
+        Nasłuch do SIGINT / SIGTERM, potem łagodne zatrzymanie: koniec czytania,
+        zapis bufora (i bieżącej paczki) w czasie INGEST_SHUTDOWN_TIMEOUT_S.
+        """
+        self.pipeline = build_pipeline()
+        self.buffer = []
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # Windows nie obsługuje add_signal_handler - zostaje KeyboardInterrupt
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(sig, self.stopping.set)
+        self.flush_task = asyncio.create_task(self.flush_loop())
+        if self.pool is not None:
+            self.health_task = asyncio.create_task(self.pool.health_loop())
+
+        reader = asyncio.create_task(self.read_messages())
+        # Nieoczekiwany błąd czytania też kończy nasłuch, ale dopiero po zapisie bufora
+        reader.add_done_callback(lambda task: self.stopping.set())
+        await self.stopping.wait()
+        self.stdout.write(self.style.WARNING('Zatrzymywanie nasłuchu - zapis zbuforowanych ramek...'))
+        reader.cancel()
+        if self.pool is not None:
+            self.health_task.cancel()
+        await asyncio.wait([reader])
+        try:
+            await asyncio.wait_for(self.drain(), settings.INGEST_SHUTDOWN_TIMEOUT_S)
+        except TimeoutError:
+            logger.error(f"Nie zapisano bufora w {settings.INGEST_SHUTDOWN_TIMEOUT_S} s - pozostałe ramki przepadają")
+        if not reader.cancelled():
+            reader.result()
+
+    async def drain(self):
+        # flush_loop kończy bieżącą paczkę, resztę bufora zapisujemy tutaj
+        await self.flush_task
+        await self.flush()
+        try:
+            # Np. niepełny interwał mapy zajętości - zapisywany dopiero przy następnym
+            await sync_to_async(self.pipeline.close)()
+        except Exception as e:
+            logger.error(f"Błąd zapisu stanu potoku: {e}")
+
+    async def read_messages(self):
         """Główna pętla połączenia z automatycznym wznawianiem"""
         while True:
             try:
@@ -34,7 +101,12 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.SUCCESS("--> Połączono z symulatorem!"))
                     
                     async for message in websocket:
-                        data = json.loads(message)
+                        # W trybie wieloprocesowym ramki telemetrii dekodują workery
+                        tag_id = telemetry_tag(message) if self.pool is not None else None
+                        if tag_id is not None:
+                            await self.pool.submit(tag_id, message)
+                            continue
+                        data = orjson.loads(message)
                         await self.process_message(data)
                         
             except (websockets.ConnectionClosed, OSError) as e:
@@ -49,13 +121,20 @@ class Command(BaseCommand):
         if msg_type == 'firefighters_list':
             await self.handle_firefighters_list(data)
         elif msg_type == 'tag_telemetry':
-            await self.handle_telemetry(data)
+            self.handle_telemetry(data)
+            if len(self.buffer) >= settings.INGEST_MAX_BATCH_SIZE:
+                await self.flush()
         elif msg_type == 'alert':
             await self.handle_alert(data)
         elif msg_type == 'welcome':
             self.stdout.write(f"Wersja symulatora: {data.get('simulator_version')}")
         elif msg_type == 'beacons_config':
             logger.info(f"Otrzymano konfigurację {len(data['beacons'])} beaconów.")
+            await self.handle_beacons_config(data)
+            if self.pool is not None:
+                self.pool.broadcast_beacons(data['beacons'])
+            else:
+                self.pipeline.update_beacons(data['beacons'])
 
     @sync_to_async
     @transaction.atomic
@@ -92,32 +171,49 @@ class Command(BaseCommand):
                 logger.error(f"Błąd walidacji Firefighter dla {payload['id']}: {serializer.errors}")
 
     @sync_to_async
-    def handle_telemetry(self, data):
-        """Mapuje zagnieżdżony JSON z symulatora na płaską strukturę i zapisuje."""
+    @transaction.atomic
+    def handle_beacons_config(self, data):
+        """Zapisuje konfigurację beaconów (statystyki zostają nienaruszone)."""
+        for beacon in data.get('beacons', []):
+            position = beacon.get('position') or {}
+            try:
+                Beacon.objects.update_or_create(
+                    id=beacon['id'],
+                    defaults={
+                        'name': beacon.get('name') or '',
+                        'type': beacon.get('type') or '',
+                        'x': position.get('x', 0.0),
+                        'y': position.get('y', 0.0),
+                        'z': position.get('z', 0.0),
+                        'floor': beacon.get('floor'),
+                        'config': beacon,
+                    },
+                )
+            except KeyError as e:
+                logger.error(f"Brakujący klucz w konfiguracji beacona: {e}")
+
+    async def flush_loop(self):
+        """Okresowo przepuszcza zbuforowane ramki przez potok ingestu (do zatrzymania nasłuchu)."""
+        while not self.stopping.is_set():
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self.stopping.wait(), settings.INGEST_FLUSH_INTERVAL_S)
+            await self.flush()
+
+    async def flush(self):
+        """Zapisuje bieżący bufor telemetrii jedną paczką."""
+        if not self.buffer:
+            return
+        frames, self.buffer = self.buffer, []
         try:
-            payload = {
-                'firefighter_id': data['firefighter']['id'],
-                'tag_id': data['tag_id'],
-                'timestamp': data['timestamp'],
-                'sequence': data.get('sequence', 0),
-                'pos_x': data['position']['x'],
-                'pos_y': data['position']['y'],
-                'pos_z': data['position']['z'],
-                'floor': data['position']['floor'],
-                'heading_deg': data.get('heading_deg', 0.0),
-                'heart_rate': data['vitals']['heart_rate_bpm'],
-                'motion_state': data['vitals']['motion_state'],
-                'scba_pressure': data['scba']['cylinder_pressure_bar'],
-                'battery_level': data['device']['battery_percent'],
-                'temperature': data['environment']['temperature_c'],
-            }
+            saved = await sync_to_async(self.pipeline.run)(frames)
+            self.stdout.write(f"✅ Telemetria: zapisano {saved}/{len(frames)} ramek")
+        except Exception as e:
+            logger.error(f"Błąd zapisu paczki telemetrii: {e}")
 
-            serializer = TelemetryLiteSerializer(data=payload)
-            if serializer.is_valid():
-                obj = serializer.save()
-                self.stdout.write(f"✅ Telemetria: {data['firefighter']['name']} (ID={obj.pk})")
-            else:
-                self.stdout.write(self.style.ERROR(f"❌ Błąd walidacji telemetrii: {serializer.errors}"))
+    def handle_telemetry(self, data):
+        """Mapuje zagnieżdżony JSON z symulatora na płaską strukturę i buforuje do zapisu."""
+        try:
+            self.buffer.append(Frame.from_message(data))
 
         except KeyError as e:
             self.stdout.write(self.style.ERROR(f"❌ Brakujący klucz: {e}"))
@@ -128,6 +224,7 @@ class Command(BaseCommand):
     def handle_alert(self, data):
         """Obsługa alertów"""
         try:
+            incident = Incident.current()
             payload = {
                 'external_id': data['id'],
                 'alert_type': data['alert_type'],
@@ -139,6 +236,7 @@ class Command(BaseCommand):
                 'pos_y': data.get('position', {}).get('y'),
                 'pos_z': data.get('position', {}).get('z'),
                 'floor': data.get('position', {}).get('floor', 0),
+                'incident_id': incident.pk if incident else None,
                 'details': data.get('details', {}),
                 'resolved': data.get('resolved', False),
                 'acknowledged': data.get('acknowledged', False),
@@ -146,7 +244,12 @@ class Command(BaseCommand):
 
             serializer = AlertLiteSerializer(data=payload)
             if serializer.is_valid():
-                obj = serializer.save()
+                # Atomowo - nieudany zapis alertu nie zostawia osieroconych PositionLite/AlertDetails
+                with transaction.atomic():
+                    obj = serializer.save()
+                if incident:
+                    incident.refresh_alert_counts()
+                history_cache.bump({payload['tag_id']: payload['firefighter_id']})
                 self.stdout.write(self.style.WARNING(f"⚠️ ALERT: {payload['alert_type']} - {payload['firefighter_id']} (ID={obj.pk})"))
             else:
                 self.stdout.write(self.style.ERROR(f"❌ Błąd walidacji alertu: {serializer.errors}"))
@@ -0,0 +1,229 @@
+# app/middleware.py
+import cProfile
+import gzip
+import logging
+import random
+import re
+import threading
+import zlib
+from time import perf_counter
+import orjson
+import zstandard
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from app import timing
+from app.timing import RequestTiming
+
+timing_logger = logging.getLogger('app.timing')
+
+# Kolejność preferencji, gdy klient akceptuje kilka kodowań
+ENCODINGS = ('zstd', 'gzip')
+
+
+def accepted_encodings(header):
+    """Kodowania z Accept-Encoding z q > 0."""
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def compress(encoding, content):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=settings.RESPONSE_ZSTD_LEVEL).compress(content)
+    return gzip.compress(content, compresslevel=settings.RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+def stream_compressor(encoding):
+    """(compress, flush_chunk, finish) - każdy kawałek strumienia jest wypychany od razu do klienta."""
+    if encoding == 'zstd':
+        c = zstandard.ZstdCompressor(level=settings.RESPONSE_ZSTD_LEVEL).compressobj()
+        return c.compress, lambda: c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), c.flush
+    c = zlib.compressobj(settings.RESPONSE_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Kompresja odpowiedzi zstd albo gzip, zależnie od Accept-Encoding klienta.
+
+    Zwykłe odpowiedzi kompresowane są dopiero od RESPONSE_COMPRESSION_MIN_BYTES
+    (małych nie opłaca się), strumieniowe (także async) - zawsze, kawałek po kawałku.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next((name for name in ENCODINGS if name in accepted), None)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            write, flush, finish = stream_compressor(encoding)
+            original = response.streaming_content
+            if response.is_async:
+                async def compressed():
+                    async for chunk in original:
+                        yield write(chunk) + flush()
+                    yield finish()
+
+                response.streaming_content = compressed()
+            else:
+                def compressed():
+                    for chunk in original:
+                        yield write(chunk) + flush()
+                    yield finish()
+
+                response.streaming_content = compressed()
+            del response.headers['Content-Length']
+        else:
+            content = compress(encoding, response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        # Skompresowana treść nie jest bajt w bajt tą samą reprezentacją
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class TimingMiddleware:
+    """
+    Pomiar żądań API: liczba i łączny czas zapytań SQL, najwolniejsze zapytanie,
+    serializacja (`timing.phase('serialize')` w widokach) i renderowanie odpowiedzi.
+    Wynik trafia do nagłówka Server-Timing i do logu 'app.timing' (jedna linia JSON).
+
+    Przy REQUEST_PROFILE_SAMPLE_RATE > 0 część żądań jest profilowana; jeśli trwały
+    dłużej niż REQUEST_PROFILE_SLOW_MS, w REQUEST_PROFILE_DIR zapisywany jest profil
+    cProfile (.prof, tylko ścieżka synchroniczna) i JSON z pomiarami i wszystkimi zapytaniami.
+    Odpowiedzi strumieniowe mają w nagłówku tylko to, co zmierzono przed wysłaniem treści,
+    a log powstaje po wysłaniu całego strumienia.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    # cProfile: jeden aktywny profiler na proces
+    profile_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def applies(self, request):
+        return request.path.startswith(settings.REQUEST_TIMING_PATH_PREFIX)
+
+    def sampled(self):
+        rate = settings.REQUEST_PROFILE_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.applies(request):
+            return self.get_response(request)
+        sampled = self.sampled()
+        state = RequestTiming(keep_queries=sampled)
+        profiler = cProfile.Profile() if sampled and self.profile_lock.acquire(blocking=False) else None
+        token = timing.current.set(state)
+        try:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    self.profile_lock.release()
+        finally:
+            timing.current.reset(token)
+        return self.finish(request, response, state, profiler)
+
+    async def __acall__(self, request):
+        if not self.applies(request):
+            return await self.get_response(request)
+        state = RequestTiming(keep_queries=self.sampled())
+        token = timing.current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.current.reset(token)
+        return self.finish(request, response, state)
+
+    def process_template_response(self, request, response):
+        """Odpowiedzi DRF renderowane są po widoku - mierzymy od tego momentu do końca renderowania."""
+        state = timing.current.get()
+        if state is not None:
+            start = perf_counter()
+            response.add_post_render_callback(lambda r: state.add('render', perf_counter() - start))
+        return response
+
+    def finish(self, request, response, state, profiler=None):
+        response['Server-Timing'] = state.header()
+        if not response.streaming:
+            self.report(request, response, state, profiler)
+            return response
+
+        original = response.streaming_content
+        if response.is_async:
+            async def measured():
+                token = timing.current.set(state)
+                try:
+                    async for chunk in original:
+                        yield chunk
+                finally:
+                    timing.current.reset(token)
+                    self.report(request, response, state)
+        else:
+            def measured():
+                token = timing.current.set(state)
+                try:
+                    yield from original
+                finally:
+                    timing.current.reset(token)
+                    self.report(request, response, state)
+        response.streaming_content = measured()
+        return response
+
+    def report(self, request, response, state, profiler=None):
+        record = {'method': request.method, 'path': request.get_full_path(), 'status': response.status_code}
+        record.update(state.record())
+        if settings.REQUEST_TIMING_LOG:
+            timing_logger.info(orjson.dumps(record).decode())
+        if state.statements is not None and record['ms'] >= settings.REQUEST_PROFILE_SLOW_MS:
+            self.save_profile(record, state, profiler)
+
+    def save_profile(self, record, state, profiler):
+        directory = settings.REQUEST_PROFILE_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', record['path'].split('?')[0]).strip('-')
+        name = f"{timezone.now():%Y%m%dT%H%M%S%f}-{slug}-{record['ms']:.0f}ms"
+        record['statements'] = [{'sql': sql, 'ms': round(elapsed * 1e3, 2)} for sql, elapsed in state.statements]
+        (directory / f'{name}.json').write_bytes(orjson.dumps(record, option=orjson.OPT_INDENT_2))
+        if profiler is not None:
+            profiler.dump_stats(directory / f'{name}.prof')
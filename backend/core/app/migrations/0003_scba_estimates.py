@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_firefighter_tag_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scba',
+            name='remaining_time_min',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='telemetry',
+            index=models.Index(fields=['tag_id', 'timestamp'], name='app_telemet_tag_id_fb10eb_idx'),
+        ),
+    ]
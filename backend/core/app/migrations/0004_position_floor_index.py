@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_scba_estimates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='position',
+            name='floor',
+            field=models.IntegerField(db_index=True),
+        ),
+    ]
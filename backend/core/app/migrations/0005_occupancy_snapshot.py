@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 22:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_position_floor_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('floor', models.IntegerField()),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('origin_x', models.FloatField()),
+                ('origin_y', models.FloatField()),
+                ('cell_size_m', models.FloatField()),
+                ('rows', models.IntegerField()),
+                ('cols', models.IntegerField()),
+                ('data', models.BinaryField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['floor', 'start'], name='app_occupan_floor_6afc99_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_occupancy_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telemetry',
+            name='cell',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='telemetry',
+            name='floor',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='telemetry',
+            index=models.Index(fields=['floor', 'cell', 'timestamp'], name='app_telemet_floor_05b3f2_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 22:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_telemetry_spatial_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Beacon',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, max_length=128)),
+                ('type', models.CharField(blank=True, max_length=32)),
+                ('x', models.FloatField()),
+                ('y', models.FloatField()),
+                ('z', models.FloatField()),
+                ('floor', models.IntegerField(null=True)),
+                ('config', models.JSONField(default=dict)),
+                ('range_count', models.BigIntegerField(default=0)),
+                ('los_ratio', models.FloatField(null=True)),
+                ('mean_rssi_dbm', models.FloatField(null=True)),
+                ('mean_fp_power_dbm', models.FloatField(null=True)),
+                ('last_seen', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
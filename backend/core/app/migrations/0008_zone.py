@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_beacon'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Zone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128)),
+                ('floor', models.IntegerField()),
+                ('zone_type', models.CharField(default='hazard', max_length=32)),
+                ('severity', models.CharField(default='warning', max_length=32)),
+                ('polygon', models.JSONField()),
+                ('max_dwell_s', models.IntegerField(blank=True, null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('min_x', models.FloatField(default=0.0, editable=False)),
+                ('min_y', models.FloatField(default=0.0, editable=False)),
+                ('max_x', models.FloatField(default=0.0, editable=False)),
+                ('max_y', models.FloatField(default=0.0, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-18 22:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_zone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Incident',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=128)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('opened_manually', models.BooleanField(default=False)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('frame_count', models.BigIntegerField(default=0)),
+                ('participants', models.JSONField(default=list)),
+                ('alert_counts', models.JSONField(default=dict)),
+                ('min_x', models.FloatField(blank=True, null=True)),
+                ('min_y', models.FloatField(blank=True, null=True)),
+                ('max_x', models.FloatField(blank=True, null=True)),
+                ('max_y', models.FloatField(blank=True, null=True)),
+                ('min_floor', models.IntegerField(blank=True, null=True)),
+                ('max_floor', models.IntegerField(blank=True, null=True)),
+                ('min_heart_rate', models.IntegerField(blank=True, null=True)),
+                ('max_heart_rate', models.IntegerField(blank=True, null=True)),
+                ('max_temperature_c', models.FloatField(blank=True, null=True)),
+                ('min_scba_pressure_bar', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ended_at', 'started_at'], name='app_inciden_ended_a_2c284c_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='incident',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.incident'),
+        ),
+        migrations.AddField(
+            model_name='telemetry',
+            name='incident',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.incident'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['incident', 'timestamp'], name='app_alert_inciden_68e095_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telemetry',
+            index=models.Index(fields=['incident', 'timestamp'], name='app_telemet_inciden_cfd9a5_idx'),
+        ),
+    ]
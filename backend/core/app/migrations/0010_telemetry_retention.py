@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_incident'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telemetry',
+            name='downsampled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='telemetry',
+            index=models.Index(condition=models.Q(('downsampled', False)), fields=['timestamp'], name='telemetry_raw_ts_idx'),
+        ),
+    ]
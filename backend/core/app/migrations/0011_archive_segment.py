@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 23:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_telemetry_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag_id', models.CharField(max_length=32)),
+                ('day', models.DateField()),
+                ('path', models.CharField(max_length=255)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('rows', models.IntegerField()),
+                ('size_bytes', models.BigIntegerField()),
+                ('firefighter', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.firefighter')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start', 'end'], name='app_archive_start_eac47b_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tag_id', 'day'), name='archive_segment_tag_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_history_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestCheckpoint',
+            fields=[
+                ('tag_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('timestamp', models.DateTimeField()),
+                ('sequence', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_ingest_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='position',
+            name='floor_confidence_percent',
+            field=models.IntegerField(null=True),
+        ),
+    ]
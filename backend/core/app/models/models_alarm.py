@@ -1,6 +1,7 @@
 # alerts/models_alerts.py
 from django.db import models
 from .model_firefighter import Firefighter
+from .models_incident import Incident
 
 
 class PositionLite(models.Model):
@@ -29,11 +30,18 @@ class Alert(models.Model):
     tag_id = models.CharField(max_length=32)
 
     firefighter = models.ForeignKey(Firefighter, on_delete=models.SET_NULL, null=True)
+    incident = models.ForeignKey(Incident, on_delete=models.SET_NULL, null=True)
     position = models.OneToOneField(PositionLite, on_delete=models.SET_NULL, null=True)
     details = models.OneToOneField(AlertDetails, on_delete=models.SET_NULL, null=True)
 
     resolved = models.BooleanField(default=False)
     acknowledged = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['incident', 'timestamp']),
+        ]
+
     def __str__(self):
         return f"{self.alert_type} ({self.id})"
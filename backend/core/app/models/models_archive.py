@@ -0,0 +1,29 @@
+# archive/models.py
+from django.db import models
+from .model_firefighter import Firefighter
+
+
+class ArchiveSegment(models.Model):
+    """
+    Plik archiwum kolumnowego (.npz) z telemetrią jednego tagu z jednego dnia (UTC).
+    Ramki przeniesione do pliku są usuwane z tabel telemetrii.
+    """
+    tag_id = models.CharField(max_length=32)
+    firefighter = models.ForeignKey(Firefighter, on_delete=models.SET_NULL, null=True)
+    day = models.DateField()
+    path = models.CharField(max_length=255)     # względem ARCHIVE_DIR
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    rows = models.IntegerField()
+    size_bytes = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag_id', 'day'], name='archive_segment_tag_day'),
+        ]
+        indexes = [
+            models.Index(fields=['start', 'end']),
+        ]
+
+    def __str__(self):
+        return f"{self.tag_id} {self.day} ({self.rows} ramek)"
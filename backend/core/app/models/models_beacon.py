@@ -0,0 +1,24 @@
+# beacons/models.py
+from django.db import models
+
+
+class Beacon(models.Model):
+    """Beacon UWB z konfiguracji symulatora wraz z przyrostowymi statystykami pomiarów."""
+    id = models.CharField(primary_key=True, max_length=32)
+    name = models.CharField(max_length=128, blank=True)
+    type = models.CharField(max_length=32, blank=True)
+    x = models.FloatField()
+    y = models.FloatField()
+    z = models.FloatField()
+    floor = models.IntegerField(null=True)
+    config = models.JSONField(default=dict)
+
+    # Statystyki aktualizowane przy ingeście (app/pipeline/stage_beacons.py)
+    range_count = models.BigIntegerField(default=0)
+    los_ratio = models.FloatField(null=True)
+    mean_rssi_dbm = models.FloatField(null=True)
+    mean_fp_power_dbm = models.FloatField(null=True)
+    last_seen = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.name or self.id} (piętro {self.floor})"
@@ -0,0 +1,17 @@
+# models/models_checkpoint.py
+from django.db import models
+
+
+class IngestCheckpoint(models.Model):
+    """
+    Ostatnia zapisana ramka tagu (znacznik czasu i numer sekwencji).
+    Aktualizowana w tej samej transakcji co telemetria (app/pipeline/stage_checkpoint.py),
+    po restarcie listenera pozwala pominąć ramki ponownie wysłane przez symulator.
+    """
+    tag_id = models.CharField(primary_key=True, max_length=32)
+    timestamp = models.DateTimeField()
+    sequence = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tag_id} @ {self.timestamp} (#{self.sequence})"
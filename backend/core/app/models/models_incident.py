@@ -0,0 +1,56 @@
+# incidents/models.py
+from django.db import models
+
+
+class Incident(models.Model):
+    """
+    Akcja (sesja) - przedział czasu, do którego przypisywane są telemetria i alerty.
+    Otwierana i zamykana automatycznie przez listener albo ręcznie przez API.
+    Pola podsumowania są utrzymywane przyrostowo przy ingeście.
+    """
+    name = models.CharField(max_length=128, blank=True)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)
+    opened_manually = models.BooleanField(default=False)
+
+    # Podsumowanie (materializowane)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    frame_count = models.BigIntegerField(default=0)
+    participants = models.JSONField(default=list)      # tag_id uczestników
+    alert_counts = models.JSONField(default=dict)      # alert_type -> liczba
+    min_x = models.FloatField(null=True, blank=True)
+    min_y = models.FloatField(null=True, blank=True)
+    max_x = models.FloatField(null=True, blank=True)
+    max_y = models.FloatField(null=True, blank=True)
+    min_floor = models.IntegerField(null=True, blank=True)
+    max_floor = models.IntegerField(null=True, blank=True)
+    min_heart_rate = models.IntegerField(null=True, blank=True)
+    max_heart_rate = models.IntegerField(null=True, blank=True)
+    max_temperature_c = models.FloatField(null=True, blank=True)
+    min_scba_pressure_bar = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ended_at', 'started_at']),
+        ]
+
+    @classmethod
+    def current(cls):
+        """Aktualnie otwarta akcja (najnowsza), albo None."""
+        return cls.objects.filter(ended_at=None).order_by('-started_at').first()
+
+    @property
+    def duration_s(self):
+        end = self.ended_at or self.last_activity_at
+        return (end - self.started_at).total_seconds() if end else 0.0
+
+    def refresh_alert_counts(self):
+        """Przelicza liczniki alertów z indeksu (incident, timestamp) - alertów w akcji jest niewiele."""
+        counts = dict(
+            self.alert_set.values_list('alert_type').annotate(n=models.Count('id')).values_list('alert_type', 'n')
+        )
+        Incident.objects.filter(pk=self.pk).update(alert_counts=counts)
+        self.alert_counts = counts
+
+    def __str__(self):
+        return self.name or f"Akcja {self.pk} ({self.started_at:%Y-%m-%d %H:%M})"
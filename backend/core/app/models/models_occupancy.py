@@ -0,0 +1,36 @@
+# occupancy/models.py
+import zlib
+import numpy as np
+from django.db import models
+
+
+class OccupancySnapshot(models.Model):
+    """
+    Siatka czasu przebywania [s] na jednym piętrze w jednym interwale.
+    Komórki siatki zapisane są jako skompresowana tablica float32 (wiersze = y).
+    """
+    floor = models.IntegerField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    origin_x = models.FloatField()
+    origin_y = models.FloatField()
+    cell_size_m = models.FloatField()
+    rows = models.IntegerField()
+    cols = models.IntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['floor', 'start']),
+        ]
+
+    @staticmethod
+    def encode(grid):
+        return zlib.compress(np.ascontiguousarray(grid, dtype=np.float32).tobytes())
+
+    def decode(self):
+        return np.frombuffer(zlib.decompress(self.data), dtype=np.float32).reshape(self.rows, self.cols)
+
+    def __str__(self):
+        return f"Piętro {self.floor}: {self.start:%Y-%m-%d %H:%M}"
@@ -1,6 +1,7 @@
 # telemetry/models.py
 from django.db import models
 from .model_firefighter import Firefighter
+from .models_incident import Incident
 
 
 # ---- Position Submodels -----------------------------------------------------
@@ -49,11 +50,12 @@ class Position(models.Model):
     x = models.FloatField()
     y = models.FloatField()
     z = models.FloatField()
-    floor = models.IntegerField()
+    floor = models.IntegerField(db_index=True)
     confidence = models.FloatField()
     source = models.CharField(max_length=64)
     beacons_used = models.IntegerField()
     accuracy_m = models.FloatField()
+    floor_confidence_percent = models.IntegerField(null=True)   # pewność piętra z etapu floor (także bez barometru)
 
     trilateration = models.OneToOneField(Trilateration, on_delete=models.SET_NULL, null=True)
     drift = models.OneToOneField(Drift, on_delete=models.SET_NULL, null=True)
@@ -157,7 +159,7 @@ class SCBA(models.Model):
     cylinder_pressure_bar = models.IntegerField()
     max_pressure_bar = models.IntegerField()
     consumption_rate_lpm = models.IntegerField()
-    remaining_time_min = models.IntegerField()
+    remaining_time_min = models.IntegerField(null=True)   # None, dopóki nie znamy tempa zużycia
     alarms = models.OneToOneField(ScbaAlarms, on_delete=models.CASCADE)
     battery_percent = models.IntegerField()
     connection_status = models.CharField(max_length=32)
@@ -216,9 +218,17 @@ class Telemetry(models.Model):
     tag_id = models.CharField(max_length=32)
 
     firefighter = models.ForeignKey(Firefighter, on_delete=models.SET_NULL, null=True)
+    incident = models.ForeignKey(Incident, on_delete=models.SET_NULL, null=True)
     position = models.OneToOneField(Position, on_delete=models.SET_NULL, null=True)
     heading_deg = models.FloatField()
 
+    # Indeks przestrzenny: piętro i komórka siatki (app/pipeline/stage_spatial.py)
+    floor = models.IntegerField(null=True)
+    cell = models.BigIntegerField(null=True)
+
+    # Ramka zachowana przy przerzedzaniu starej telemetrii (prune_telemetry)
+    downsampled = models.BooleanField(default=False)
+
     uwb_measurements = models.ManyToManyField(UWBMeasurement)
 
     imu = models.OneToOneField(IMU, on_delete=models.SET_NULL, null=True)
@@ -229,3 +239,12 @@ class Telemetry(models.Model):
     recco = models.OneToOneField(Recco, on_delete=models.SET_NULL, null=True)
     black_box = models.OneToOneField(BlackBox, on_delete=models.SET_NULL, null=True)
     device = models.OneToOneField(Device, on_delete=models.SET_NULL, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['tag_id', 'timestamp']),
+            models.Index(fields=['floor', 'cell', 'timestamp']),
+            models.Index(fields=['incident', 'timestamp']),
+            models.Index(fields=['timestamp'], condition=models.Q(downsampled=False), name='telemetry_raw_ts_idx'),
+        ]
@@ -0,0 +1,31 @@
+# zones/models.py
+from django.db import models
+
+
+class Zone(models.Model):
+    """Strefa niebezpieczna / zastrzeżona na piętrze, zdefiniowana wielokątem [[x, y], ...]."""
+    name = models.CharField(max_length=128)
+    floor = models.IntegerField()
+    zone_type = models.CharField(max_length=32, default='hazard')
+    severity = models.CharField(max_length=32, default='warning')
+    polygon = models.JSONField()
+    max_dwell_s = models.IntegerField(null=True, blank=True)   # None = bez limitu czasu
+    active = models.BooleanField(default=True)
+
+    # Prostokąt otaczający, liczony przy zapisie - do indeksu siatki w etapie ingestu
+    min_x = models.FloatField(editable=False, default=0.0)
+    min_y = models.FloatField(editable=False, default=0.0)
+    max_x = models.FloatField(editable=False, default=0.0)
+    max_y = models.FloatField(editable=False, default=0.0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        xs = [p[0] for p in self.polygon]
+        ys = [p[1] for p in self.polygon]
+        self.min_x, self.max_x = min(xs), max(xs)
+        self.min_y, self.max_y = min(ys), max(ys)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.name} (piętro {self.floor})"
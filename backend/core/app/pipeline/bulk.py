@@ -0,0 +1,38 @@
+# pipeline/bulk.py
+from django.conf import settings
+from django.db import connection, models
+
+
+def bulk_insert(model, objs):
+    """
+    Zapisuje listę nowych obiektów jednym poleceniem i uzupełnia im klucze główne.
+
+    Na PostgreSQL (DB_BULK_COPY) używa COPY FROM STDIN: klucze są najpierw
+    rezerwowane z sekwencji tabeli, bo COPY nie zwraca wstawionych wierszy.
+    W pozostałych przypadkach to zwykłe bulk_create (SQLite >= 3.35 zwraca klucze).
+    """
+    if not objs:
+        return objs
+    if settings.DB_BULK_COPY and connection.vendor == 'postgresql':
+        copy_insert(model, objs)
+    else:
+        model.objects.bulk_create(objs)
+    return objs
+
+
+def copy_insert(model, objs):
+    meta = model._meta
+    fields = meta.concrete_fields
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if isinstance(meta.pk, models.AutoField) and objs[0].pk is None:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                [meta.db_table, meta.pk.column, len(objs)],
+            )
+            for obj, (pk,) in zip(objs, cursor.fetchall()):
+                obj.pk = pk
+        columns = ', '.join(quote(field.column) for field in fields)
+        with cursor.cursor.copy(f"COPY {quote(meta.db_table)} ({columns}) FROM STDIN") as copy:
+            for obj in objs:
+                copy.write_row([field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields])
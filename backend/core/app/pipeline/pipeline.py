@@ -0,0 +1,297 @@
+# pipeline/pipeline.py
+import hashlib
+import logging
+import math
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+
+from app import history_cache
+from app.serializers.serializers_telemetry_lite import TelemetryLiteSerializer, AlertLiteSerializer
+
+logger = logging.getLogger(__name__)
+
+# Alert.id (max_length)
+ALERT_ID_MAX_LENGTH = 64
+
+# Pola liczbowe, na których liczą etapy potoku (i wymagane przez TelemetryLiteSerializer).
+# Ramka z brakującą albo nieskończoną wartością nie trafia do żadnego etapu.
+REQUIRED_NUMBERS = ('pos_x', 'pos_y', 'pos_z', 'floor', 'heart_rate', 'scba_pressure')
+# Pola, które mogą być puste (None), ale jeśli są, to muszą być skończone
+OPTIONAL_NUMBERS = ('battery_level', 'temperature')
+
+
+def admissible(frame):
+    """Czy ramka ma pola z REQUIRED_NUMBERS (i niepuste z OPTIONAL_NUMBERS) jako skończone liczby."""
+    for field in REQUIRED_NUMBERS + OPTIONAL_NUMBERS:
+        value = frame.payload.get(field)
+        if value is None and field in OPTIONAL_NUMBERS:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            logger.error(f"Odrzucona ramka {frame.tag_id} ({frame.payload.get('timestamp')}): niepoprawne {field}={value!r}")
+            return False
+    return True
+
+
+class Frame:
+    """
+    Pojedyncza ramka telemetrii przechodząca przez potok ingestu.
+
+    `data` to surowy JSON z symulatora, `payload` to płaska struktura
+    dla TelemetryLiteSerializer, którą kolejne etapy mogą uzupełniać.
+    Etapy mogą też dopisywać alerty (payloady AlertLiteSerializer) do `alerts`
+    oraz wyłączyć zapis ramki (`store`) - taka ramka przechodzi przez wszystkie
+    etapy, tylko nie trafia do tabel telemetrii. `valid` ustawia walidacja paczki.
+    """
+    __slots__ = ('data', 'payload', 'ts', 'telemetry', 'alerts', 'store', 'valid')
+
+    def __init__(self, data, payload):
+        self.data = data
+        self.payload = payload
+        self.ts = parse_datetime(payload['timestamp']).timestamp()
+        self.telemetry = None
+        self.alerts = []
+        self.store = True
+        self.valid = False
+
+    @classmethod
+    def from_message(cls, data):
+        """Mapuje zagnieżdżony JSON `tag_telemetry` z symulatora na płaską strukturę."""
+        vitals = data['vitals']
+        payload = {
+            'firefighter_id': data['firefighter']['id'],
+            'tag_id': data['tag_id'],
+            'timestamp': data['timestamp'],
+            'sequence': data.get('sequence', 0),
+            'pos_x': data['position']['x'],
+            'pos_y': data['position']['y'],
+            'pos_z': data['position']['z'],
+            'floor': data['position']['floor'],
+            'heading_deg': data.get('heading_deg', 0.0),
+            'heart_rate': vitals['heart_rate_bpm'],
+            'heart_rate_variability': vitals.get('heart_rate_variability_ms', 0),
+            'skin_temperature': vitals.get('skin_temperature_c', 0.0),
+            'stress_level': vitals.get('stress_level', 'unknown'),
+            'motion_state': vitals['motion_state'],
+            'scba_pressure': data['scba']['cylinder_pressure_bar'],
+            'battery_level': data['device']['battery_percent'],
+            'temperature': data['environment']['temperature_c'],
+        }
+        if settings.INGEST_STORE_UWB_MEASUREMENTS:
+            payload['uwb_measurements'] = data.get('uwb_measurements') or []
+        return cls(data, payload)
+
+    @property
+    def tag_id(self):
+        return self.payload['tag_id']
+
+
+class TagSlots:
+    """Przydział stałych wierszy w stosowanych tablicach stanu dla kolejnych tagów."""
+
+    def __init__(self):
+        self.index = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def row(self, tag_id):
+        row = self.index.get(tag_id)
+        if row is None:
+            row = self.index[tag_id] = len(self.index)
+        return row
+
+
+def split_rounds(frames):
+    """
+    Dzieli paczkę ramek na rundy, w których każdy tag występuje co najwyżej raz.
+    Kolejność ramek w obrębie tagu jest zachowana.
+    """
+    rounds = []
+    seen = {}
+    for frame in frames:
+        n = seen.get(frame.tag_id, 0)
+        seen[frame.tag_id] = n + 1
+        if n == len(rounds):
+            rounds.append([])
+        rounds[n].append(frame)
+    return rounds
+
+
+def make_alert_id(prefix, kind, frame):
+    """
+    Identyfikator alertu `{prefix}-{kind}-{tag_id}-{ms}`. Gdy nie mieści się w Alert.id,
+    tag_id zastępowany jest jego skrótem (tag i tak jest zapisany w osobnym polu alertu).
+    """
+    ms = int(frame.ts * 1000)
+    result = f"{prefix}-{kind}-{frame.tag_id}-{ms}"
+    if len(result) > ALERT_ID_MAX_LENGTH:
+        digest = hashlib.blake2b(frame.tag_id.encode(), digest_size=8).hexdigest()
+        result = f"{prefix}-{kind}-{digest}-{ms}"
+    return result
+
+
+def alert_payload(frame, alert_id, alert_type, severity, stationary=0):
+    """Payload AlertLiteSerializer dla alertu wygenerowanego z ramki."""
+    payload = frame.payload
+    return {
+        'external_id': alert_id,
+        'alert_type': alert_type,
+        'severity': severity,
+        'timestamp': payload['timestamp'],
+        'firefighter_id': payload['firefighter_id'],
+        'tag_id': payload['tag_id'],
+        'pos_x': payload['pos_x'],
+        'pos_y': payload['pos_y'],
+        'pos_z': payload['pos_z'],
+        'floor': payload['floor'],
+        'incident_id': payload.get('incident_id'),
+        'details': {
+            'stationary_duration_s': int(stationary),
+            'last_motion_state': payload['motion_state'],
+            'last_heart_rate': payload['heart_rate'],
+        },
+    }
+
+
+class Stage:
+    """Etap potoku ingestu. Operuje na całej paczce ramek z jednego ticku."""
+
+    name = 'stage'
+
+    def process(self, frames):
+        """Przetwarza paczkę. Może usunąć z listy ramki, które nie mają być zapisane."""
+        raise NotImplementedError
+
+    def write(self, frames):
+        """Zapis własnych danych etapu, w tej samej transakcji co telemetria."""
+
+    def rollback(self):
+        """Wywoływane, gdy przetworzenie lub zapis paczki się nie powiódł."""
+
+    def on_beacons(self, beacons):
+        """Wywoływane po otrzymaniu `beacons_config` z symulatora."""
+
+    def close(self):
+        """Zatrzymanie ingestu: zapis stanu, który czekał na kolejne ramki (w transakcji)."""
+
+
+class IngestPipeline:
+    """Uruchamia etapy na paczce ramek, a następnie zapisuje ją w jednej transakcji."""
+
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+
+    def update_beacons(self, beacons):
+        for stage in self.stages:
+            stage.on_beacons(beacons)
+
+    def close(self):
+        """Wywoływane po zapisie ostatniej paczki przy zatrzymaniu ingestu."""
+        with transaction.atomic():
+            for stage in self.stages:
+                stage.close()
+
+    def run(self, frames):
+        # Etapy mogą usuwać ramki z paczki (np. duplikaty) - pracują na własnej kopii listy
+        frames = list(frames)
+        try:
+            saved = self.write_batch(frames)
+        except Exception:
+            for stage in self.stages:
+                stage.rollback()
+            raise
+        history_cache.bump({frame.tag_id: frame.payload.get('firefighter_id') for frame in frames})
+        return saved
+
+    def write_batch(self, frames):
+        # Jedna błędna ramka nie może zepsuć stanu etapów (np. NaN w filtrze UKF) ani całej paczki
+        frames[:] = [frame for frame in frames if admissible(frame)]
+        for stage in self.stages:
+            stage.process(frames)
+
+        stored, validated = [], []
+        for frame in frames:
+            serializer = TelemetryLiteSerializer(data=frame.payload)
+            if serializer.is_valid():
+                frame.valid = True
+                if frame.store:
+                    stored.append(frame)
+                    validated.append(serializer.validated_data)
+            else:
+                logger.error(f"Błąd walidacji telemetrii {frame.tag_id}: {serializer.errors}")
+
+        with transaction.atomic():
+            saved = self.insert(stored, validated)
+
+            for frame in frames:
+                for alert in frame.alerts:
+                    alert_serializer = AlertLiteSerializer(data=alert)
+                    if not alert_serializer.is_valid():
+                        logger.error(f"Błąd walidacji alertu {alert['external_id']}: {alert_serializer.errors}")
+                        continue
+                    try:
+                        with transaction.atomic():
+                            alert_serializer.save()
+                    except IntegrityError as e:
+                        logger.error(f"Odrzucony alert {alert['external_id']}: {e}")
+                        continue
+                    logger.warning(f"Alert {alert['alert_type']} dla {frame.tag_id} ({alert['external_id']})")
+
+            for stage in self.stages:
+                stage.write(frames)
+        return saved
+
+    def insert(self, stored, validated):
+        """
+        Zapis telemetrii paczki w punkcie zapisu. Gdy baza odrzuci paczkę (IntegrityError),
+        dzielimy ją na połowy aż do pojedynczych ramek - przepadają tylko ramki błędne,
+        a nie cała paczka. Zwraca liczbę zapisanych ramek.
+        """
+        try:
+            with transaction.atomic():
+                records = TelemetryLiteSerializer.create_many(validated)
+        except IntegrityError as e:
+            if len(stored) == 1:
+                frame = stored[0]
+                frame.valid = False
+                logger.error(f"Odrzucona ramka {frame.tag_id} ({frame.payload['timestamp']}): {e}")
+                return 0
+            half = len(stored) // 2
+            return self.insert(stored[:half], validated[:half]) + self.insert(stored[half:], validated[half:])
+        for frame, telemetry in zip(stored, records):
+            frame.telemetry = telemetry
+        return len(stored)
+
+
+def build_pipeline():
+    """Domyślny potok ingestu używany przez listener."""
+    from app.pipeline.stage_beacons import BeaconStatsStage
+    from app.pipeline.stage_checkpoint import CheckpointStage
+    from app.pipeline.stage_deadband import DeadbandStage
+    from app.pipeline.stage_floor import FloorStage
+    from app.pipeline.stage_incident import IncidentStage
+    from app.pipeline.stage_occupancy import OccupancyStage
+    from app.pipeline.stage_rules import AlertRulesStage
+    from app.pipeline.stage_scba import ScbaStage
+    from app.pipeline.stage_spatial import SpatialIndexStage
+    from app.pipeline.stage_trilateration import TrilaterationStage
+    from app.pipeline.stage_ukf import UKFStage
+    from app.pipeline.stage_vitals import VitalsAnomalyStage
+    from app.pipeline.stage_zones import ZoneStage
+
+    return IngestPipeline([
+        CheckpointStage(),
+        IncidentStage(),
+        BeaconStatsStage(),
+        TrilaterationStage(),
+        UKFStage(),
+        FloorStage(),
+        SpatialIndexStage(),
+        ScbaStage(),
+        AlertRulesStage(),
+        VitalsAnomalyStage(),
+        ZoneStage(),
+        OccupancyStage(),
+        DeadbandStage(),
+    ])
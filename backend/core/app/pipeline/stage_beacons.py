@@ -0,0 +1,75 @@
+# pipeline/stage_beacons.py
+from datetime import datetime, timezone
+from django.conf import settings
+
+from app.models.models_beacon import Beacon
+from app.pipeline.pipeline import Stage
+
+STAT_FIELDS = ['range_count', 'los_ratio', 'mean_rssi_dbm', 'mean_fp_power_dbm', 'last_seen']
+
+
+def ewma(mean, value, alpha):
+    return value if mean is None else mean + alpha * (value - mean)
+
+
+class BeaconStatsStage(Stage):
+    """
+    Przyrostowe statystyki beaconów z pomiarów UWB w ramkach.
+
+    Liczba pomiarów jest sumowana, a udział LOS i średnie RSSI / fp_power
+    liczone są kroczącą średnią wykładniczą (okno ok. BEACON_STATS_WINDOW
+    pomiarów). Pomiary paczki nakładane są przy zapisie na wiersze beaconów
+    pobrane pod blokadą (SELECT FOR UPDATE), więc te same beacony może równolegle
+    aktualizować kilka procesów ingestu (--workers). Zapis to jeden bulk_update na paczkę.
+    """
+
+    name = 'beacons'
+
+    def __init__(self):
+        self.alpha = 1.0 / settings.BEACON_STATS_WINDOW
+        self.known = set()
+        self.stale = True
+        self.pending = {}       # beacon_id -> [(pomiar, czas ramki)]
+
+    def on_beacons(self, beacons):
+        # Konfiguracja została zapisana przez listener - przeładujemy ją przy następnej paczce.
+        # Wywoływane z pętli zdarzeń, gdy process() może działać w wątku - tylko flaga.
+        self.stale = True
+
+    def process(self, frames):
+        if self.stale:
+            self.stale = False
+            self.known = set(Beacon.objects.values_list('id', flat=True))
+        known = self.known
+        for frame in frames:
+            seen = datetime.fromtimestamp(frame.ts, tz=timezone.utc)
+            for measurement in frame.data.get('uwb_measurements') or []:
+                beacon_id = measurement.get('beacon_id')
+                if beacon_id in known:
+                    self.pending.setdefault(beacon_id, []).append((measurement, seen))
+
+    def update(self, beacon, measurement, seen):
+        alpha = max(self.alpha, 1.0 / (beacon.range_count + 1))
+        beacon.range_count += 1
+        beacon.los_ratio = ewma(beacon.los_ratio, 1.0 if measurement.get('los') else 0.0, alpha)
+        if measurement.get('rssi_dbm') is not None:
+            beacon.mean_rssi_dbm = ewma(beacon.mean_rssi_dbm, measurement['rssi_dbm'], alpha)
+        if measurement.get('fp_power_dbm') is not None:
+            beacon.mean_fp_power_dbm = ewma(beacon.mean_fp_power_dbm, measurement['fp_power_dbm'], alpha)
+        if beacon.last_seen is None or seen > beacon.last_seen:
+            beacon.last_seen = seen
+
+    def write(self, frames):
+        if not self.pending:
+            return
+        # Stała kolejność blokowania - procesy ingestu nie zakleszczą się na tych samych beaconach
+        beacons = list(Beacon.objects.select_for_update().filter(id__in=list(self.pending)).order_by('id'))
+        for beacon in beacons:
+            for measurement, seen in self.pending[beacon.id]:
+                self.update(beacon, measurement, seen)
+        Beacon.objects.bulk_update(beacons, STAT_FIELDS)
+        self.pending = {}
+
+    def rollback(self):
+        # Pomiary z nieudanej paczki nie mogą trafić do statystyk przy następnej
+        self.pending = {}
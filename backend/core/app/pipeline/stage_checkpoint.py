@@ -0,0 +1,73 @@
+# pipeline/stage_checkpoint.py
+import logging
+from datetime import datetime, timezone
+
+from app.models.models_checkpoint import IngestCheckpoint
+from app.pipeline.pipeline import Stage
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStage(Stage):
+    """
+    Pomija ramki już zapisane i utrwala punkt kontrolny każdego tagu.
+
+    Ramka jest duplikatem, jeśli (znacznik czasu, sequence) nie jest większe
+    niż dla ostatniej przyjętej ramki tagu - tak wyglądają ramki ponownie
+    wysłane przez symulator po reconnect albo po restarcie listenera.
+    Punkty kontrolne wczytywane są raz przy pierwszej paczce, potem
+    sprawdzenie to tylko słownik w pamięci. Zapis punktów (upsert) idzie
+    w transakcji paczki, więc zawsze odpowiada zapisanej telemetrii.
+    Etap musi działać jako pierwszy - usuwa duplikaty z paczki.
+    """
+
+    name = 'checkpoint'
+
+    def __init__(self):
+        self.last = None        # tag_id -> (czas, sequence) ostatniej przyjętej ramki
+        self.skipped = 0
+
+    def load(self):
+        self.last = {
+            tag_id: (timestamp.timestamp(), sequence)
+            for tag_id, timestamp, sequence in IngestCheckpoint.objects.values_list('tag_id', 'timestamp', 'sequence')
+        }
+
+    def process(self, frames):
+        if self.last is None:
+            self.load()
+        kept = []
+        for frame in frames:
+            key = (frame.ts, frame.payload['sequence'])
+            last = self.last.get(frame.tag_id)
+            if last is not None and key <= last:
+                continue
+            self.last[frame.tag_id] = key
+            kept.append(frame)
+        if len(kept) < len(frames):
+            self.skipped += len(frames) - len(kept)
+            logger.info(f"Pominięto {len(frames) - len(kept)} ramek już zapisanych")
+            frames[:] = kept
+
+    def write(self, frames):
+        # Także ramki pominięte przez deadband - zostały przetworzone, tylko nie zapisane
+        latest = {}
+        for frame in frames:
+            if frame.valid:
+                latest[frame.tag_id] = frame
+        if not latest:
+            return
+        IngestCheckpoint.objects.bulk_create(
+            [
+                IngestCheckpoint(
+                    tag_id=tag_id, timestamp=datetime.fromtimestamp(frame.ts, tz=timezone.utc),
+                    sequence=frame.payload['sequence'],
+                )
+                for tag_id, frame in latest.items()
+            ],
+            update_conflicts=True, unique_fields=['tag_id'], update_fields=['timestamp', 'sequence', 'updated_at'],
+        )
+
+    def rollback(self):
+        # Ramki z nieudanej paczki nie zostały zapisane - wracamy do punktów z bazy
+        self.last = None
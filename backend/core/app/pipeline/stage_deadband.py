@@ -0,0 +1,86 @@
+# pipeline/stage_deadband.py
+import math
+from django.conf import settings
+
+from app.pipeline.pipeline import Stage
+
+# Pole payloadu -> nazwa ustawienia z tolerancją
+TOLERANCES = (
+    ('heart_rate', 'DEADBAND_HEART_RATE_BPM'),
+    ('skin_temperature', 'DEADBAND_SKIN_TEMPERATURE_C'),
+    ('scba_pressure', 'DEADBAND_SCBA_BAR'),
+    ('temperature', 'DEADBAND_TEMPERATURE_C'),
+    ('battery_level', 'DEADBAND_BATTERY_PERCENT'),
+)
+# Każda zmiana tych pól to zmiana stanu - ramka jest zapisywana
+STATE_FIELDS = ('floor', 'motion_state', 'stress_level', 'incident_id')
+POSITION_FIELDS = ('pos_x', 'pos_y', 'pos_z')
+
+
+def exceeds(value, previous, tolerance):
+    """Zmiana ponad tolerancję; brak wartości (None) liczy się tylko przy pojawieniu się lub zniknięciu."""
+    if value is None or previous is None:
+        return (value is None) != (previous is None)
+    return abs(value - previous) > tolerance
+
+
+class DeadbandStage(Stage):
+    """
+    Kompresja zapisu telemetrii filtrem martwej strefy (deadband).
+
+    Ramka tagu jest zapisywana tylko wtedy, gdy względem ostatniej zapisanej
+    ramki tego tagu pozycja przesunęła się o więcej niż DEADBAND_POSITION_M,
+    któryś parametr z TOLERANCES zmienił się o więcej niż jego tolerancja,
+    zmienił się stan (STATE_FIELDS), ramka wygenerowała alert, albo minęło
+    DEADBAND_MAX_INTERVAL_S. Pozostałe ramki przechodzą przez wszystkie etapy
+    (alerty, podsumowanie akcji, mapa zajętości), ale nie trafiają do bazy.
+    Odczyt trasy i historii telemetrii z `?fill=hold|linear` odtwarza przebieg na regularnej siatce.
+    Etap musi działać jako ostatni. Włączany ustawieniem INGEST_DEADBAND.
+    """
+
+    name = 'deadband'
+
+    def __init__(self):
+        self.last = {}          # tag_id -> (czas, payload) ostatniej zapisanej ramki
+        self.seen = 0
+        self.stored = 0
+
+    def changed(self, frame, last):
+        ts, previous = last
+        payload = frame.payload
+        if frame.alerts or frame.ts - ts >= settings.DEADBAND_MAX_INTERVAL_S:
+            return True
+        if any(payload.get(field) != previous.get(field) for field in STATE_FIELDS):
+            return True
+        position = [payload.get(key) for key in POSITION_FIELDS]
+        last_position = [previous.get(key) for key in POSITION_FIELDS]
+        if None in position or None in last_position:
+            if position != last_position:
+                return True
+        elif math.dist(position, last_position) > settings.DEADBAND_POSITION_M:
+            return True
+        return any(
+            exceeds(payload.get(field), previous.get(field), getattr(settings, tolerance))
+            for field, tolerance in TOLERANCES
+        )
+
+    def process(self, frames):
+        if not settings.INGEST_DEADBAND:
+            return
+        for frame in frames:
+            last = self.last.get(frame.tag_id)
+            self.seen += 1
+            if last is not None and not self.changed(frame, last):
+                frame.store = False
+                continue
+            self.last[frame.tag_id] = (frame.ts, frame.payload)
+            self.stored += 1
+
+    @property
+    def ratio(self):
+        """Ramki odebrane / zapisane."""
+        return self.seen / self.stored if self.stored else 1.0
+
+    def rollback(self):
+        # Ostatnie "zapisane" ramki mogły nie trafić do bazy - następne ramki zapisujemy bezwarunkowo
+        self.last = {}
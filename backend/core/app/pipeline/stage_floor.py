@@ -0,0 +1,103 @@
+# pipeline/stage_floor.py
+import math
+from django.conf import settings
+
+from app.pipeline.pipeline import Stage
+
+
+def barometric_altitude(pressure_pa, reference_pressure_pa):
+    """Wysokość względem poziomu odniesienia ze wzoru barometrycznego [m]."""
+    return 44330.0 * (1.0 - (pressure_pa / reference_pressure_pa) ** (1 / 5.255))
+
+
+class FloorState:
+    """Przyrostowy stan estymacji piętra dla jednego tagu."""
+    __slots__ = ('t', 'altitude', 'vertical_speed', 'floor', 'candidate', 'candidate_since')
+
+    def __init__(self, t, altitude, floor):
+        self.t = t
+        self.altitude = altitude
+        self.vertical_speed = 0.0
+        self.floor = floor
+        self.candidate = floor
+        self.candidate_since = t
+
+
+class FloorStage(Stage):
+    """
+    Estymacja piętra z fuzji wysokości barometrycznej i współrzędnej z.
+
+    Obie wysokości łączone są ważoną średnią (wagi z wariancji), wygładzane
+    wykładniczo, a piętro zmienia się dopiero gdy wysokość wyjdzie poza
+    bieżącą kondygnację o margines histerezy i utrzyma się tam FLOOR_DWELL_S.
+    Bez barometru piętro i jego pewność liczone są z samego z.
+    """
+
+    name = 'floor'
+
+    def __init__(self):
+        self.states = {}
+        self.floor_height = settings.FLOOR_HEIGHT_M
+
+    def process(self, frames):
+        for frame in frames:
+            self.apply(frame)
+
+    def fused_altitude(self, frame):
+        z = frame.payload['pos_z']
+        sigma_z = max(frame.payload.get('accuracy_m') or 0.0, settings.UKF_DEFAULT_MEASUREMENT_SIGMA_M)
+        baro = frame.data.get('barometer')
+        if not baro or not baro.get('pressure_pa') or not baro.get('reference_pressure_pa'):
+            return z, None
+        h_baro = barometric_altitude(baro['pressure_pa'], baro['reference_pressure_pa'])
+        w_z = 1.0 / sigma_z ** 2
+        w_b = 1.0 / settings.FLOOR_BARO_SIGMA_M ** 2
+        return (w_z * z + w_b * h_baro) / (w_z + w_b), h_baro
+
+    def apply(self, frame):
+        altitude, h_baro = self.fused_altitude(frame)
+        state = self.states.get(frame.tag_id)
+        if state is None:
+            state = self.states[frame.tag_id] = FloorState(frame.ts, altitude, frame.payload['floor'])
+        else:
+            self.update(state, frame.ts, altitude)
+
+        level = state.altitude / self.floor_height
+        confidence = max(0.0, 1.0 - 2.0 * abs(level - state.floor))
+        frame.payload['floor'] = state.floor
+        frame.payload['floor_confidence_percent'] = round(confidence * 100)
+
+        baro = frame.data.get('barometer')
+        if h_baro is not None:
+            speed = state.vertical_speed
+            frame.payload['barometer'] = {
+                'pressure_pa': baro['pressure_pa'],
+                'altitude_rel_m': h_baro,
+                'temperature_c': baro.get('temperature_c', frame.payload['temperature']),
+                'trend': 'rising' if speed > 0.1 else 'falling' if speed < -0.1 else 'stable',
+                'reference_pressure_pa': baro['reference_pressure_pa'],
+                'estimated_floor': state.floor,
+                'floor_confidence_percent': round(confidence * 100),
+                'vertical_speed_mps': speed,
+            }
+
+    def update(self, state, t, altitude):
+        dt = t - state.t
+        if dt <= 0:
+            return
+        a = 1.0 - math.exp(-dt / settings.FLOOR_SMOOTHING_S)
+        previous = state.altitude
+        state.altitude += a * (altitude - state.altitude)
+        state.vertical_speed += a * ((state.altitude - previous) / dt - state.vertical_speed)
+        state.t = t
+
+        level = state.altitude / self.floor_height
+        candidate = round(level)
+        if abs(level - state.floor) <= 0.5 + settings.FLOOR_HYSTERESIS:
+            candidate = state.floor
+
+        if candidate != state.candidate:
+            state.candidate = candidate
+            state.candidate_since = t
+        elif candidate != state.floor and t - state.candidate_since >= settings.FLOOR_DWELL_S:
+            state.floor = candidate
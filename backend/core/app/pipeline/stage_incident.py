@@ -0,0 +1,161 @@
+# pipeline/stage_incident.py
+import logging
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from app.models.models_incident import Incident
+from app.pipeline.pipeline import Stage
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = (
+    'last_activity_at', 'frame_count', 'participants', 'min_x', 'min_y', 'max_x', 'max_y',
+    'min_floor', 'max_floor', 'min_heart_rate', 'max_heart_rate', 'max_temperature_c', 'min_scba_pressure_bar',
+)
+
+# Klucz blokady doradczej PostgreSQL dla otwierania akcji
+INCIDENT_LOCK_ID = 0x50535001
+
+
+def lower(current, value):
+    return value if current is None or value < current else current
+
+
+def higher(current, value):
+    return value if current is None or value > current else current
+
+
+def lock_incidents():
+    """
+    Szereguje otwieranie akcji między procesami ingestu (w bieżącej transakcji).
+    Na SQLite transakcje i tak są IMMEDIATE, więc wystarcza sama transakcja.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [INCIDENT_LOCK_ID])
+
+
+class IncidentStage(Stage):
+    """
+    Przypisuje ramki (i generowane z nich alerty) do bieżącej akcji.
+
+    Akcja otwierana jest automatycznie przy pierwszej ramce, gdy żadna nie jest
+    otwarta, i zamykana po INCIDENT_IDLE_CLOSE_S bez telemetrii (liczonych od
+    last_activity_at z wiersza, czytanego pod blokadą tuż przed zamknięciem). Akcje otwarte
+    lub zamknięte ręcznie przez API są wykrywane co INCIDENT_RELOAD_S.
+    Podsumowanie paczki scalane jest z wierszem akcji pod blokadą (SELECT FOR UPDATE),
+    więc może je równolegle aktualizować kilka procesów ingestu (--workers).
+    Etap musi działać przed etapami generującymi alerty.
+    """
+
+    name = 'incident'
+
+    def __init__(self):
+        self.incident = None
+        self.checked_at = None
+        self.touched = {}       # pk -> Incident zmienione w bieżącej paczce
+
+    def refresh(self, now):
+        if self.checked_at is not None and now - self.checked_at < settings.INCIDENT_RELOAD_S:
+            return
+        self.checked_at = now
+        current = Incident.current()
+        if current is None or self.incident is None or current.pk != self.incident.pk:
+            self.incident = current
+
+    def open(self, frame):
+        started = parse_datetime(frame.payload['timestamp'])
+        with transaction.atomic():
+            lock_incidents()
+            # Inny proces ingestu mógł ją właśnie otworzyć
+            current = Incident.current()
+            if current is not None:
+                self.incident = current
+                return
+            self.incident = Incident.objects.create(started_at=started, last_activity_at=started)
+        logger.info(f"Otwarto akcję {self.incident.pk} ({started})")
+
+    def close_incident(self, now):
+        incident = self.incident
+        with transaction.atomic():
+            row = Incident.objects.select_for_update().filter(pk=incident.pk).first()
+            # Pod --workers inne procesy mogły przez ten czas dopisywać telemetrię do tej akcji
+            last_activity = max(filter(None, (row and row.last_activity_at, incident.last_activity_at)))
+            idle = now - last_activity.timestamp()
+            if row is not None and row.ended_at is None and idle <= settings.INCIDENT_IDLE_CLOSE_S:
+                incident.last_activity_at = last_activity
+                return
+            Incident.objects.filter(pk=incident.pk, ended_at=None).update(ended_at=last_activity)
+        logger.info(f"Zamknięto akcję {incident.pk} po {settings.INCIDENT_IDLE_CLOSE_S} s bez telemetrii")
+        self.incident = None
+
+    def process(self, frames):
+        if not frames:
+            return
+        self.refresh(frames[-1].ts)
+        for frame in frames:
+            incident = self.incident
+            if (incident is not None and incident.last_activity_at is not None
+                    and frame.ts - incident.last_activity_at.timestamp() > settings.INCIDENT_IDLE_CLOSE_S):
+                self.close_incident(frame.ts)
+            if self.incident is None:
+                self.open(frame)
+            incident = self.incident
+            if incident.last_activity_at is None or frame.ts > incident.last_activity_at.timestamp():
+                incident.last_activity_at = parse_datetime(frame.payload['timestamp'])
+            self.touched[incident.pk] = incident
+            frame.payload['incident_id'] = incident.pk
+
+    def write(self, frames):
+        payloads = {}
+        alerted = set()
+        for frame in frames:
+            pk = frame.payload.get('incident_id')
+            if pk not in self.touched or not frame.valid:
+                continue
+            payloads.setdefault(pk, []).append(frame.payload)
+            if frame.alerts:
+                alerted.add(pk)
+
+        for pk, touched in self.touched.items():
+            incident = Incident.objects.select_for_update().filter(pk=pk).first()
+            if incident is None:
+                continue
+            incident.last_activity_at = max(filter(None, (incident.last_activity_at, touched.last_activity_at)))
+            for payload in payloads.get(pk, ()):
+                self.accumulate(incident, payload)
+            # Tylko pola podsumowania - bez nadpisania ended_at ustawionego ręcznie w międzyczasie
+            incident.save(update_fields=SUMMARY_FIELDS)
+            if pk in alerted:
+                incident.refresh_alert_counts()
+        self.touched = {}
+
+    def close(self):
+        # Zatrzymanie ingestu nie kończy akcji - po restarcie trwa dalej albo zamknie się po bezczynności
+        pass
+
+    def rollback(self):
+        # Podsumowanie z nieudanej paczki nie zostało zapisane - akcję wczytujemy ponownie z bazy
+        self.touched = {}
+        self.incident = None
+        self.checked_at = None
+
+    @staticmethod
+    def accumulate(incident, payload):
+        incident.frame_count += 1
+        if payload['tag_id'] not in incident.participants:
+            incident.participants.append(payload['tag_id'])
+
+        x, y, floor = payload['pos_x'], payload['pos_y'], payload['floor']
+        incident.min_x, incident.max_x = lower(incident.min_x, x), higher(incident.max_x, x)
+        incident.min_y, incident.max_y = lower(incident.min_y, y), higher(incident.max_y, y)
+        incident.min_floor, incident.max_floor = lower(incident.min_floor, floor), higher(incident.max_floor, floor)
+
+        hr = payload['heart_rate']
+        if hr:
+            incident.min_heart_rate = lower(incident.min_heart_rate, hr)
+            incident.max_heart_rate = higher(incident.max_heart_rate, hr)
+        if payload['temperature'] is not None:
+            incident.max_temperature_c = higher(incident.max_temperature_c, payload['temperature'])
+        incident.min_scba_pressure_bar = lower(incident.min_scba_pressure_bar, payload['scba_pressure'])
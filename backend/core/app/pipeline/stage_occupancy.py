@@ -0,0 +1,79 @@
+# pipeline/stage_occupancy.py
+from datetime import datetime, timezone
+import numpy as np
+from django.conf import settings
+
+from app.models.models_occupancy import OccupancySnapshot
+from app.pipeline.pipeline import Stage
+
+
+class OccupancyStage(Stage):
+    """
+    Przyrostowa siatka czasu przebywania na każdym piętrze.
+
+    Każda ramka dokłada do komórki swojej pozycji czas od poprzedniej ramki
+    tego tagu (ograniczony do HEATMAP_MAX_DT_S). Po zakończeniu interwału
+    HEATMAP_INTERVAL_S siatki są zapisywane jako OccupancySnapshot i zerowane;
+    przy zatrzymaniu ingestu zapisywany jest też bieżący, niepełny interwał.
+    """
+
+    name = 'occupancy'
+
+    def __init__(self):
+        self.cell = settings.HEATMAP_CELL_SIZE_M
+        self.origin_x, self.origin_y = settings.HEATMAP_ORIGIN
+        self.cols = int(np.ceil(settings.HEATMAP_WIDTH_M / self.cell))
+        self.rows = int(np.ceil(settings.HEATMAP_DEPTH_M / self.cell))
+        self.interval = settings.HEATMAP_INTERVAL_S
+
+        self.grids = {}         # piętro -> np.ndarray [rows, cols]
+        self.last_ts = {}       # tag_id -> czas poprzedniej ramki
+        self.interval_start = None
+        self.pending = []
+
+    def grid(self, floor):
+        grid = self.grids.get(floor)
+        if grid is None:
+            grid = self.grids[floor] = np.zeros((self.rows, self.cols), dtype=np.float32)
+        return grid
+
+    def process(self, frames):
+        for frame in frames:
+            start = frame.ts - frame.ts % self.interval
+            if self.interval_start is None:
+                self.interval_start = start
+            elif start > self.interval_start:
+                self.close_interval()
+                self.interval_start = start
+
+            previous = self.last_ts.get(frame.tag_id)
+            self.last_ts[frame.tag_id] = frame.ts
+            if previous is None or frame.ts <= previous:
+                continue
+
+            col = int((frame.payload['pos_x'] - self.origin_x) // self.cell)
+            row = int((frame.payload['pos_y'] - self.origin_y) // self.cell)
+            if 0 <= row < self.rows and 0 <= col < self.cols:
+                self.grid(frame.payload['floor'])[row, col] += min(frame.ts - previous, settings.HEATMAP_MAX_DT_S)
+
+    def close_interval(self):
+        start = datetime.fromtimestamp(self.interval_start, tz=timezone.utc)
+        end = datetime.fromtimestamp(self.interval_start + self.interval, tz=timezone.utc)
+        for floor, grid in self.grids.items():
+            if grid.any():
+                self.pending.append(OccupancySnapshot(
+                    floor=floor, start=start, end=end,
+                    origin_x=self.origin_x, origin_y=self.origin_y, cell_size_m=self.cell,
+                    rows=self.rows, cols=self.cols, data=OccupancySnapshot.encode(grid),
+                ))
+        self.grids = {}
+
+    def write(self, frames):
+        if self.pending:
+            OccupancySnapshot.objects.bulk_create(self.pending)
+            self.pending = []
+
+    def close(self):
+        if self.interval_start is not None:
+            self.close_interval()
+        self.write([])
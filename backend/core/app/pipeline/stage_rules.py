@@ -0,0 +1,113 @@
+# pipeline/stage_rules.py
+from django.conf import settings
+
+from app.models.models_alarm import Alert
+from app.pipeline.pipeline import Stage, alert_payload, make_alert_id
+
+RULE_PREFIX = 'RULE'
+
+
+class TagRuleState:
+    """Minimalny stan reguł dla jednego tagu."""
+    __slots__ = ('stationary_since', 'active')
+
+    def __init__(self):
+        self.stationary_since = None
+        self.active = {}    # alert_type -> id aktywnego alertu
+
+
+class AlertRulesStage(Stage):
+    """
+    Strumieniowy silnik reguł alarmowych (man-down, SOS, SCBA, tętno, temperatura).
+
+    Każda ramka jest oceniana w O(1) względem stanu jej tagu. Alert powstaje
+    przy wejściu w stan alarmowy i jest rozwiązywany dopiero po przekroczeniu
+    progu powrotu (histereza), więc utrzymujący się stan nie generuje duplikatów.
+    """
+
+    name = 'rules'
+
+    def __init__(self):
+        self.states = {}
+        self.resolved = []
+        self.loaded = False
+
+    def load_active(self):
+        """Odtwarza aktywne alerty po restarcie, żeby ich nie dublować."""
+        for alert_id, alert_type, tag_id in (
+            Alert.objects.filter(resolved=False, id__startswith=f'{RULE_PREFIX}-')
+            .values_list('id', 'alert_type', 'tag_id')
+        ):
+            self.state(tag_id).active[alert_type] = alert_id
+        self.loaded = True
+
+    def state(self, tag_id):
+        state = self.states.get(tag_id)
+        if state is None:
+            state = self.states[tag_id] = TagRuleState()
+        return state
+
+    def process(self, frames):
+        if not self.loaded:
+            self.load_active()
+        for frame in frames:
+            self.evaluate(frame, self.state(frame.tag_id))
+
+    def write(self, frames):
+        if self.resolved:
+            Alert.objects.filter(id__in=self.resolved).update(resolved=True)
+            self.resolved = []
+
+    def rollback(self):
+        # Alerty i rozwiązania z nieudanej paczki nie trafiły do bazy - aktywne alerty wczytujemy od nowa
+        for state in self.states.values():
+            state.active = {}
+        self.resolved = []
+        self.loaded = False
+
+    def stationary_seconds(self, frame, state):
+        vitals = frame.data.get('vitals', {})
+        if vitals.get('stationary_duration_s') is not None:
+            return vitals['stationary_duration_s']
+        if frame.payload['motion_state'] != 'stationary':
+            state.stationary_since = None
+            return 0
+        if state.stationary_since is None:
+            state.stationary_since = frame.ts
+        return frame.ts - state.stationary_since
+
+    def evaluate(self, frame, state):
+        s = settings
+        payload = frame.payload
+        stationary = self.stationary_seconds(frame, state)
+        sos = bool(frame.data.get('device', {}).get('sos_button_pressed'))
+        pressure = payload['scba_pressure']
+        hr = payload['heart_rate']
+        temperature = payload['temperature']
+
+        self.check(frame, state, stationary, 'man_down', 'critical',
+                   stationary >= s.ALERT_MAN_DOWN_S, stationary < s.ALERT_MAN_DOWN_CLEAR_S)
+        self.check(frame, state, stationary, 'sos_pressed', 'critical', sos, not sos)
+        self.check(frame, state, stationary, 'scba_critical', 'critical',
+                   pressure < s.ALERT_SCBA_CRITICAL_BAR,
+                   pressure > s.ALERT_SCBA_CRITICAL_BAR + s.ALERT_SCBA_HYSTERESIS_BAR)
+        self.check(frame, state, stationary, 'scba_low_pressure', 'warning',
+                   pressure < s.ALERT_SCBA_LOW_BAR,
+                   pressure > s.ALERT_SCBA_LOW_BAR + s.ALERT_SCBA_HYSTERESIS_BAR)
+        self.check(frame, state, stationary, 'high_heart_rate', 'warning',
+                   hr > s.ALERT_HR_HIGH_BPM, hr < s.ALERT_HR_HIGH_BPM - s.ALERT_HR_HYSTERESIS_BPM)
+        self.check(frame, state, stationary, 'low_heart_rate', 'critical',
+                   0 < hr < s.ALERT_HR_LOW_BPM, hr > s.ALERT_HR_LOW_BPM + s.ALERT_HR_HYSTERESIS_BPM)
+        self.check(frame, state, stationary, 'high_temperature', 'warning',
+                   temperature is not None and temperature >= s.ALERT_TEMPERATURE_HIGH_C,
+                   temperature is not None and temperature < s.ALERT_TEMPERATURE_HIGH_C - s.ALERT_TEMPERATURE_HYSTERESIS_C)
+
+    def check(self, frame, state, stationary, alert_type, severity, triggered, cleared):
+        active = state.active.get(alert_type)
+        if active is None and triggered:
+            alert_id = make_alert_id(RULE_PREFIX, alert_type, frame)
+            state.active[alert_type] = alert_id
+            frame.alerts.append(alert_payload(frame, alert_id, alert_type, severity, stationary))
+        elif active is not None and cleared:
+            del state.active[alert_type]
+            self.resolved.append(active)
@@ -0,0 +1,98 @@
+# pipeline/stage_scba.py
+from django.conf import settings
+
+from app.pipeline.pipeline import Stage
+
+
+class ScbaEstimator:
+    """
+    Przyrostowa regresja liniowa ciśnienia w butli względem czasu,
+    z wykładniczym zapominaniem starszych próbek. Aktualizacja w O(1).
+    """
+    __slots__ = ('t0', 'last_t', 'last_p', 'sw', 'st', 'sp', 'stt', 'stp', 'half_life_s')
+
+    def __init__(self, half_life_s):
+        self.half_life_s = half_life_s
+        self.reset()
+
+    def reset(self):
+        self.t0 = self.last_t = self.last_p = None
+        self.sw = self.st = self.sp = self.stt = self.stp = 0.0
+
+    def update(self, t, p):
+        if self.t0 is None:
+            self.t0 = t
+        elif t > self.last_t:
+            decay = 0.5 ** ((t - self.last_t) / self.half_life_s)
+            self.sw *= decay
+            self.st *= decay
+            self.sp *= decay
+            self.stt *= decay
+            self.stp *= decay
+
+        x = t - self.t0
+        self.sw += 1.0
+        self.st += x
+        self.sp += p
+        self.stt += x * x
+        self.stp += x * p
+        self.last_t, self.last_p = t, p
+
+    def slope(self):
+        """Nachylenie [bar/s] albo None, jeśli próbek jest za mało."""
+        denominator = self.sw * self.stt - self.st * self.st
+        if self.sw < 2 or denominator <= 1e-9:
+            return None
+        return (self.sw * self.stp - self.st * self.sp) / denominator
+
+
+class ScbaStage(Stage):
+    """
+    Prognoza zapasu powietrza w aparacie SCBA.
+
+    Dla każdego tagu utrzymywany jest ScbaEstimator, z którego wyliczane są
+    zużycie powietrza [l/min] i czas do opróżnienia butli [min] zapisywane
+    razem z ramką w modelu SCBA.
+    """
+
+    name = 'scba'
+
+    def __init__(self):
+        self.estimators = {}
+
+    def process(self, frames):
+        for frame in frames:
+            self.apply(frame)
+
+    def apply(self, frame):
+        pressure = frame.payload['scba_pressure']
+        estimator = self.estimators.get(frame.tag_id)
+        if estimator is None:
+            estimator = self.estimators[frame.tag_id] = ScbaEstimator(settings.SCBA_HALF_LIFE_S)
+
+        # Wymiana / dopełnienie butli - zaczynamy estymację od nowa
+        if estimator.last_p is not None and pressure - estimator.last_p > settings.SCBA_REFILL_JUMP_BAR:
+            estimator.reset()
+        estimator.update(frame.ts, pressure)
+
+        slope = estimator.slope()
+        consuming = slope is not None and slope < 0
+        consumption_lpm = -slope * 60 * settings.SCBA_CYLINDER_VOLUME_L if consuming else 0.0
+        remaining_min = None
+        if consuming:
+            remaining_min = max(pressure - settings.SCBA_RESERVE_BAR, 0.0) / (-slope * 60)
+
+        scba = frame.data.get('scba', {})
+        frame.payload['scba'] = {
+            'id': scba.get('id') or frame.tag_id,
+            'manufacturer': scba.get('manufacturer', ''),
+            'model': scba.get('model', ''),
+            'max_pressure_bar': scba.get('max_pressure_bar', 300),
+            'consumption_rate_lpm': round(consumption_lpm),
+            'remaining_time_min': None if remaining_min is None else round(remaining_min),
+            'battery_percent': scba.get('battery_percent', 0),
+            'connection_status': scba.get('connection_status', 'unknown'),
+            'low_pressure': pressure < settings.ALERT_SCBA_LOW_BAR,
+            'very_low_pressure': pressure < settings.ALERT_SCBA_CRITICAL_BAR,
+            'motion': bool(scba.get('alarms', {}).get('motion', False)),
+        }
@@ -0,0 +1,36 @@
+# pipeline/stage_spatial.py
+import math
+from django.conf import settings
+
+from app.pipeline.pipeline import Stage
+
+# Indeksy kolumn/wierszy przesunięte o połowę zakresu, żeby ujemne współrzędne też miały komórkę
+CELL_STRIDE = 1 << 16
+CELL_OFFSET = CELL_STRIDE // 2
+
+
+def cell_id(x, y, size=None):
+    """Identyfikator komórki jednorodnej siatki zawierającej punkt (x, y)."""
+    size = size or settings.SPATIAL_CELL_SIZE_M
+    return (math.floor(y / size) + CELL_OFFSET) * CELL_STRIDE + math.floor(x / size) + CELL_OFFSET
+
+
+def cells_within(x, y, radius, size=None):
+    """Komórki pokrywające kwadrat opisany na okręgu o promieniu `radius` wokół (x, y)."""
+    size = size or settings.SPATIAL_CELL_SIZE_M
+    col_min = math.floor((x - radius) / size) + CELL_OFFSET
+    col_max = math.floor((x + radius) / size) + CELL_OFFSET
+    row_min = math.floor((y - radius) / size) + CELL_OFFSET
+    row_max = math.floor((y + radius) / size) + CELL_OFFSET
+    return [row * CELL_STRIDE + col for row in range(row_min, row_max + 1) for col in range(col_min, col_max + 1)]
+
+
+class SpatialIndexStage(Stage):
+    """Wylicza komórkę siatki przestrzennej dla pozycji z ramki (indeks floor, cell, timestamp)."""
+
+    name = 'spatial'
+
+    def process(self, frames):
+        size = settings.SPATIAL_CELL_SIZE_M
+        for frame in frames:
+            frame.payload['cell'] = cell_id(frame.payload['pos_x'], frame.payload['pos_y'], size)
@@ -0,0 +1,76 @@
+# pipeline/stage_trilateration.py
+import numpy as np
+from django.conf import settings
+
+from app.filters.trilateration import TrilaterationEngine
+from app.models.models_beacon import Beacon
+from app.pipeline.pipeline import Stage
+
+
+class TrilaterationStage(Stage):
+    """
+    Liczy pozycję tagu z pomiarów UWB po stronie serwera.
+
+    Ramki, które mają co najmniej TRILATERATION_MIN_BEACONS pomiarów do znanych
+    beaconów, dostają pozycję z trilateracji (dalej wygładzaną przez UKF)
+    oraz wypełniony rekord Trilateration. Pozostałe zachowują pozycję z ramki.
+    """
+
+    name = 'trilateration'
+
+    def __init__(self):
+        self.engine = TrilaterationEngine(
+            max_iterations=settings.TRILATERATION_MAX_ITERATIONS,
+            tolerance_m=settings.TRILATERATION_TOLERANCE_M,
+            min_beacons=settings.TRILATERATION_MIN_BEACONS,
+        )
+        self.last_position = {}
+        self.loaded = False
+
+    def on_beacons(self, beacons):
+        self.engine.set_beacons(beacons)
+        self.loaded = True
+
+    def load_beacons(self):
+        """Po restarcie korzystamy z konfiguracji zapisanej w bazie, zanim przyjdzie nowa."""
+        self.engine.set_beacons(
+            {'id': b.id, 'position': {'x': b.x, 'y': b.y, 'z': b.z}} for b in Beacon.objects.all()
+        )
+        self.loaded = True
+
+    def process(self, frames):
+        if not self.loaded:
+            self.load_beacons()
+        if not self.engine.beacons:
+            return
+        B, r, w, ids = self.engine.pack([f.data.get('uwb_measurements') or [] for f in frames])
+        solvable = [i for i, used in enumerate(ids) if len(used) >= self.engine.min_beacons]
+        if not solvable:
+            return
+
+        batch = [frames[i] for i in solvable]
+        initial = np.array([
+            self.last_position.get(f.tag_id, (f.payload['pos_x'], f.payload['pos_y'], f.payload['pos_z']))
+            for f in batch
+        ])
+        result = self.engine.solve(B[solvable], r[solvable], w[solvable], initial=initial)
+
+        for k, (i, frame) in enumerate(zip(solvable, batch)):
+            x, y, z = (float(v) for v in result['position'][k])
+            self.last_position[frame.tag_id] = (x, y, z)
+            payload = frame.payload
+            payload['pos_x'], payload['pos_y'], payload['pos_z'] = x, y, z
+            payload['source'] = 'uwb_trilateration'
+            payload['beacons_used'] = len(ids[i])
+            payload['trilateration'] = {
+                'raw_position': {'x': x, 'y': y, 'z': z},
+                'filtered_position': {'x': x, 'y': y, 'z': z},
+                'residual_error_m': float(result['residual'][k]),
+                'gdop': float(result['gdop'][k]),
+                'hdop': float(result['hdop'][k]),
+                'vdop': float(result['vdop'][k]),
+                'beacons_used': ids[i],
+                'algorithm': self.engine.algorithm,
+                'iterations': int(result['iterations'][k]),
+                'convergence': bool(result['converged'][k]),
+            }
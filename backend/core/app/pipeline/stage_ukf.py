@@ -0,0 +1,79 @@
+# pipeline/stage_ukf.py
+import math
+import numpy as np
+from django.conf import settings
+
+from app.filters.ukf_filter import BatchedUKF
+from app.pipeline.pipeline import Stage, TagSlots, split_rounds
+
+
+class UKFStage(Stage):
+    """
+    Wygładzanie pozycji filtrem UKF.
+
+    Pozycja z ramki traktowana jest jako pomiar, do zapisu trafia pozycja
+    przefiltrowana oraz dokładność i pewność wyliczone z kowariancji.
+    """
+
+    name = 'ukf'
+
+    def __init__(self):
+        self.slots = TagSlots()
+        self.ukf = BatchedUKF(
+            process_noise=settings.UKF_PROCESS_NOISE,
+            max_gap_s=settings.UKF_MAX_GAP_S,
+        )
+        self.default_sigma = settings.UKF_DEFAULT_MEASUREMENT_SIGMA_M
+        self.confidence_scale = settings.UKF_CONFIDENCE_SCALE_M
+        self.touched = set()    # wiersze zmienione przez paczkę, która nie jest jeszcze zapisana
+
+    def measurement_sigma(self, frame):
+        trilateration = frame.payload.get('trilateration')
+        if trilateration:
+            accuracy = trilateration['residual_error_m'] * max(trilateration['hdop'], 1.0)
+        else:
+            accuracy = frame.data.get('position', {}).get('accuracy_m') or 0.0
+        return max(accuracy, self.default_sigma)
+
+    def process(self, frames):
+        # Pomiar bez skończonej pozycji zepsułby stan filtra tagu (NaN) na stałe
+        frames = [f for f in frames if all(math.isfinite(f.payload[key]) for key in ('pos_x', 'pos_y', 'pos_z'))]
+        for batch in split_rounds(frames):
+            rows = np.fromiter((self.slots.row(f.tag_id) for f in batch), dtype=np.intp, count=len(batch))
+            self.ukf.ensure_capacity(len(self.slots))
+
+            z = np.array([(f.payload['pos_x'], f.payload['pos_y'], f.payload['pos_z']) for f in batch])
+            t = np.fromiter((f.ts for f in batch), dtype=float, count=len(batch))
+            r_var = np.fromiter((self.measurement_sigma(f) for f in batch), dtype=float, count=len(batch)) ** 2
+
+            self.touched.update(rows.tolist())
+            x, P = self.ukf.step(rows, z, t, r_var)
+            accuracy = BatchedUKF.accuracy(P)
+            confidence = np.exp(-accuracy / self.confidence_scale)
+
+            for i, frame in enumerate(batch):
+                self.apply(frame, z[i], x[i], accuracy[i], confidence[i])
+
+    def write(self, frames):
+        self.touched = set()
+
+    def rollback(self):
+        # Stan po nieudanej paczce nie odpowiada zapisanym ramkom - te tagi startują od następnego pomiaru
+        if self.touched:
+            self.ukf.reset(list(self.touched))
+        self.touched = set()
+
+    def apply(self, frame, measured, state, accuracy, confidence):
+        payload = frame.payload
+        payload['pos_x'], payload['pos_y'], payload['pos_z'] = (float(v) for v in state[:3])
+        payload['accuracy_m'] = float(accuracy)
+        payload['confidence'] = float(confidence)
+
+        # Trilateracja z naszego etapu albo z ramki - podmieniamy pozycję przefiltrowaną na naszą
+        trilateration = payload.get('trilateration') or frame.data.get('position', {}).get('trilateration')
+        if trilateration:
+            payload['trilateration'] = {
+                **trilateration,
+                'raw_position': trilateration.get('raw_position') or dict(zip('xyz', map(float, measured))),
+                'filtered_position': {'x': payload['pos_x'], 'y': payload['pos_y'], 'z': payload['pos_z']},
+            }
@@ -0,0 +1,183 @@
+# pipeline/stage_vitals.py
+import numpy as np
+from django.conf import settings
+
+from app.models.models_alarm import Alert
+from app.pipeline.pipeline import Stage, TagSlots, alert_payload, make_alert_id, split_rounds
+
+ANOMALY_PREFIX = 'ANOMALY'
+
+SIGNALS = ('heart_rate', 'hrv', 'skin_temperature', 'stress')
+
+# Minimalne odchylenie standardowe bazy - żeby bardzo stabilny sygnał nie dawał ogromnych z-score
+MIN_STD = np.array([3.0, 5.0, 0.2, 0.5])
+
+STRESS_LEVELS = {'low': 0.0, 'medium': 1.0, 'moderate': 1.0, 'high': 2.0, 'very_high': 3.0, 'extreme': 3.0}
+
+
+class VitalsAnomalyDetector:
+    """
+    Wykrywanie odchyleń parametrów życiowych od indywidualnej bazy strażaka.
+
+    Średnia i wariancja każdego sygnału liczone są wykładniczo (okno ok.
+    `window` próbek) w tablicach [N, 4], a jeden krok aktualizuje wszystkie
+    tagi z ticku naraz. Anomalia to |z| > z_raise utrzymujące się przez
+    `sustain` kolejnych próbek; kończy się, gdy |z| spadnie poniżej z_clear.
+    W trakcie anomalii baza nie jest aktualizowana.
+    """
+
+    def __init__(self, window=120, warmup=30, z_raise=3.0, z_clear=2.0, sustain=5, capacity=16):
+        self.alpha = 1.0 / window
+        self.warmup = warmup
+        self.z_raise = z_raise
+        self.z_clear = z_clear
+        self.sustain = sustain
+        k = len(SIGNALS)
+        self.mean = np.zeros((capacity, k))
+        self.var = np.zeros((capacity, k))
+        self.count = np.zeros((capacity, k), dtype=int)
+        self.streak = np.zeros((capacity, k), dtype=int)
+        self.active = np.zeros((capacity, k), dtype=bool)
+
+    def ensure_capacity(self, size):
+        capacity = len(self.mean)
+        if size <= capacity:
+            return
+        extra = max(size, capacity * 2) - capacity
+        k = len(SIGNALS)
+        self.mean = np.concatenate([self.mean, np.zeros((extra, k))])
+        self.var = np.concatenate([self.var, np.zeros((extra, k))])
+        self.count = np.concatenate([self.count, np.zeros((extra, k), dtype=int)])
+        self.streak = np.concatenate([self.streak, np.zeros((extra, k), dtype=int)])
+        self.active = np.concatenate([self.active, np.zeros((extra, k), dtype=bool)])
+
+    def step(self, rows, values):
+        """
+        values: [N, 4] (NaN = brak sygnału). Zwraca (z, raised, cleared) jako tablice [N, 4].
+        """
+        valid = ~np.isnan(values)
+        mean, var, count = self.mean[rows], self.var[rows], self.count[rows]
+        active, streak = self.active[rows], self.streak[rows]
+
+        std = np.maximum(np.sqrt(var), MIN_STD)
+        z = np.where(valid, (values - mean) / std, 0.0)
+        warm = valid & (count >= self.warmup)
+
+        outside = warm & (np.abs(z) > self.z_raise)
+        streak = np.where(outside, streak + 1, 0)
+        raised = ~active & (streak >= self.sustain)
+        cleared = active & warm & (np.abs(z) < self.z_clear)
+        active = (active | raised) & ~cleared
+
+        # Baza uczy się tylko na próbkach w normie
+        learn = valid & ~active & ~outside
+        delta = np.where(learn, values - mean, 0.0)
+        first = learn & (count == 0)
+        a = np.where(first, 1.0, np.where(learn, np.maximum(self.alpha, 1.0 / (count + 1)), 0.0))
+        mean = mean + a * delta
+        var = np.where(first, 0.0, (1 - a) * (var + a * delta ** 2))
+
+        self.mean[rows], self.var[rows] = mean, var
+        self.count[rows] = count + learn
+        self.streak[rows], self.active[rows] = streak, active
+        return z, raised, cleared
+
+
+class VitalsAnomalyStage(Stage):
+    """Strumieniowa detekcja anomalii parametrów życiowych, z alertami w modelu Alert."""
+
+    name = 'vitals'
+
+    def __init__(self):
+        self.slots = TagSlots()
+        self.detector = VitalsAnomalyDetector(
+            window=settings.VITALS_WINDOW_SAMPLES,
+            warmup=settings.VITALS_WARMUP_SAMPLES,
+            z_raise=settings.VITALS_Z_RAISE,
+            z_clear=settings.VITALS_Z_CLEAR,
+            sustain=settings.VITALS_SUSTAIN_SAMPLES,
+        )
+        self.active_ids = {}    # (tag_id, sygnał) -> id aktywnego alertu
+        self.restored = {}      # (tag_id, sygnał) -> id alertu sprzed restartu, do końca rozgrzewki
+        self.resolved = []
+        self.loaded = False
+
+    def load_active(self):
+        """
+        Nierozwiązane anomalie sprzed restartu. Baza detektora przepada z procesem, więc nie
+        oznaczamy ich jako aktywnych w detektorze (nie mógłby ich zakończyć) - czekają na koniec
+        rozgrzewki: anomalia wykryta ponownie przejmuje stary alert, brak anomalii go zamyka.
+        """
+        for alert_id, alert_type, tag_id in (
+            Alert.objects.filter(resolved=False, id__startswith=f'{ANOMALY_PREFIX}-')
+            .values_list('id', 'alert_type', 'tag_id')
+        ):
+            signal = alert_type.removesuffix('_anomaly')
+            if signal in SIGNALS:
+                self.restored[(tag_id, signal)] = alert_id
+        self.loaded = True
+
+    @staticmethod
+    def values(frame):
+        payload = frame.payload
+        hrv = payload.get('heart_rate_variability') or np.nan
+        skin = payload.get('skin_temperature') or np.nan
+        stress = STRESS_LEVELS.get(payload.get('stress_level'), np.nan)
+        return payload['heart_rate'] or np.nan, hrv, skin, stress
+
+    def process(self, frames):
+        if not self.loaded:
+            self.load_active()
+        for batch in split_rounds(frames):
+            rows = np.fromiter((self.slots.row(f.tag_id) for f in batch), dtype=np.intp, count=len(batch))
+            self.detector.ensure_capacity(len(self.slots))
+            values = np.array([self.values(f) for f in batch], dtype=float)
+
+            _, raised, cleared = self.detector.step(rows, values)
+
+            for i, k in zip(*np.nonzero(raised)):
+                restored = self.restored.pop((batch[i].tag_id, SIGNALS[k]), None)
+                if restored:
+                    self.active_ids[(batch[i].tag_id, SIGNALS[k])] = restored
+                else:
+                    self.raise_alert(batch[i], SIGNALS[k])
+            for i, k in zip(*np.nonzero(cleared)):
+                alert_id = self.active_ids.pop((batch[i].tag_id, SIGNALS[k]), None)
+                if alert_id:
+                    self.resolved.append(alert_id)
+            if self.restored:
+                self.settle_restored(batch, rows)
+
+    def settle_restored(self, batch, rows):
+        """Zamyka alerty sprzed restartu, których sygnał po rozgrzewce nie jest anomalią."""
+        detector = self.detector
+        for frame, row in zip(batch, rows):
+            for k, signal in enumerate(SIGNALS):
+                key = (frame.tag_id, signal)
+                # > warmup: przynajmniej jedna próbka była już oceniona względem bazy
+                if key in self.restored and detector.count[row, k] > detector.warmup \
+                        and not detector.active[row, k] and not detector.streak[row, k]:
+                    self.resolved.append(self.restored.pop(key))
+
+    def write(self, frames):
+        if self.resolved:
+            Alert.objects.filter(id__in=self.resolved).update(resolved=True)
+            self.resolved = []
+
+    def rollback(self):
+        """
+        Alerty i rozwiązania z nieudanej paczki nie trafiły do bazy. Stan anomalii detektora
+        zerujemy (baza sygnałów zostaje), a nierozwiązane alerty wczytujemy od nowa jak po
+        restarcie - trwająca anomalia przejmie swój alert, zakończona go zamknie.
+        """
+        self.detector.active[:] = False
+        self.detector.streak[:] = 0
+        self.active_ids = {}
+        self.restored = {}
+        self.resolved = []
+        self.loaded = False
+
+    def raise_alert(self, frame, signal):
+        alert_id = make_alert_id(ANOMALY_PREFIX, signal, frame)
+        self.active_ids[(frame.tag_id, signal)] = alert_id
+        frame.alerts.append(alert_payload(frame, alert_id, f'{signal}_anomaly', 'warning'))
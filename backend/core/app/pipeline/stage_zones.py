@@ -0,0 +1,148 @@
+# pipeline/stage_zones.py
+import math
+from django.conf import settings
+from django.db.models import Count, Max
+
+from app.models.models_alarm import Alert
+from app.models.models_zone import Zone
+from app.pipeline.pipeline import Stage, alert_payload, make_alert_id
+
+ZONE_PREFIX = 'ZONE'
+
+
+def point_in_polygon(x, y, polygon):
+    """Test parzystości przecięć (ray casting)."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+class ZoneIndex:
+    """
+    Indeks stref na jednorodnej siatce: każda komórka piętra zna strefy,
+    których prostokąt otaczający na nią zachodzi. Zapytanie to jedno
+    wyszukanie w słowniku i testy tylko dla tych kilku wielokątów.
+    """
+
+    def __init__(self, zones, cell_size):
+        self.cell_size = cell_size
+        self.zones = {zone.id: zone for zone in zones}
+        self.cells = {}
+        for zone in zones:
+            for cx in range(math.floor(zone.min_x / cell_size), math.floor(zone.max_x / cell_size) + 1):
+                for cy in range(math.floor(zone.min_y / cell_size), math.floor(zone.max_y / cell_size) + 1):
+                    self.cells.setdefault((zone.floor, cx, cy), []).append(zone)
+
+    def containing(self, floor, x, y):
+        """Identyfikatory stref zawierających punkt."""
+        candidates = self.cells.get((floor, math.floor(x / self.cell_size), math.floor(y / self.cell_size)), ())
+        return {
+            zone.id for zone in candidates
+            if zone.min_x <= x <= zone.max_x and zone.min_y <= y <= zone.max_y
+            and point_in_polygon(x, y, zone.polygon)
+        }
+
+
+class ZoneVisit:
+    __slots__ = ('entered', 'entry_alert', 'dwell_alert')
+
+    def __init__(self, entered, entry_alert=None):
+        self.entered = entered
+        self.entry_alert = entry_alert
+        self.dwell_alert = None
+
+
+class ZoneStage(Stage):
+    """
+    Geofencing: alert przy wejściu do strefy oraz gdy pobyt przekroczy jej max_dwell_s.
+    Alerty wizyty są rozwiązywane przy wyjściu ze strefy.
+    """
+
+    name = 'zones'
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.checked_at = None
+        self.visits = {}        # tag_id -> {zone_id: ZoneVisit}
+        self.resolved = []
+
+    def refresh(self, now):
+        """Przebudowuje indeks, jeśli strefy zmieniły się od ostatniego sprawdzenia."""
+        if self.checked_at is not None and now - self.checked_at < settings.ZONE_RELOAD_S:
+            return
+        self.checked_at = now
+        version = Zone.objects.filter(active=True).aggregate(count=Count('id'), updated=Max('updated_at'))
+        if version == self.version:
+            return
+        if self.version is None:
+            self.load_active()
+        self.version = version
+        self.index = ZoneIndex(list(Zone.objects.filter(active=True)), settings.ZONE_INDEX_CELL_SIZE_M)
+
+    def load_active(self):
+        """Odtwarza trwające wizyty z nierozwiązanych alertów po restarcie."""
+        for alert_id, tag_id, timestamp in (
+            Alert.objects.filter(resolved=False, id__startswith=f'{ZONE_PREFIX}-')
+            .values_list('id', 'tag_id', 'timestamp')
+        ):
+            _, zone_id, kind, _ = alert_id.split('-', 3)
+            visit = self.visits.setdefault(tag_id, {}).setdefault(int(zone_id), ZoneVisit(timestamp.timestamp()))
+            if kind == 'zone_entry':
+                visit.entry_alert = alert_id
+            else:
+                visit.dwell_alert = alert_id
+
+    def process(self, frames):
+        if not frames:
+            return
+        self.refresh(frames[-1].ts)
+        for frame in frames:
+            self.apply(frame)
+
+    def apply(self, frame):
+        payload = frame.payload
+        inside = self.index.containing(payload['floor'], payload['pos_x'], payload['pos_y']) if self.index else set()
+        visits = self.visits.get(frame.tag_id)
+        if not inside and not visits:
+            return
+        if visits is None:
+            visits = self.visits[frame.tag_id] = {}
+
+        for zone_id in list(visits):
+            if zone_id not in inside:
+                visit = visits.pop(zone_id)
+                self.resolved.extend(a for a in (visit.entry_alert, visit.dwell_alert) if a)
+
+        for zone_id in inside:
+            zone = self.index.zones[zone_id]
+            visit = visits.get(zone_id)
+            if visit is None:
+                visit = visits[zone_id] = ZoneVisit(frame.ts)
+                visit.entry_alert = self.alert(frame, zone, 'zone_entry', zone.severity)
+            elif (visit.dwell_alert is None and zone.max_dwell_s is not None
+                  and frame.ts - visit.entered >= zone.max_dwell_s):
+                visit.dwell_alert = self.alert(frame, zone, 'zone_dwell', 'critical')
+
+    def alert(self, frame, zone, alert_type, severity):
+        alert_id = make_alert_id(ZONE_PREFIX, f'{zone.id}-{alert_type}', frame)
+        frame.alerts.append(alert_payload(frame, alert_id, alert_type, severity))
+        return alert_id
+
+    def write(self, frames):
+        if self.resolved:
+            Alert.objects.filter(id__in=self.resolved).update(resolved=True)
+            self.resolved = []
+
+    def rollback(self):
+        # Wizyty odtwarzamy z zapisanych alertów przy następnym odświeżeniu
+        self.visits = {}
+        self.resolved = []
+        self.version = None
+        self.checked_at = None
@@ -0,0 +1,238 @@
+# pipeline/workers.py
+"""
+Wieloprocesowy ingest: jeden proces czytający, N procesów zapisujących.
+
+Proces czytający (listener) nie dekoduje ramek telemetrii - wyciąga z surowego
+JSON-a tylko tag_id i wrzuca wiadomość do kolejki workera `shard(tag_id)`.
+Każdy tag trafia zawsze do tego samego workera przez jedną kolejkę FIFO, więc
+kolejność ramek tagu jest zachowana, a stanowe etapy potoku (UKF, reguły,
+anomalie...) widzą pełną historię swoich tagów. Worker dekoduje, buforuje
+i przepuszcza paczki przez własny potok `build_pipeline()`.
+
+Workery zgłaszają się przez `heartbeats`; `WorkerPool.check` restartuje te,
+które umarły albo nie odpowiadają dłużej niż INGEST_WORKER_STALL_S. Wiadomości
+z kolejki restartowanego workera trafiają do nowego; paczka, którą martwy worker
+trzymał w pamięci, przepada.
+"""
+import asyncio
+import logging
+import multiprocessing
+import re
+import signal
+import time
+import zlib
+from queue import Empty, Full
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_RE = re.compile(r'"type"\s*:\s*"tag_telemetry"')
+TAG_RE = re.compile(r'"tag_id"\s*:\s*"([^"]*)"')
+
+TELEMETRY = 'telemetry'
+BEACONS = 'beacons'
+STOP = 'stop'
+
+
+def telemetry_tag(message):
+    """tag_id ramki telemetrii z surowej wiadomości, albo None, jeśli to nie jest ramka telemetrii."""
+    if isinstance(message, bytes):
+        message = message.decode()
+    if not TELEMETRY_RE.search(message):
+        return None
+    match = TAG_RE.search(message)
+    return match.group(1) if match else None
+
+
+def shard(tag_id, workers):
+    """Stały przydział tagu do workera (crc32, niezależnie od PYTHONHASHSEED)."""
+    return zlib.crc32(tag_id.encode()) % workers
+
+
+def worker_main(index, queue, heartbeats, processed, stages=True):
+    """Pętla procesu workera: kolejka -> dekodowanie -> paczki -> potok ingestu."""
+    import django
+    django.setup()
+    import orjson
+    from django.db import connection
+    from app.pipeline.pipeline import Frame, IngestPipeline, build_pipeline
+
+    # Ctrl+C trafia do całej grupy procesów - worker kończy pracę na polecenie STOP od listenera
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pipeline = build_pipeline() if stages else IngestPipeline()
+    buffer = []
+    deadline = time.monotonic() + settings.INGEST_FLUSH_INTERVAL_S
+
+    def flush():
+        nonlocal buffer
+        if buffer:
+            frames, buffer = buffer, []
+            try:
+                pipeline.run(frames)
+            except Exception as e:
+                logger.error(f"Worker {index}: błąd zapisu paczki telemetrii: {e}")
+            # Także ramki odrzucone (duplikaty, deadband, błąd walidacji) - liczy się, że przeszły przez potok
+            processed[index] += len(frames)
+
+    heartbeats[index] = time.time()
+    while True:
+        try:
+            kind, body = queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+        except Empty:
+            kind = None
+        heartbeats[index] = time.time()
+
+        if kind == TELEMETRY:
+            try:
+                buffer.append(Frame.from_message(orjson.loads(body)))
+            except (KeyError, orjson.JSONDecodeError) as e:
+                logger.error(f"Worker {index}: niepoprawna ramka telemetrii: {e}")
+        elif kind == BEACONS:
+            flush()
+            pipeline.update_beacons(body)
+        elif kind == STOP:
+            flush()
+            try:
+                pipeline.close()
+            except Exception as e:
+                logger.error(f"Worker {index}: błąd zapisu stanu potoku: {e}")
+            break
+
+        if len(buffer) >= settings.INGEST_MAX_BATCH_SIZE or time.monotonic() >= deadline:
+            flush()
+            deadline = time.monotonic() + settings.INGEST_FLUSH_INTERVAL_S
+    connection.close()
+
+
+class WorkerPool:
+    """Procesy workerów z kolejkami, po jednej na shard."""
+
+    def __init__(self, size, stages=True):
+        self.size = size
+        self.stages = stages
+        self.context = multiprocessing.get_context('spawn')
+        self.heartbeats = self.context.Array('d', size, lock=False)
+        self.processed = self.context.Array('q', size)
+        self.queues = [self.new_queue() for _ in range(size)]
+        self.processes = [None] * size
+        self.restarts = 0
+        self.lost = 0           # wiadomości utracone przy restartach workerów
+
+    def new_queue(self):
+        return self.context.Queue(maxsize=settings.INGEST_WORKER_QUEUE_SIZE)
+
+    def start(self):
+        for index in range(self.size):
+            self.start_worker(index)
+
+    def start_worker(self, index):
+        # Start procesu (django.setup) nie jest zawieszeniem - liczymy od teraz
+        self.heartbeats[index] = time.time()
+        process = self.context.Process(
+            target=worker_main, name=f'ingest-worker-{index}',
+            args=(index, self.queues[index], self.heartbeats, self.processed, self.stages),
+        )
+        process.start()
+        self.processes[index] = process
+
+    async def submit(self, tag_id, message):
+        """Ramka do workera tagu. Przy pełnej kolejce czeka (backpressure na połączeniu)."""
+        queue = self.queues[shard(tag_id, self.size)]
+        while True:
+            try:
+                queue.put_nowait((TELEMETRY, message))
+                return
+            except Full:
+                await asyncio.sleep(0.01)
+
+    def broadcast_beacons(self, beacons):
+        """Konfiguracja beaconów do wszystkich workerów (w kolejce, po ramkach już wysłanych)."""
+        for queue in self.queues:
+            queue.put((BEACONS, beacons))
+
+    def check(self):
+        """Restartuje workery martwe albo zawieszone. Zwraca liczbę restartów."""
+        restarted = 0
+        now = time.time()
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                logger.error(f"Worker {index} zakończył się (kod {process.exitcode}) - restart")
+            elif now - self.heartbeats[index] > settings.INGEST_WORKER_STALL_S:
+                logger.error(f"Worker {index} nie odpowiada od {now - self.heartbeats[index]:.0f} s - restart")
+                process.terminate()
+                process.join(5)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+            else:
+                continue
+            # Martwy proces mógł trzymać blokadę kolejki - nowy worker dostaje nową,
+            # z wiadomościami, które udało się odzyskać ze starej
+            old = self.queues[index]
+            messages, lost = self.salvage(old)
+            queue = self.new_queue()
+            for message in messages:
+                try:
+                    queue.put_nowait(message)
+                except Full:
+                    lost += 1
+            self.queues[index] = queue
+            # Ramki wysłane do starej kolejki w trakcie jej opróżniania przyszłyby po nowszych - tylko je liczymy
+            late, late_lost = self.salvage(old, timeout=0)
+            lost += len(late) + late_lost
+            self.start_worker(index)
+            self.lost += lost
+            restarted += 1
+            moved = f"Worker {index}: przeniesiono {len(messages)} wiadomości z kolejki do nowego workera"
+            if lost:
+                logger.error(f"{moved}, utracono {lost}")
+            else:
+                logger.warning(moved)
+        self.restarts += restarted
+        return restarted
+
+    @staticmethod
+    def salvage(queue, timeout=0.1):
+        """
+        Opróżnia kolejkę workera po jego śmierci: (odzyskane wiadomości, liczba utraconych).
+        Proces zabity w trakcie odczytu mógł zostawić zajętą blokadę albo przerwaną
+        wiadomość - reszty kolejki nie da się wtedy odczytać, jest tylko liczona.
+        """
+        messages = []
+        try:
+            while True:
+                # Z timeoutem - wątek podający kolejki tego procesu mógł jeszcze nie dopisać ramek
+                messages.append(queue.get(timeout=timeout) if timeout else queue.get_nowait())
+        except Empty:
+            pass
+        except Exception as e:
+            logger.error(f"Nie można odczytać kolejki zatrzymanego workera: {e}")
+        try:
+            lost = queue.qsize()
+        except NotImplementedError:     # macOS
+            lost = 0
+        return messages, lost
+
+    async def health_loop(self):
+        while True:
+            await asyncio.sleep(settings.INGEST_WORKER_HEALTH_INTERVAL_S)
+            # join/kill zawieszonego workera trwa do kilku sekund - poza pętlą zdarzeń
+            await asyncio.to_thread(self.check)
+
+    def total_processed(self):
+        return sum(self.processed)
+
+    def stop(self, timeout=None):
+        """Workery zapisują bufory i kończą pracę; po czasie `timeout` są zabijane."""
+        for queue in self.queues:
+            try:
+                queue.put((STOP, None), timeout=1)
+            except Full:
+                pass
+        deadline = time.monotonic() + (settings.INGEST_WORKER_STALL_S if timeout is None else timeout)
+        for process in self.processes:
+            if process is not None:
+                process.join(max(deadline - time.monotonic(), 0))
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
@@ -0,0 +1,48 @@
+# app/renderers.py
+"""
+Renderery DRF: szybki JSON (orjson) i MessagePack dla klientów binarnych.
+
+Format wybierany jest z nagłówka Accept (application/json, application/msgpack)
+albo parametrem ?format=json / ?format=msgpack. Kompresja odpowiedzi jest
+osobno, w app/middleware.py.
+"""
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_drf_encoder = JSONEncoder()
+
+
+def default(value):
+    """Typy nieznane orjson / msgpack (Decimal, daty, lazy stringi, skalary numpy) - tak jak enkoder DRF."""
+    return _drf_encoder.default(value)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = self.OPTIONS
+        # orjson zna tylko wcięcie o 2 spacje - każde żądane wcięcie je włącza
+        if accepted_media_type and 'indent=' in accepted_media_type:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=options)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=default, use_bin_type=True)
@@ -0,0 +1,122 @@
+# app/resample.py
+"""
+Odtwarzanie trasy na regularnej siatce czasu.
+
+Przy włączonym filtrze deadband (INGEST_DEADBAND) w bazie są tylko ramki,
+w których coś się zmieniło. Trasa i historia telemetrii z `?fill=hold&step=1`
+zwracają punkt (ramkę) co `step` sekund z wartością ostatniej zapisanej ramki
+(dokładnie to, co widziałby odczyt bez kompresji, z błędem w granicach tolerancji
+filtra), a `fill=linear` interpoluje pozycję między sąsiednimi ramkami na tym
+samym piętrze.
+"""
+from datetime import datetime, timezone
+
+FILL_MODES = ('hold', 'linear')
+COORDINATES = ('x', 'y', 'z')
+
+
+def parse_fill(params):
+    """(tryb, krok [s]) z parametrów zapytania albo (None, None). ValueError przy błędnych wartościach."""
+    mode = params.get('fill')
+    if not mode:
+        return None, None
+    if mode not in FILL_MODES:
+        raise ValueError(f"fill: jedno z {', '.join(FILL_MODES)}")
+    step = float(params.get('step') or 1.0)
+    if not step > 0:
+        raise ValueError("step musi być dodatni")
+    return mode, step
+
+
+def timeline(records, timestamp):
+    """(czasy [s], rekordy) posortowane po czasie; `timestamp(rekord)` to znacznik ISO 8601."""
+    times = [datetime.fromisoformat(timestamp(record)).timestamp() for record in records]
+    order = sorted(range(len(records)), key=times.__getitem__)
+    return [times[k] for k in order], [records[k] for k in order]
+
+
+def grid_size(times, step):
+    return int((times[-1] - times[0]) // step) + 1
+
+
+def check_size(count, max_points):
+    if max_points is not None and count > max_points:
+        raise ValueError(f"Siatka miałaby {count} punktów (limit {max_points}) - zwiększ step")
+
+
+def grid(times, step):
+    """(t, k) co `step` s od pierwszego do ostatniego czasu; k - ostatni rekord z czasem <= t."""
+    k = 0
+    for n in range(grid_size(times, step)):
+        t = times[0] + n * step
+        while k + 1 < len(times) and times[k + 1] <= t:
+            k += 1
+        yield t, k
+
+
+def interpolate(times, points, k, t):
+    """Współrzędne między punktem k i następnym na tym samym piętrze albo None."""
+    if k + 1 >= len(times) or times[k + 1] <= times[k]:
+        return None
+    a, b = points[k], points[k + 1]
+    if not a or not b or b['floor'] != a['floor']:
+        return None
+    w = (t - times[k]) / (times[k + 1] - times[k])
+    return {
+        key: a[key] + w * (b[key] - a[key])
+        for key in COORDINATES if a[key] is not None and b[key] is not None
+    }
+
+
+def isoformat(t):
+    return datetime.fromtimestamp(t, tz=timezone.utc).isoformat()
+
+
+def resample(points, step, mode='hold', max_points=None):
+    """
+    Punkty trasy (słowniki z 'timestamp' ISO 8601, x, y, z, floor) na siatce
+    co `step` s od pierwszego do ostatniego punktu. ValueError, gdy siatka
+    miałaby więcej niż `max_points` punktów.
+    """
+    if not points:
+        return []
+    times, points = timeline(points, lambda point: point['timestamp'])
+    check_size(grid_size(times, step), max_points)
+
+    out = []
+    for t, k in grid(times, step):
+        a = points[k]
+        point = {'timestamp': isoformat(t), 'x': a['x'], 'y': a['y'], 'z': a['z'], 'floor': a['floor']}
+        if mode == 'linear':
+            point.update(interpolate(times, points, k, t) or {})
+        out.append(point)
+    return out
+
+
+def resample_telemetry(records, step, mode='hold', max_points=None):
+    """
+    Ramki historii telemetrii (kształt TelemetrySerializer) na siatce co `step` s,
+    osobno dla każdego tagu, posortowane po czasie. Ramki odtworzone (spoza bazy)
+    mają `filled: true`; `linear` interpoluje tylko pozycję. ValueError, gdy łącznie
+    byłoby więcej niż `max_points` ramek.
+    """
+    series = {}
+    for record in records:
+        series.setdefault(record['tag_id'], []).append(record)
+    series = [timeline(tagged, lambda record: record['timestamp']) for tagged in series.values()]
+    check_size(sum(grid_size(times, step) for times, _ in series), max_points)
+
+    out = []
+    for times, tagged in series:
+        positions = [record.get('position') for record in tagged]
+        for t, k in grid(times, step):
+            record = dict(tagged[k], filled=t != times[k])
+            if record['filled']:
+                record['timestamp'] = isoformat(t)
+                if mode == 'linear':
+                    coordinates = interpolate(times, positions, k, t)
+                    if coordinates:
+                        record['position'] = {**positions[k], **coordinates}
+            out.append((t, record))
+    out.sort(key=lambda item: item[0])
+    return [record for _, record in out]
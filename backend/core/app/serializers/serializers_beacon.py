@@ -0,0 +1,8 @@
+from rest_framework import serializers
+from app.models.models_beacon import Beacon
+
+
+class BeaconSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Beacon
+        fields = "__all__"
@@ -0,0 +1,15 @@
+from rest_framework import serializers
+from app.models.models_incident import Incident
+
+
+class IncidentSerializer(serializers.ModelSerializer):
+    duration_s = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Incident
+        fields = "__all__"
+        read_only_fields = (
+            'started_at', 'ended_at', 'opened_manually', 'last_activity_at', 'frame_count', 'participants',
+            'alert_counts', 'min_x', 'min_y', 'max_x', 'max_y', 'min_floor', 'max_floor',
+            'min_heart_rate', 'max_heart_rate', 'max_temperature_c', 'min_scba_pressure_bar',
+        )
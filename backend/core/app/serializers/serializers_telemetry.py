@@ -142,3 +142,48 @@ class TelemetrySerializer(serializers.ModelSerializer):
     class Meta:
         model = Telemetry
         fields = "__all__"
+
+
+# Pola rekordu archiwum (app/archive/columnar.py) w zagnieżdżonych obiektach TelemetrySerializer
+ARCHIVED_NESTED = {
+    'position': {'x': 'x', 'y': 'y', 'z': 'z', 'floor': 'floor', 'accuracy_m': 'accuracy_m'},
+    'vitals': {
+        'heart_rate_bpm': 'heart_rate', 'heart_rate_variability_ms': 'hrv',
+        'skin_temperature_c': 'skin_temperature', 'motion_state': 'motion_state', 'stress_level': 'stress_level',
+    },
+    'scba': {'cylinder_pressure_bar': 'scba_pressure', 'remaining_time_min': 'scba_remaining_min'},
+}
+
+
+def archived_telemetry(records):
+    """
+    Płaskie rekordy archiwum w kształcie TelemetrySerializer, żeby historia pokazywała
+    je tak samo jak ramki z bazy. Pól, których archiwum nie przechowuje, nie ma (None),
+    rekord ma dodatkowo `archived: true`.
+    """
+    records = list(records)
+    if not records:
+        return []
+    fields = list(TelemetrySerializer().fields)
+    nested = {name: list(TelemetrySerializer().fields[name].fields) for name in ARCHIVED_NESTED}
+    ids = {record['firefighter_id'] for record in records if record['firefighter_id']}
+    firefighters = {
+        firefighter.pk: FirefighterSerializer(firefighter).data
+        for firefighter in Firefighter.objects.filter(pk__in=ids)
+    }
+    out = []
+    for record in records:
+        item = dict.fromkeys(fields)
+        item.update({
+            'id': record['id'], 'type': 'tag_telemetry', 'timestamp': record['timestamp'],
+            'sequence': record['sequence'], 'tag_id': record['tag_id'],
+            'firefighter': firefighters.get(record['firefighter_id']), 'incident': record['incident_id'],
+            'heading_deg': record['heading_deg'], 'floor': record['floor'],
+            'uwb_measurements': [], 'downsampled': False, 'archived': True,
+        })
+        for name, keys in ARCHIVED_NESTED.items():
+            if any(record[source] is not None for source in keys.values()):
+                item[name] = dict.fromkeys(nested[name])
+                item[name].update({key: record[source] for key, source in keys.items()})
+        out.append(item)
+    return out
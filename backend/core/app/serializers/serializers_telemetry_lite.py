@@ -1,8 +1,12 @@
 # Create a new file: app/serializers/serializers_telemetry_lite.py
+import hashlib
 
 from rest_framework import serializers
-from app.models.models_telemetry import Telemetry, Position, Vitals, SCBA, Device, Barometer
+from app.models.models_telemetry import (
+    Telemetry, Position, Vitals, SCBA, ScbaAlarms, Device, Barometer, RawPosition, Trilateration, UWBMeasurement,
+)
 from app.models.model_firefighter import Firefighter
+from app.pipeline.bulk import bulk_insert
 
 
 class TelemetryLiteSerializer(serializers.Serializer):
@@ -13,76 +17,204 @@ class TelemetryLiteSerializer(serializers.Serializer):
     # Flat fields from websocket
     tag_id = serializers.CharField(max_length=32)
     timestamp = serializers.DateTimeField()
-    firefighter_id = serializers.CharField(max_length=32)
+    firefighter_id = serializers.CharField(max_length=32, allow_null=True)
+    incident_id = serializers.IntegerField(required=False, allow_null=True, default=None)
     
     # Position
     pos_x = serializers.FloatField()
     pos_y = serializers.FloatField()
     pos_z = serializers.FloatField()
     floor = serializers.IntegerField()
+    cell = serializers.IntegerField(required=False, allow_null=True, default=None)
+    confidence = serializers.FloatField(required=False, default=1.0)
+    accuracy_m = serializers.FloatField(required=False, default=0.0)
+    floor_confidence_percent = serializers.IntegerField(required=False, allow_null=True, default=None)
+    source = serializers.CharField(max_length=64, required=False, default='websocket')
+    beacons_used = serializers.IntegerField(required=False, default=0)
+    trilateration = serializers.DictField(required=False, allow_null=True, default=None)
     
     # Vitals
     heart_rate = serializers.IntegerField()
+    heart_rate_variability = serializers.FloatField(required=False, default=0.0)
+    skin_temperature = serializers.FloatField(required=False, default=0.0)
+    stress_level = serializers.CharField(max_length=32, required=False, default='unknown')
     motion_state = serializers.CharField(max_length=32)
     
     # SCBA
     scba_pressure = serializers.FloatField()
+    scba = serializers.DictField(required=False, allow_null=True, default=None)
     
-    # Device
-    battery_level = serializers.IntegerField()
+    # Device (None, gdy źródło go nie podaje - np. import czarnej skrzynki)
+    battery_level = serializers.IntegerField(allow_null=True)
     
     # Environment
-    temperature = serializers.FloatField()
+    temperature = serializers.FloatField(allow_null=True)
+    barometer = serializers.DictField(required=False, allow_null=True, default=None)
     
+    # UWB (opcjonalnie, patrz INGEST_STORE_UWB_MEASUREMENTS)
+    uwb_measurements = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+
     # Optional fields
     sequence = serializers.IntegerField(required=False, default=0)
     heading_deg = serializers.FloatField(required=False, default=0.0)
 
     def create(self, validated_data):
-        # 1. Get firefighter
-        firefighter = Firefighter.objects.filter(pk=validated_data['firefighter_id']).first()
-        
-        # 2. Create Position (simplified - without nested trilateration, drift, gps)
-        position = Position.objects.create(
-            x=validated_data['pos_x'],
-            y=validated_data['pos_y'],
-            z=validated_data['pos_z'],
-            floor=validated_data['floor'],
-            confidence=1.0,
-            source='websocket',
-            beacons_used=0,
-            accuracy_m=0.0,
+        return self.create_many([validated_data])[0]
+
+    @classmethod
+    def create_many(cls, items):
+        """
+        Zapis paczki zwalidowanych ramek: jeden INSERT (albo COPY) na tabelę
+        zamiast kilku na każdą ramkę. Zwraca rekordy Telemetry w kolejności `items`.
+        """
+        firefighters = set(
+            Firefighter.objects.filter(pk__in={v['firefighter_id'] for v in items}).values_list('pk', flat=True)
         )
-        
-        # 3. Create Vitals (simplified)
-        vitals = Vitals.objects.create(
-            heart_rate_bpm=validated_data['heart_rate'],
-            heart_rate_variability_ms=0,
+
+        # 1. Trilateracja (dwa RawPosition na rekord)
+        with_tri = [i for i, v in enumerate(items) if v.get('trilateration')]
+        raw = bulk_insert(RawPosition, [
+            RawPosition(**items[i]['trilateration'][key]) for i in with_tri for key in ('raw_position', 'filtered_position')
+        ])
+        trilaterations = dict(zip(with_tri, bulk_insert(Trilateration, [
+            cls.build_trilateration(items[i]['trilateration'], raw[2 * k], raw[2 * k + 1]) for k, i in enumerate(with_tri)
+        ])))
+
+        # 2. Podrekordy 1:1 (simplified - without nested drift, gps)
+        positions = bulk_insert(Position, [cls.build_position(v, trilaterations.get(i)) for i, v in enumerate(items)])
+        vitals = bulk_insert(Vitals, [cls.build_vitals(v) for v in items])
+        alarms = bulk_insert(ScbaAlarms, [cls.build_scba_alarms(v) for v in items])
+        scba = bulk_insert(SCBA, [cls.build_scba(v, a) for v, a in zip(items, alarms)])
+        with_baro = [i for i, v in enumerate(items) if v.get('barometer')]
+        barometers = dict(zip(with_baro, bulk_insert(Barometer, [Barometer(**items[i]['barometer']) for i in with_baro])))
+
+        # 3. Telemetry
+        telemetry = bulk_insert(Telemetry, [
+            Telemetry(
+                type='tag_telemetry',
+                timestamp=v['timestamp'],
+                sequence=v.get('sequence', 0),
+                tag_id=v['tag_id'],
+                firefighter_id=v['firefighter_id'] if v['firefighter_id'] in firefighters else None,
+                incident_id=v.get('incident_id'),
+                position=positions[i],
+                heading_deg=v.get('heading_deg', 0.0),
+                floor=v['floor'],
+                cell=v.get('cell'),
+                vitals=vitals[i],
+                scba=scba[i],
+                barometer=barometers.get(i),
+            )
+            for i, v in enumerate(items)
+        ])
+
+        # 4. UWB measurements (razem z tabelą pośrednią M2M)
+        owners, measurements = [], []
+        for record, v in zip(telemetry, items):
+            for m in v.get('uwb_measurements') or []:
+                owners.append(record.pk)
+                measurements.append(cls.build_uwb_measurement(m))
+        bulk_insert(UWBMeasurement, measurements)
+        through = Telemetry.uwb_measurements.through
+        bulk_insert(through, [
+            through(telemetry_id=owner, uwbmeasurement_id=obj.pk) for owner, obj in zip(owners, measurements)
+        ])
+        return telemetry
+
+    @staticmethod
+    def build_position(v, trilateration):
+        return Position(
+            x=v['pos_x'],
+            y=v['pos_y'],
+            z=v['pos_z'],
+            floor=v['floor'],
+            confidence=v.get('confidence', 1.0),
+            source=v.get('source', 'websocket'),
+            beacons_used=v.get('beacons_used', 0),
+            accuracy_m=v.get('accuracy_m', 0.0),
+            floor_confidence_percent=v.get('floor_confidence_percent'),
+            trilateration=trilateration,
+        )
+
+    @staticmethod
+    def build_vitals(v):
+        return Vitals(
+            heart_rate_bpm=v['heart_rate'],
+            heart_rate_variability_ms=round(v.get('heart_rate_variability', 0)),
             heart_rate_confidence=100,
             hr_zone='unknown',
             hr_band_id='',
             hr_band_battery=0,
-            skin_temperature_c=0.0,
-            motion_state=validated_data['motion_state'],
+            skin_temperature_c=v.get('skin_temperature', 0.0),
+            motion_state=v['motion_state'],
             step_count=0,
             calories_burned=0,
-            stress_level='unknown',
+            stress_level=v.get('stress_level', 'unknown'),
             stationary_duration_s=0,
         )
-        
-        # 4. Create Telemetry record
-        telemetry = Telemetry.objects.create(
-            type='tag_telemetry',
-            timestamp=validated_data['timestamp'],
-            sequence=validated_data.get('sequence', 0),
-            tag_id=validated_data['tag_id'],
-            firefighter=firefighter,
-            position=position,
-            heading_deg=validated_data.get('heading_deg', 0.0),
-            vitals=vitals,
+
+    @staticmethod
+    def build_uwb_measurement(m):
+        return UWBMeasurement(
+            beacon_id=m.get('beacon_id', ''),
+            beacon_name=m.get('beacon_name', ''),
+            range_m=m.get('range_m', 0.0),
+            rssi_dbm=m.get('rssi_dbm', 0),
+            fp_power_dbm=m.get('fp_power_dbm', 0),
+            rx_power_dbm=m.get('rx_power_dbm', 0),
+            los=m.get('los', False),
+            nlos_probability=m.get('nlos_probability', 0.0),
+            timestamp=m.get('timestamp', 0),
+            quality=m.get('quality', ''),
+        )
+
+    @staticmethod
+    def build_scba_alarms(v):
+        data = v.get('scba') or {}
+        return ScbaAlarms(
+            low_pressure=data.get('low_pressure', False),
+            very_low_pressure=data.get('very_low_pressure', False),
+            motion=data.get('motion', False),
+        )
+
+    @staticmethod
+    def build_scba(v, alarms):
+        data = v.get('scba') or {}
+        pressure = v['scba_pressure']
+        scba_id = data.get('id') or v['tag_id']
+        # SCBA ma klucz główny, a każda ramka ma własny rekord - doklejamy znacznik czasu [µs].
+        # Znacznika nie wolno obcinać (kolizje), więc za długie id aparatu zastępujemy skrótem.
+        stamp = round(v['timestamp'].timestamp() * 1e6)
+        snapshot_id = f"{scba_id}@{stamp}"
+        if len(snapshot_id) > SCBA._meta.pk.max_length:
+            snapshot_id = f"{hashlib.blake2b(scba_id.encode(), digest_size=7).hexdigest()}@{stamp}"
+        return SCBA(
+            id=snapshot_id,
+            manufacturer=data.get('manufacturer', ''),
+            model=data.get('model', ''),
+            cylinder_pressure_bar=round(pressure),
+            max_pressure_bar=data.get('max_pressure_bar', 300),
+            consumption_rate_lpm=data.get('consumption_rate_lpm', 0),
+            remaining_time_min=data.get('remaining_time_min'),
+            alarms=alarms,
+            battery_percent=data.get('battery_percent', 0),
+            connection_status=data.get('connection_status', 'unknown'),
+        )
+
+    @staticmethod
+    def build_trilateration(data, raw_position, filtered_position):
+        return Trilateration(
+            raw_position=raw_position,
+            filtered_position=filtered_position,
+            residual_error_m=data.get('residual_error_m', 0.0),
+            gdop=data.get('gdop', 0.0),
+            hdop=data.get('hdop', 0.0),
+            vdop=data.get('vdop', 0.0),
+            beacons_used=data.get('beacons_used', []),
+            algorithm=data.get('algorithm', ''),
+            iterations=data.get('iterations', 0),
+            convergence=data.get('convergence', False),
         )
-        
-        return telemetry
 
 
 class AlertLiteSerializer(serializers.Serializer):
@@ -95,6 +227,7 @@ class AlertLiteSerializer(serializers.Serializer):
     timestamp = serializers.DateTimeField()
     firefighter_id = serializers.CharField(max_length=32, required=False, allow_null=True)
     tag_id = serializers.CharField(max_length=32, required=False, default='')
+    incident_id = serializers.IntegerField(required=False, allow_null=True, default=None)
     
     # Position (optional)
     pos_x = serializers.FloatField(required=False, allow_null=True)
@@ -145,6 +278,7 @@ class AlertLiteSerializer(serializers.Serializer):
             severity=validated_data['severity'],
             tag_id=validated_data.get('tag_id', ''),
             firefighter=firefighter,
+            incident_id=validated_data.get('incident_id'),
             position=position,
             details=details_obj,
             resolved=validated_data.get('resolved', False),
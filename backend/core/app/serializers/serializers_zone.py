@@ -0,0 +1,17 @@
+from rest_framework import serializers
+from app.models.models_zone import Zone
+
+
+class ZoneSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Zone
+        fields = "__all__"
+
+    def validate_polygon(self, value):
+        if not isinstance(value, list) or len(value) < 3:
+            raise serializers.ValidationError("Wielokąt musi mieć co najmniej 3 wierzchołki [[x, y], ...]")
+        for point in value:
+            if (not isinstance(point, (list, tuple)) or len(point) != 2
+                    or not all(isinstance(c, (int, float)) for c in point)):
+                raise serializers.ValidationError("Każdy wierzchołek musi mieć postać [x, y]")
+        return value
@@ -1,3 +1,1274 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+import gzip
+import msgpack
+import numpy as np
+import orjson
+import zlib
+import zstandard
+from asgiref.sync import async_to_sync, sync_to_async
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
-# Create your tests here.
+from app import history_cache, timing
+from app.archive import columnar
+from app.archive.blackbox import BlackBoxError, BlackBoxReader, BlackBoxWriter, write_queryset
+from app.filters.trilateration import DOP_LIMIT, TrilaterationEngine
+from app.management.commands._synthetic import make_telemetry
+from app.middleware import accepted_encodings
+from app.management.commands.prune_telemetry import delete_telemetry
+from app.models.model_firefighter import Firefighter
+from app.models.models_alarm import Alert
+from app.models.models_archive import ArchiveSegment
+from app.models.models_beacon import Beacon
+from app.models.models_checkpoint import IngestCheckpoint
+from app.models.models_incident import Incident
+from app.models.models_occupancy import OccupancySnapshot
+from app.models.models_telemetry import (
+    SCBA, Position, RawPosition, ScbaAlarms, Telemetry, Trilateration, UWBMeasurement, Vitals,
+)
+from app.models.models_zone import Zone
+from app.resample import resample, resample_telemetry
+from app.serializers.serializers_telemetry_lite import TelemetryLiteSerializer
+from app.timing import RequestTiming, phase
+from app.views_async import limited
+from app.pipeline.pipeline import Frame, IngestPipeline, Stage, build_pipeline
+from app.pipeline.stage_beacons import BeaconStatsStage
+from app.pipeline.stage_checkpoint import CheckpointStage
+from app.pipeline.stage_deadband import DeadbandStage
+from app.pipeline.stage_floor import FloorStage
+from app.pipeline.stage_incident import IncidentStage
+from app.pipeline.stage_occupancy import OccupancyStage
+from app.pipeline.workers import TELEMETRY, WorkerPool
+from app.pipeline.stage_rules import AlertRulesStage
+from app.pipeline.stage_spatial import SpatialIndexStage
+from app.pipeline.stage_trilateration import TrilaterationStage
+from app.pipeline.stage_ukf import UKFStage
+from app.pipeline.stage_vitals import VitalsAnomalyDetector, VitalsAnomalyStage
+from app.pipeline.stage_zones import ZoneIndex, ZoneStage, point_in_polygon
+
+
+class BlackBoxRoundTripTests(TestCase):
+    """Zapis z bazy -> plik .bbx -> odczyt przez mmap (i import z powrotem)."""
+
+    FRAMES = 700
+    CHUNK = 128
+
+    @classmethod
+    def setUpTestData(cls):
+        frames = [Frame.from_message(make_telemetry(0, 1000 + t * 0.5, seed=t)) for t in range(cls.FRAMES)]
+        frames[10].payload['floor'] = -2
+        frames[11].payload['motion_state'] = 'stationary'
+        IngestPipeline().run(frames)
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.bbx')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def export(self):
+        with open(self.path, 'wb') as f:
+            return write_queryset(f, Telemetry.objects.all(), 'TAG-0000', 'FF-0000', chunk_size=self.CHUNK)
+
+    def expected(self):
+        rows = Telemetry.objects.filter(tag_id='TAG-0000').order_by('timestamp').values_list(
+            'timestamp', 'position__x', 'position__y', 'position__z', 'position__floor', 'heading_deg',
+            'vitals__heart_rate_bpm', 'vitals__skin_temperature_c', 'scba__cylinder_pressure_bar',
+            'vitals__motion_state')
+        return list(zip(*rows))
+
+    def test_round_trip_within_quantization(self):
+        self.assertEqual(self.export(), self.FRAMES)
+        ts, x, y, z, floor, heading, hr, skin, scba, motion = self.expected()
+
+        with BlackBoxReader(self.path) as reader:
+            self.assertEqual(len(reader), self.FRAMES)
+            self.assertEqual(len(reader.index), -(-self.FRAMES // self.CHUNK))
+            self.assertEqual(reader.tag_id, 'TAG-0000')
+            self.assertEqual(reader.firefighter_id, 'FF-0000')
+            columns = reader.read()
+
+        np.testing.assert_array_equal(columns['timestamp_ms'], [round(t.timestamp() * 1000) for t in ts])
+        np.testing.assert_allclose(columns['x'], x, atol=5e-4)
+        np.testing.assert_allclose(columns['y'], y, atol=5e-4)
+        np.testing.assert_allclose(columns['z'], z, atol=5e-4)
+        np.testing.assert_allclose(columns['heading_deg'], heading, atol=0.05)
+        np.testing.assert_allclose(columns['skin_temperature'], skin, atol=5e-3)
+        np.testing.assert_array_equal(columns['floor'], floor)
+        np.testing.assert_array_equal(columns['heart_rate'], hr)
+        np.testing.assert_array_equal(columns['scba_pressure'], scba)
+        self.assertEqual(list(columns['motion_state']), list(motion))
+        self.assertEqual(columns['floor'][10], -2)
+
+    def test_range_read_uses_index(self):
+        self.export()
+        with BlackBoxReader(self.path) as reader:
+            full = reader.read()
+            lo, hi = full['timestamp_ms'][200], full['timestamp_ms'][260]
+            window = reader.read(lo, hi)
+            np.testing.assert_array_equal(window['timestamp_ms'], full['timestamp_ms'][200:261])
+            np.testing.assert_array_equal(window['x'], full['x'][200:261])
+            self.assertEqual(len(reader.read(0, lo - 10 ** 6)['timestamp_ms']), 0)
+
+            records = list(reader.records(lo, hi))
+            self.assertEqual(len(records), 61)
+            self.assertEqual(records[0]['x'], window['x'][0])
+            self.assertEqual(records[0]['tag_id'], 'TAG-0000')
+
+    def test_import_round_trip(self):
+        self.export()
+        with BlackBoxReader(self.path) as reader:
+            before = reader.read()
+
+        delete_telemetry(list(Telemetry.objects.values_list('id', flat=True)))
+        call_command('import_blackbox', self.path, stdout=io.StringIO())
+        self.assertEqual(Telemetry.objects.count(), self.FRAMES)
+        # Ponowny import nie dubluje ramek
+        call_command('import_blackbox', self.path, stdout=io.StringIO())
+        self.assertEqual(Telemetry.objects.count(), self.FRAMES)
+
+        self.export()
+        with BlackBoxReader(self.path) as reader:
+            after = reader.read()
+        for name, values in before.items():
+            if values.dtype == object:
+                self.assertEqual(list(after[name]), list(values))
+            else:
+                np.testing.assert_allclose(after[name], values, atol=1e-9, err_msg=name)
+
+    def test_missing_values_round_trip(self):
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        rows = []
+        for k in range(20):
+            row = [start + timedelta(seconds=k), 1.5 * k, 2.0, 0.0, 0, 90.0, 0.5, 80 + k, 40, 33.0, 250, 'walking', 'low']
+            rows.append(row)
+        rows[0][1] = None           # brak na początku kolumny różnicowej
+        rows[5][7] = None
+        rows[6][7] = float('nan')
+        rows[7][11] = None
+        with open(self.path, 'wb') as f:
+            with BlackBoxWriter(f, 'TAG-0001', chunk_size=8) as writer:
+                writer.extend(rows)
+
+        with BlackBoxReader(self.path) as reader:
+            self.assertIsNone(reader.firefighter_id)
+            columns = reader.read()
+            records = list(reader.records())
+        self.assertTrue(np.isnan(columns['x'][0]))
+        np.testing.assert_allclose(columns['x'][1:], [1.5 * k for k in range(1, 20)])
+        np.testing.assert_array_equal(np.isnan(columns['heart_rate']), [k in (5, 6) for k in range(20)])
+        self.assertEqual(columns['heart_rate'][4], 84)
+        self.assertIsNone(records[0]['x'])
+        self.assertIsNone(records[5]['heart_rate'])
+        self.assertIsNone(records[6]['heart_rate'])
+        self.assertIsNone(records[7]['motion_state'])
+        self.assertEqual(records[8]['motion_state'], 'walking')
+        self.assertEqual(records[4]['heart_rate'], 84)
+
+    def test_import_without_firefighter_keeps_microseconds_unique(self):
+        Telemetry.objects.all().delete()
+        frames = [Frame.from_message(make_telemetry(1, 2000 + t * 0.1234567, seed=t)) for t in range(50)]
+        IngestPipeline().run(frames)
+        with open(self.path, 'wb') as f:
+            write_queryset(f, Telemetry.objects.all(), 'TAG-0001', 'FF-0001', chunk_size=16)
+        # W bazie są znaczniki z µs, w pliku z ms - to wciąż te same ramki
+        out = io.StringIO()
+        call_command('import_blackbox', self.path, stdout=out)
+        self.assertIn('Zaimportowano 0/50', out.getvalue())
+
+        with open(self.path, 'wb') as f:
+            write_queryset(f, Telemetry.objects.all(), 'TAG-0001', chunk_size=16)
+        delete_telemetry(list(Telemetry.objects.values_list('id', flat=True)))
+        out = io.StringIO()
+        call_command('import_blackbox', self.path, stdout=out)
+        self.assertIn('Zaimportowano 50/50', out.getvalue())
+        call_command('import_blackbox', self.path, stdout=io.StringIO())
+        self.assertEqual(Telemetry.objects.count(), 50)
+        self.assertFalse(Telemetry.objects.exclude(firefighter=None).exists())
+
+    def test_empty_stream(self):
+        with open(self.path, 'wb') as f:
+            BlackBoxWriter(f, 'TAG-9999').close()
+        with BlackBoxReader(self.path) as reader:
+            self.assertEqual(len(reader), 0)
+            self.assertEqual(len(reader.read()['timestamp_ms']), 0)
+            self.assertEqual(list(reader.records()), [])
+
+    def test_rejects_foreign_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"timestamp": "2024-01-01T00:00:00Z"}\n' * 10)
+        with self.assertRaises(BlackBoxError):
+            BlackBoxReader(self.path)
+
+
+class ArchivedHistoryTests(TestCase):
+    """/api/telemetry/ z ramkami z archiwum i z bazy w jednej odpowiedzi."""
+
+    def setUp(self):
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        override = override_settings(ARCHIVE_DIR=archive_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        Firefighter.objects.create(id='FF-0000', tag_id='TAG-0000', name='Strażak 0', role='Rota', team='A')
+        old = time.time() - 10 * 86400
+        IngestPipeline().run([Frame.from_message(make_telemetry(0, old + t, seed=t)) for t in range(20)])
+        call_command('archive_telemetry', stdout=io.StringIO())
+        now = time.time() - 30
+        IngestPipeline().run([Frame.from_message(make_telemetry(0, now + t, seed=t)) for t in range(5)])
+
+    def test_archived_rows_have_live_shape(self):
+        self.assertEqual(Telemetry.objects.count(), 5)
+        records = self.client.get('/api/telemetry/', {'tag': 'TAG-0000'}).json()
+        self.assertEqual(len(records), 25)
+        archived, live = records[:20], records[20:]
+        self.assertTrue(all(record['archived'] for record in archived))
+        self.assertFalse(any(record.get('archived') for record in live))
+        self.assertEqual(set(archived[0]) - {'archived'}, set(live[0]))
+        for name in ('position', 'vitals', 'scba'):
+            self.assertEqual(set(archived[0][name]), set(live[0][name]), name)
+        # Pola, z których korzysta strona historii
+        for record in records:
+            self.assertEqual(record['firefighter']['name'], 'Strażak 0')
+            self.assertIsInstance(record['position']['x'], float)
+            self.assertIsInstance(record['position']['floor'], int)
+            self.assertIsInstance(record['heading_deg'], float)
+            self.assertIsInstance(record['vitals']['heart_rate_bpm'], int)
+
+    async def test_async_view_matches(self):
+        records = (await self.async_client.get('/api/telemetry/', {'tag': 'TAG-0000'})).json()
+        response = await self.async_client.get('/api/async/telemetry/', {'tag': 'TAG-0000'})
+        body = b''.join([part async for part in response.streaming_content])
+        self.assertEqual(json.loads(body), records)
+
+    def test_unbounded_history_skips_archive(self):
+        with mock.patch.object(columnar, 'read', wraps=columnar.read) as read:
+            self.assertEqual(len(self.client.get('/api/telemetry/').json()), 5)
+            read.assert_not_called()
+            start = datetime.fromtimestamp(time.time() - 11 * 86400, tz=dt_timezone.utc).isoformat()
+            self.assertEqual(len(self.client.get('/api/telemetry/', {'start_time': start}).json()), 25)
+            read.assert_called_once()
+
+    def test_segment_path_is_safe(self):
+        day = date(2024, 1, 1)
+        self.assertEqual(columnar.segment_path('TAG-0000', day), os.path.join('2024-01-01', 'TAG-0000.npz'))
+        names = {columnar.segment_path(tag, day) for tag in ('../../etc/x', 'a/b', 'a_b', '..', 'TAG:1', 'TAG?1')}
+        self.assertEqual(len(names), 6)
+        for name in names:
+            self.assertEqual(os.path.dirname(name), '2024-01-01')
+            self.assertRegex(os.path.basename(name), r'^[A-Za-z0-9_-][A-Za-z0-9_.-]*\.npz$')
+
+        Telemetry.objects.all().delete()
+        old = time.time() - 10 * 86400
+        frames = [Frame.from_message(make_telemetry(0, old + t, seed=t)) for t in range(3)]
+        for frame in frames:
+            frame.payload['tag_id'] = '../TAG/1'
+        IngestPipeline().run(frames)
+        call_command('archive_telemetry', stdout=io.StringIO())
+        segment = ArchiveSegment.objects.get(tag_id='../TAG/1')
+        self.assertTrue(os.path.isfile(os.path.join(settings.ARCHIVE_DIR, segment.path)))
+        records = self.client.get('/api/telemetry/', {'tag': '../TAG/1'}).json()
+        self.assertEqual([r['tag_id'] for r in records], ['../TAG/1'] * 3)
+
+    def sync_export(self):
+        return b''.join(self.client.get('/api/telemetry/export/', {'tag': 'TAG-0000'}).streaming_content)
+
+    async def test_async_export_matches(self):
+        expected = await sync_to_async(self.sync_export)()
+        response = await self.async_client.get('/api/async/telemetry/export/', {'tag': 'TAG-0000'})
+        body = b''.join([part async for part in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), 25)
+        self.assertEqual(body, expected)
+
+
+class AsyncLimitTests(TestCase):
+    @override_settings(ASYNC_HISTORY_CONCURRENCY=1)
+    async def test_slot_released_between_chunks(self):
+        async def body():
+            yield 'a'
+            yield 'b'
+
+        slow = limited(body())
+        self.assertEqual(await anext(slow), 'a')
+        # Klient pierwszego strumienia jeszcze nie odebrał reszty - drugi strumień nie czeka na niego
+        other = limited(body())
+        self.assertEqual(await asyncio.wait_for(self.collect(other), 1), ['a', 'b'])
+        self.assertEqual(await self.collect(slow), ['b'])
+
+    @staticmethod
+    async def collect(stream):
+        return [part async for part in stream]
+
+
+class VitalsAnomalyTests(TestCase):
+    """Detektor anomalii parametrów życiowych i odtwarzanie alertów po restarcie."""
+
+    def test_detector_raises_and_clears(self):
+        detector = VitalsAnomalyDetector(window=50, warmup=10, sustain=3, capacity=1)
+        rows = np.array([0])
+
+        def step(heart_rate):
+            _, raised, cleared = detector.step(rows, np.array([[heart_rate, 45.0, 36.5, 0.0]]))
+            return bool(raised[0, 0]), bool(cleared[0, 0])
+
+        for t in range(20):
+            self.assertEqual(step(90 + t % 3), (False, False))
+        self.assertEqual([step(150) for _ in range(3)], [(False, False)] * 2 + [(True, False)])
+        self.assertTrue(detector.active[0, 0])
+        self.assertEqual(step(91), (False, True))
+        self.assertFalse(detector.active[0, 0])
+        # Baza nie nauczyła się wartości z anomalii
+        self.assertLess(detector.mean[0, 0], 95)
+
+    def run_frames(self, stage, heart_rates, start=1000):
+        pipeline = IngestPipeline([stage])
+        for t, heart_rate in enumerate(heart_rates):
+            frame = Frame.from_message(make_telemetry(0, start + t, seed=t))
+            frame.payload['heart_rate'] = heart_rate
+            pipeline.run([frame])
+
+    def restored_alert(self):
+        return Alert.objects.create(
+            id='ANOMALY-heart_rate-TAG-0000-1', type='alert', timestamp='2024-01-01T00:00:00Z',
+            alert_type='heart_rate_anomaly', severity='warning', tag_id='TAG-0000',
+        )
+
+    @override_settings(VITALS_WARMUP_SAMPLES=10, VITALS_SUSTAIN_SAMPLES=3)
+    def test_restored_alert_resolves_after_warmup(self):
+        alert = self.restored_alert()
+        stage = VitalsAnomalyStage()
+        self.run_frames(stage, [90] * 10)
+        alert.refresh_from_db()
+        self.assertFalse(alert.resolved)
+        self.run_frames(stage, [90], start=2000)
+        alert.refresh_from_db()
+        self.assertTrue(alert.resolved)
+        self.assertEqual(stage.restored, {})
+
+    @override_settings(VITALS_WARMUP_SAMPLES=10, VITALS_SUSTAIN_SAMPLES=3)
+    def test_restored_alert_is_reused(self):
+        alert = self.restored_alert()
+        stage = VitalsAnomalyStage()
+        self.run_frames(stage, [90] * 10 + [150] * 4 + [90] * 2)
+        self.assertEqual(list(Alert.objects.values_list('id', flat=True)), [alert.id])
+        alert.refresh_from_db()
+        self.assertTrue(alert.resolved)
+
+    def test_fractional_hrv_is_stored(self):
+        frame = Frame.from_message(make_telemetry(0, 1000, seed=1))
+        frame.payload['heart_rate_variability'] = 45.6
+        self.assertEqual(IngestPipeline().run([frame]), 1)
+        self.assertEqual(Telemetry.objects.get().vitals.heart_rate_variability_ms, 46)
+
+
+class HistoryCacheTests(TestCase):
+    def test_past_alert_range_sees_resolution(self):
+        now = timezone.now()
+        Alert.objects.create(
+            id='RULE-test-1', type='alert', timestamp=now - timedelta(hours=2),
+            alert_type='scba_low_pressure', severity='warning', tag_id='TAG-0000',
+        )
+        params = {'end_time': (now - timedelta(hours=1)).isoformat()}
+        self.assertFalse(self.client.get('/api/alerts/', params).json()[0]['resolved'])
+        # Jak etapy potoku: update() na starym alercie, potem bump po zapisie paczki
+        Alert.objects.filter(pk='RULE-test-1').update(resolved=True)
+        history_cache.bump({'TAG-0000': None})
+        self.assertTrue(self.client.get('/api/alerts/', params).json()[0]['resolved'])
+
+
+class NearestFirefighterTests(TestCase):
+    def frame(self, tag_index, t, x, y):
+        frame = Frame.from_message(make_telemetry(tag_index, t, seed=t))
+        frame.payload.update({'pos_x': x, 'pos_y': y, 'floor': 0})
+        return frame
+
+    def test_uses_latest_position_of_candidate(self):
+        t = time.time() - 60
+        IngestPipeline([SpatialIndexStage()]).run([
+            self.frame(0, t, 10, 10),
+            # TAG-0001 był obok 20 s temu, ale odszedł; TAG-0002 stoi 5 m dalej
+            self.frame(1, t - 20, 11, 10),
+            self.frame(1, t - 5, 60, 10),
+            self.frame(2, t - 3, 15, 10),
+        ])
+        nearest = self.client.get('/api/nearest/', {'tag_id': 'TAG-0000'}).json()['nearest']
+        self.assertEqual(nearest['tag_id'], 'TAG-0002')
+        self.assertAlmostEqual(nearest['distance_m'], 5.0)
+
+
+class FailingWrite(Stage):
+    """Etap, którego zapis zawodzi `failures` razy - symuluje błąd transakcji paczki."""
+
+    def __init__(self, failures=1):
+        self.failures = failures
+
+    def process(self, frames):
+        pass
+
+    def write(self, frames):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("zapis paczki")
+
+
+class StageRollbackTests(TestCase):
+    def sos_frame(self, t, tag_index=0):
+        data = make_telemetry(tag_index, t, seed=t)
+        data['device']['sos_button_pressed'] = True
+        return Frame.from_message(data)
+
+    def test_rules_raise_again_after_failed_batch(self):
+        pipeline = IngestPipeline([AlertRulesStage(), FailingWrite()])
+        with self.assertRaises(RuntimeError):
+            pipeline.run([self.sos_frame(1000)])
+        self.assertFalse(Alert.objects.exists())
+        pipeline.run([self.sos_frame(1001)])
+        self.assertEqual(Alert.objects.filter(alert_type='sos_pressed').count(), 1)
+
+    @override_settings(VITALS_WARMUP_SAMPLES=10, VITALS_SUSTAIN_SAMPLES=3)
+    def test_vitals_raise_again_after_failed_batch(self):
+        stage = VitalsAnomalyStage()
+        failing = FailingWrite(failures=0)
+        pipeline = IngestPipeline([stage, failing])
+        for t in range(1000, 1013):
+            frame = Frame.from_message(make_telemetry(0, t, seed=t))
+            frame.payload['heart_rate'] = 90 if t < 1010 else 150
+            if t == 1012:
+                failing.failures = 1
+                with self.assertRaises(RuntimeError):
+                    pipeline.run([frame])
+            else:
+                pipeline.run([frame])
+        self.assertFalse(Alert.objects.exists())
+        for t in range(1013, 1016):
+            frame = Frame.from_message(make_telemetry(0, t, seed=t))
+            frame.payload['heart_rate'] = 150
+            pipeline.run([frame])
+        self.assertEqual(Alert.objects.filter(alert_type='heart_rate_anomaly', resolved=False).count(), 1)
+
+    def test_alert_id_fits_long_tag(self):
+        frame = Frame.from_message(make_telemetry(0, 1.7e9, seed=1))
+        frame.payload.update({'tag_id': 'T' * 32, 'scba_pressure': 10.0})
+        IngestPipeline([AlertRulesStage()]).run([frame])
+        alerts = Alert.objects.filter(alert_type__startswith='scba_')
+        self.assertEqual(alerts.count(), 2)
+        for alert in alerts:
+            self.assertLessEqual(len(alert.id), 64)
+            self.assertEqual(alert.tag_id, 'T' * 32)
+
+
+class BeaconStatsTests(TestCase):
+    def frame(self, t, *beacon_ids):
+        frame = Frame.from_message(make_telemetry(0, t, seed=t))
+        frame.data['uwb_measurements'] = [{'beacon_id': b, 'range_m': 5.0, 'los': True} for b in beacon_ids]
+        return frame
+
+    def test_new_beacons_picked_up_after_config(self):
+        Beacon.objects.create(id='B1', x=0, y=0, z=0)
+        stage = BeaconStatsStage()
+        pipeline = IngestPipeline([stage])
+        pipeline.run([self.frame(1000, 'B1', 'B2')])
+        Beacon.objects.create(id='B2', x=10, y=0, z=0)
+        pipeline.update_beacons([])
+        pipeline.run([self.frame(1001, 'B1', 'B2')])
+        self.assertEqual(dict(Beacon.objects.values_list('id', 'range_count')), {'B1': 2, 'B2': 1})
+
+    def test_failed_batch_not_counted(self):
+        Beacon.objects.create(id='B1', x=0, y=0, z=0)
+        pipeline = IngestPipeline([FailingWrite(), BeaconStatsStage()])
+        with self.assertRaises(RuntimeError):
+            pipeline.run([self.frame(1000, 'B1')])
+        pipeline.run([self.frame(1001, 'B1')])
+        self.assertEqual(Beacon.objects.get().range_count, 1)
+
+
+class WriteBatchTests(TestCase):
+    def test_integrity_error_drops_only_bad_frame(self):
+        create_many = TelemetryLiteSerializer.create_many
+
+        def reject_tag_2(items):
+            if any(v['tag_id'] == 'TAG-0002' for v in items):
+                raise IntegrityError("duplikat")
+            return create_many(items)
+
+        frames = [Frame.from_message(make_telemetry(i, 1000, seed=i)) for i in range(5)]
+        with mock.patch.object(TelemetryLiteSerializer, 'create_many', side_effect=reject_tag_2):
+            self.assertEqual(IngestPipeline().run(frames), 4)
+        self.assertEqual(
+            sorted(Telemetry.objects.values_list('tag_id', flat=True)),
+            ['TAG-0000', 'TAG-0001', 'TAG-0003', 'TAG-0004'],
+        )
+        self.assertEqual([f.valid for f in frames], [True, True, False, True, True])
+
+    def test_duplicate_alert_keeps_batch(self):
+        Alert.objects.create(
+            id='RULE-sos_pressed-TAG-0000-1000000', type='alert', timestamp='2024-01-01T00:00:00Z',
+            alert_type='sos_pressed', severity='critical', tag_id='TAG-0000', resolved=True,
+        )
+        frames = [Frame.from_message(make_telemetry(i, 1000, seed=i)) for i in range(2)]
+        for frame in frames:
+            frame.data['device']['sos_button_pressed'] = True
+        self.assertEqual(IngestPipeline([AlertRulesStage()]).run(frames), 2)
+        self.assertEqual(Alert.objects.filter(alert_type='sos_pressed').count(), 2)
+
+
+class LatestTelemetryTests(TestCase):
+    def test_long_scba_ids_do_not_collide(self):
+        frames = [Frame.from_message(make_telemetry(0, t, seed=1)) for t in (1.7e9, 1.7e9 + 0.001)]
+        for frame in frames:
+            frame.payload['scba'] = {'id': 'SCBA-' + 'X' * 20}
+        self.assertEqual(IngestPipeline().run(frames), 2)
+        self.assertEqual(len(set(Telemetry.objects.values_list('scba_id', flat=True))), 2)
+
+    def test_state_returns_latest_frame_per_tag(self):
+        pipeline = IngestPipeline([CheckpointStage()])
+        for t in range(1000, 1005):
+            pipeline.run([Frame.from_message(make_telemetry(i, t, seed=t)) for i in range(3)])
+        state = self.client.get('/api/state/').json()
+        self.assertEqual(
+            sorted((row['tag_id'], row['sequence']) for row in state),
+            [('TAG-0000', 1004), ('TAG-0001', 1004), ('TAG-0002', 1004)],
+        )
+
+    def test_state_includes_tags_without_checkpoint(self):
+        IngestPipeline().run([Frame.from_message(make_telemetry(i, t, seed=t)) for t in (1000, 1001) for i in (0, 1)])
+        IngestPipeline([CheckpointStage()]).run([Frame.from_message(make_telemetry(2, 1002, seed=1))])
+        self.assertEqual(
+            sorted((row['tag_id'], row['sequence']) for row in self.client.get('/api/state/').json()),
+            [('TAG-0000', 1001), ('TAG-0001', 1001), ('TAG-0002', 1002)],
+        )
+        self.assertEqual(len(async_to_sync(self.async_client.get)('/api/async/state/').json()), 3)
+
+
+class DeadbandTests(TestCase):
+    def frame(self, t, **changes):
+        # Ta sama ramka bazowa w kolejnych chwilach - zmienia się tylko to, co w `changes`
+        data = make_telemetry(0, 1000, seed=1)
+        data['timestamp'] = datetime.fromtimestamp(t, tz=dt_timezone.utc).isoformat()
+        frame = Frame.from_message(data)
+        frame.payload.update(changes)
+        return frame
+
+    def test_changed(self):
+        stage = DeadbandStage()
+        last = self.frame(1000)
+        previous = (last.ts, last.payload)
+        self.assertFalse(stage.changed(self.frame(1001, pos_x=last.payload['pos_x'] + 0.1), previous))
+        self.assertTrue(stage.changed(self.frame(1001, pos_x=last.payload['pos_x'] + 1.0), previous))
+        self.assertFalse(stage.changed(self.frame(1001, heart_rate=last.payload['heart_rate'] + 2), previous))
+        self.assertTrue(stage.changed(self.frame(1001, heart_rate=last.payload['heart_rate'] + 5), previous))
+        self.assertTrue(stage.changed(self.frame(1001, motion_state='stationary'), previous))
+        self.assertTrue(stage.changed(self.frame(1010), previous))
+
+    def test_changed_with_missing_values(self):
+        stage = DeadbandStage()
+        last = self.frame(1000, skin_temperature=None, pos_z=None)
+        previous = (last.ts, last.payload)
+        self.assertFalse(stage.changed(self.frame(1001, skin_temperature=None, pos_z=None), previous))
+        self.assertTrue(stage.changed(self.frame(1001, pos_z=None), previous))
+        self.assertTrue(stage.changed(self.frame(1001, skin_temperature=None, pos_z=1.0), previous))
+
+    @override_settings(INGEST_DEADBAND=True)
+    def test_history_fill_restores_skipped_frames(self):
+        pipeline = IngestPipeline([DeadbandStage()])
+        frames = [self.frame(1000 + t, pos_x=10.0, pos_y=10.0, pos_z=0.0, floor=0) for t in range(4)]
+        frames.append(self.frame(1004, pos_x=14.0, pos_y=10.0, pos_z=0.0, floor=0))
+        pipeline.run(frames)
+        self.assertEqual(Telemetry.objects.count(), 2)
+        records = self.client.get('/api/telemetry/', {'tag': 'TAG-0000', 'fill': 'linear', 'step': 1}).json()
+        self.assertEqual([record['filled'] for record in records], [False, True, True, True, False])
+        self.assertEqual([round(record['position']['x'], 3) for record in records], [10, 11, 12, 13, 14])
+        self.assertEqual(records[1]['vitals'], records[0]['vitals'])
+        self.assertEqual(async_to_sync(self.async_fill)(), records)
+
+    async def async_fill(self):
+        response = await self.async_client.get(
+            '/api/async/telemetry/', {'tag': 'TAG-0000', 'fill': 'linear', 'step': 1})
+        return json.loads(response.content)
+
+
+class ResampleTests(TestCase):
+    def point(self, t, x, floor=0):
+        return {'timestamp': f'2024-01-01T00:00:{t:02d}+00:00', 'x': x, 'y': 0.0, 'z': None, 'floor': floor}
+
+    def test_hold_and_linear(self):
+        points = [self.point(2, 4.0), self.point(0, 0.0), self.point(4, 8.0, floor=1)]
+        self.assertEqual([p['x'] for p in resample(points, 1.0, 'hold')], [0.0, 0.0, 4.0, 4.0, 8.0])
+        # Bez interpolacji między piętrami, z None w z
+        linear = resample(points, 1.0, 'linear')
+        self.assertEqual([p['x'] for p in linear], [0.0, 2.0, 4.0, 4.0, 8.0])
+        self.assertIsNone(linear[1]['z'])
+        self.assertEqual(linear[1]['timestamp'], '2024-01-01T00:00:01+00:00')
+
+    def test_limit(self):
+        with self.assertRaises(ValueError):
+            resample([self.point(0, 0.0), self.point(10, 1.0)], 1.0, max_points=5)
+        records = [
+            {'tag_id': tag, 'timestamp': p['timestamp'], 'position': p}
+            for tag in ('A', 'B') for p in (self.point(0, 0.0), self.point(3, 1.0))
+        ]
+        with self.assertRaises(ValueError):
+            resample_telemetry(records, 1.0, max_points=7)
+        self.assertEqual(len(resample_telemetry(records, 1.0, max_points=8)), 8)
+
+
+class WorkerPoolTests(TestCase):
+    def test_salvage_keeps_order(self):
+        queue = multiprocessing.get_context('spawn').Queue()
+        for k in range(3):
+            queue.put((TELEMETRY, f'ramka {k}'))
+        messages, lost = WorkerPool.salvage(queue)
+        self.assertEqual(messages, [(TELEMETRY, f'ramka {k}') for k in range(3)])
+        self.assertEqual(lost, 0)
+
+
+class CheckpointTests(TestCase):
+    def frames(self, *times):
+        return [Frame.from_message(make_telemetry(0, t, seed=t)) for t in times]
+
+    def checkpoint(self):
+        checkpoint = IngestCheckpoint.objects.get(tag_id='TAG-0000')
+        return checkpoint.timestamp.timestamp(), checkpoint.sequence
+
+    def test_skips_resent_frames_and_upserts(self):
+        stage = CheckpointStage()
+        pipeline = IngestPipeline([stage])
+        self.assertEqual(pipeline.run(self.frames(1000, 1001)), 2)
+        self.assertEqual(self.checkpoint(), (1001, 1001))
+        # Po reconnect symulator wysyła ponownie ostatnie ramki
+        self.assertEqual(pipeline.run(self.frames(1000, 1001, 1002)), 1)
+        self.assertEqual(stage.skipped, 2)
+        self.assertEqual(self.checkpoint(), (1002, 1002))
+        self.assertEqual(IngestCheckpoint.objects.count(), 1)
+        # Po restarcie punkty kontrolne są wczytywane z bazy
+        self.assertEqual(IngestPipeline([CheckpointStage()]).run(self.frames(1001, 1002, 1003)), 1)
+        self.assertEqual(Telemetry.objects.count(), 4)
+
+    def test_reload_after_rollback(self):
+        stage = CheckpointStage()
+        IngestPipeline([stage]).run(self.frames(1000))
+        pipeline = IngestPipeline([stage, FailingWrite()])
+        with self.assertRaises(RuntimeError):
+            pipeline.run(self.frames(1001, 1002))
+        self.assertEqual(self.checkpoint(), (1000, 1000))
+        # Ramki z nieudanej paczki nie są duplikatami - listener może je wysłać ponownie
+        self.assertEqual(pipeline.run(self.frames(1001, 1002)), 2)
+        self.assertEqual(self.checkpoint(), (1002, 1002))
+
+
+class OccupancyTests(TestCase):
+    def test_close_writes_current_interval(self):
+        pipeline = IngestPipeline([OccupancyStage()])
+        for t in range(1200, 1210):
+            frame = Frame.from_message(make_telemetry(0, t, seed=t))
+            frame.payload.update({'pos_x': 10.5, 'pos_y': 5.5, 'floor': 0})
+            pipeline.run([frame])
+        self.assertFalse(OccupancySnapshot.objects.exists())
+        pipeline.close()
+        heatmap = self.client.get('/api/heatmap/', {'floor': 0}).json()
+        self.assertEqual(heatmap['snapshots'], 1)
+        self.assertEqual(heatmap['total_dwell_s'], 9.0)
+        self.assertEqual(heatmap['grid'][5][10], 9.0)
+
+    def test_heatmap_skips_other_geometry(self):
+        start = timezone.now()
+        for rows, cols in ((2, 3), (2, 3), (4, 4)):
+            OccupancySnapshot.objects.create(
+                floor=0, start=start, end=start, origin_x=0, origin_y=0, cell_size_m=1.0,
+                rows=rows, cols=cols, data=OccupancySnapshot.encode(np.ones((rows, cols))),
+            )
+        heatmap = self.client.get('/api/heatmap/', {'floor': 0}).json()
+        self.assertEqual(heatmap['snapshots'], 2)
+        self.assertEqual(heatmap['total_dwell_s'], 12.0)
+
+
+class IncidentStageTests(TestCase):
+    def test_pipeline_close_keeps_incident(self):
+        pipeline = build_pipeline()
+        pipeline.close()
+        self.assertFalse(Incident.objects.exists())
+
+        pipeline.run([Frame.from_message(make_telemetry(i, 1200, seed=i)) for i in range(3)])
+        incident = Incident.current()
+        pipeline.close()
+        incident.refresh_from_db()
+        self.assertIsNone(incident.ended_at)
+        self.assertEqual(Incident.current().pk, incident.pk)
+
+
+    def run_stage(self, stage, t, tags=(0,)):
+        IngestPipeline([stage]).run([Frame.from_message(make_telemetry(i, t, seed=i)) for i in tags])
+
+    def test_opens_incident_on_first_frame(self):
+        self.run_stage(IncidentStage(), 1000, tags=(0, 1))
+        incident = Incident.current()
+        self.assertEqual(incident.started_at.timestamp(), 1000)
+        self.assertEqual(incident.frame_count, 2)
+        self.assertEqual(sorted(incident.participants), ['TAG-0000', 'TAG-0001'])
+        self.assertEqual(set(Telemetry.objects.values_list('incident_id', flat=True)), {incident.pk})
+
+    @override_settings(INCIDENT_IDLE_CLOSE_S=60)
+    def test_idle_close_opens_new_incident(self):
+        stage = IncidentStage()
+        self.run_stage(stage, 1000)
+        self.run_stage(stage, 1030)
+        self.run_stage(stage, 1100)
+        first, second = Incident.objects.order_by('started_at')
+        self.assertEqual(first.ended_at.timestamp(), 1030)
+        self.assertIsNone(second.ended_at)
+        self.assertEqual(second.started_at.timestamp(), 1100)
+
+    @override_settings(INCIDENT_IDLE_CLOSE_S=60, INCIDENT_RELOAD_S=1000)
+    def test_quiet_worker_keeps_shared_incident(self):
+        quiet, busy = IncidentStage(), IncidentStage()
+        self.run_stage(quiet, 1000, tags=(0,))
+        for t in range(1000, 1100, 20):
+            self.run_stage(busy, t, tags=(1,))
+        self.run_stage(quiet, 1100, tags=(0,))
+        incident = Incident.objects.get()
+        self.assertIsNone(incident.ended_at)
+        self.assertEqual(incident.frame_count, 7)
+        self.assertEqual(incident.last_activity_at.timestamp(), 1100)
+
+    def test_summary_merges_across_workers(self):
+        stages = IncidentStage(), IncidentStage()
+        for t in range(1000, 1004):
+            self.run_stage(stages[t % 2], t, tags=(t % 2, 2))
+        incident = Incident.objects.get()
+        self.assertEqual(incident.frame_count, 8)
+        self.assertEqual(sorted(incident.participants), ['TAG-0000', 'TAG-0001', 'TAG-0002'])
+        self.assertEqual(incident.last_activity_at.timestamp(), 1003)
+        heart_rates = [f.payload['heart_rate'] for f in (
+            Frame.from_message(make_telemetry(i, t, seed=i)) for t in range(1000, 1004) for i in (t % 2, 2)
+        )]
+        self.assertEqual(incident.max_heart_rate, max(heart_rates))
+
+class BulkInsertTests(TestCase):
+    """TelemetryLiteSerializer.create_many: zapis paczki z podrekordami i pomiarami UWB."""
+
+    def validated(self, n=4):
+        items = []
+        for i in range(n):
+            payload = Frame.from_message(make_telemetry(i, 1000 + i, seed=i, uwb=True)).payload
+            if i % 2 == 0:
+                position = {'x': payload['pos_x'], 'y': payload['pos_y'], 'z': payload['pos_z']}
+                payload['trilateration'] = {'raw_position': position, 'filtered_position': dict(position, x=i)}
+            if i == 1:
+                payload['barometer'] = {
+                    'pressure_pa': 101000, 'altitude_rel_m': 3.2, 'temperature_c': 20.0, 'trend': 'stable',
+                    'reference_pressure_pa': 101325, 'estimated_floor': 1, 'floor_confidence_percent': 90,
+                    'vertical_speed_mps': 0.0,
+                }
+            serializer = TelemetryLiteSerializer(data=payload)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            items.append(serializer.validated_data)
+        return items
+
+    def check_round_trip(self):
+        items = self.validated()
+        records = TelemetryLiteSerializer.create_many(items)
+        self.assertEqual(len({record.pk for record in records}), len(items))
+        for record, item in zip(records, items):
+            stored = Telemetry.objects.select_related(
+                'position__trilateration__filtered_position', 'vitals', 'scba', 'barometer',
+            ).get(pk=record.pk)
+            self.assertEqual(stored.tag_id, item['tag_id'])
+            self.assertAlmostEqual(stored.position.x, item['pos_x'])
+            self.assertEqual(stored.vitals.heart_rate_bpm, item['heart_rate'])
+            self.assertEqual(stored.scba.cylinder_pressure_bar, round(item['scba_pressure']))
+            trilateration = stored.position.trilateration
+            if item['trilateration']:
+                self.assertEqual(trilateration.filtered_position.x, item['trilateration']['filtered_position']['x'])
+            else:
+                self.assertIsNone(trilateration)
+            self.assertEqual(stored.barometer is not None, bool(item['barometer']))
+            self.assertTrue(item['uwb_measurements'])
+            self.assertEqual(
+                sorted(stored.uwb_measurements.values_list('beacon_id', flat=True)),
+                sorted(m['beacon_id'] for m in item['uwb_measurements']),
+            )
+
+    def test_create_many(self):
+        self.check_round_trip()
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "COPY wymaga PostgreSQL")
+    @override_settings(DB_BULK_COPY=True)
+    def test_create_many_copy(self):
+        self.check_round_trip()
+
+
+class UKFTests(TestCase):
+    def frame(self, t, x, y=10.0, tag_index=0):
+        frame = Frame.from_message(make_telemetry(tag_index, t, seed=t))
+        frame.payload.update({'pos_x': x, 'pos_y': y, 'pos_z': 0.0, 'floor': 0})
+        return frame
+
+    def test_smooths_noisy_position(self):
+        stage = UKFStage()
+        rng = np.random.default_rng(1)
+        measured = 20.0 + rng.normal(0, 0.5, 30)
+        frames = [self.frame(1000 + t, x) for t, x in enumerate(measured)]
+        for frame in frames:
+            stage.process([frame])
+        filtered = np.array([f.payload['pos_x'] for f in frames[10:]])
+        self.assertLess(np.abs(filtered - 20.0).mean(), np.abs(measured[10:] - 20.0).mean())
+        self.assertTrue(all(0 < f.payload['confidence'] <= 1 for f in frames))
+
+    def test_rollback_restarts_touched_tags(self):
+        stage = UKFStage()
+        for t in range(5):
+            stage.process([self.frame(1000 + t, 10.0), self.frame(1000 + t, 30.0, tag_index=1)])
+        stage.write([])
+        stage.process([self.frame(1005, 50.0)])
+        stage.rollback()
+        # Tag 0 startuje od pomiaru, tag 1 (spoza nieudanej paczki) filtruje dalej
+        restarted, filtered = self.frame(1006, 12.0), self.frame(1006, 32.0, tag_index=1)
+        stage.process([restarted, filtered])
+        self.assertEqual(restarted.payload['pos_x'], 12.0)
+        self.assertLess(filtered.payload['pos_x'], 32.0)
+
+    def test_invalid_frame_does_not_stop_ingest(self):
+        pipeline = build_pipeline()
+        pipeline.run([Frame.from_message(make_telemetry(i, 1000, seed=i)) for i in range(5)])
+        bad = Frame.from_message(make_telemetry(0, 1001, seed=1))
+        bad.payload['pos_x'] = None
+        nan = Frame.from_message(make_telemetry(1, 1001, seed=1))
+        nan.payload['pos_y'] = float('nan')
+        good = [Frame.from_message(make_telemetry(i, 1001, seed=i)) for i in range(2, 5)]
+        self.assertEqual(pipeline.run([bad, nan] + good), 3)
+        for t in range(1002, 1005):
+            self.assertEqual(pipeline.run([Frame.from_message(make_telemetry(i, t, seed=i)) for i in range(5)]), 5)
+        self.assertEqual(Telemetry.objects.count(), 5 + 3 + 15)
+        self.assertTrue(all(math.isfinite(x) for x in Telemetry.objects.values_list('position__x', flat=True)))
+
+
+class TimingTests(TestCase):
+    def metrics(self, response):
+        return {part.split(';')[0].strip(): part for part in response['Server-Timing'].split(',')}
+
+    def test_server_timing_header(self):
+        IngestPipeline().run([Frame.from_message(make_telemetry(i, 1000, seed=i)) for i in range(3)])
+        for path in ('/api/state/', '/api/async/state/'):
+            metrics = self.metrics(self.client.get(path))
+            self.assertRegex(metrics['db'], r'^db;dur=[\d.]+;desc="queries=[1-9]\d*"$')
+            self.assertIn('total', metrics)
+        metrics = self.metrics(self.client.get('/api/state/'))
+        self.assertIn('serialize', metrics)
+        self.assertIn('render', metrics)
+        self.assertFalse(self.client.get('/admin/login/').has_header('Server-Timing'))
+
+    def test_phase_excludes_sql_time(self):
+        state = RequestTiming()
+        token = timing.current.set(state)
+        try:
+            with mock.patch('app.timing.perf_counter', side_effect=[10.0, 10.5, 20.0, 20.25]):
+                with phase('serialize'):
+                    state.add_query('SELECT 1', 0.2)
+                with phase('serialize'):
+                    pass
+        finally:
+            timing.current.reset(token)
+        self.assertAlmostEqual(state.phases['serialize'], 0.3 + 0.25)
+        self.assertEqual(state.queries, 1)
+        self.assertAlmostEqual(state.record()['serialize_ms'], 550.0)
+
+    def test_phase_outside_request(self):
+        with phase('serialize'):
+            pass
+        self.assertIsNone(timing.current.get())
+
+
+class TrilaterationTests(TestCase):
+    CORNERS = ((0, 0), (10, 0), (0, 10), (10, 10))
+
+    def beacons(self, points):
+        return [{'id': f'B{i}', 'position': dict(zip('xyz', point))} for i, point in enumerate(points)]
+
+    def ranges(self, points, tag, **extra):
+        return [
+            {'beacon_id': f'B{i}', 'range_m': math.dist(tag, point), **extra} for i, point in enumerate(points)
+        ]
+
+    def solve(self, points, tag, initial=None):
+        engine = TrilaterationEngine()
+        engine.set_beacons(self.beacons(points))
+        B, r, w, ids = engine.pack([self.ranges(points, tag)])
+        return {name: values[0] for name, values in engine.solve(B, r, w, initial).items()}
+
+    def test_known_geometry(self):
+        points = [(0, 0, 0), (10, 0, 3), (0, 10, 3), (10, 10, 0)]
+        result = self.solve(points, (3, 4, 1.5))
+        self.assertTrue(result['converged'])
+        np.testing.assert_allclose(result['position'], (3, 4, 1.5), atol=1e-3)
+        self.assertLess(result['residual'], 1e-3)
+        self.assertLess(result['gdop'], 5)
+
+    def test_planar_beacons(self):
+        # Beacony w jednej płaszczyźnie: z jest niejednoznaczne (±), punkt startowy w środku ciężkości
+        # zostaje w płaszczyźnie - x, y wychodzą poprawnie, a VDOP sygnalizuje brak informacji o z
+        points = [(x, y, 2.0) for x, y in self.CORNERS]
+        result = self.solve(points, (3, 4, 1.5))
+        self.assertTrue(np.isfinite(result['position']).all())
+        np.testing.assert_allclose(result['position'][:2], (3, 4), atol=0.02)
+        self.assertAlmostEqual(result['position'][2], 2.0)
+        self.assertEqual(result['vdop'], DOP_LIMIT)
+        self.assertLess(result['hdop'], 1.5)
+
+        # Start poza płaszczyzną (np. poprzednia pozycja tagu) rozstrzyga znak z
+        result = self.solve(points, (3, 4, 1.5), initial=[(5, 5, 1.0)])
+        np.testing.assert_allclose(result['position'], (3, 4, 1.5), atol=1e-3)
+
+    def test_dop_reflects_geometry(self):
+        points = [(x, y, 0) for x, y in self.CORNERS] + [(5, 5, 3)]
+        inside = self.solve(points, (5, 5, 1))
+        outside = self.solve(points, (60, 5, 1))
+        self.assertLess(inside['hdop'], 1.5)
+        self.assertGreater(outside['hdop'], 3 * inside['hdop'])
+        self.assertGreaterEqual(inside['gdop'], inside['hdop'])
+
+    def frame(self, measurements):
+        frame = Frame.from_message(make_telemetry(0, 1000, seed=1))
+        frame.data['uwb_measurements'] = measurements
+        return frame
+
+    def test_stage(self):
+        points = [(0, 0, 0), (10, 0, 3), (0, 10, 3), (10, 10, 0)]
+        stage = TrilaterationStage()
+        stage.on_beacons(self.beacons(points))
+        measurements = self.ranges(points, (3, 4, 1.5), nlos_probability=0.1)
+        solved = self.frame(measurements + [{'beacon_id': 'UNKNOWN', 'range_m': 1.0}])
+        too_few = self.frame(measurements[:2] + [{'beacon_id': 'UNKNOWN', 'range_m': 1.0}])
+        before = dict(too_few.payload)
+        stage.process([solved, too_few])
+
+        payload = solved.payload
+        self.assertAlmostEqual(payload['pos_x'], 3, places=3)
+        self.assertAlmostEqual(payload['pos_y'], 4, places=3)
+        self.assertEqual(payload['source'], 'uwb_trilateration')
+        self.assertEqual(payload['beacons_used'], 4)
+        self.assertEqual(payload['trilateration']['beacons_used'], ['B0', 'B1', 'B2', 'B3'])
+        self.assertTrue(payload['trilateration']['convergence'])
+        self.assertEqual(too_few.payload, before)
+
+
+class FloorStageTests(TestCase):
+    REFERENCE_PA = 101325.0
+
+    def frame(self, t, z, altitude=None, accuracy=0.3):
+        frame = Frame.from_message(make_telemetry(0, t, seed=1))
+        frame.payload.update({'pos_z': z, 'floor': 0, 'accuracy_m': accuracy})
+        frame.data.pop('barometer', None)
+        if altitude is not None:
+            pressure = self.REFERENCE_PA * (1 - altitude / 44330.0) ** 5.255
+            frame.data['barometer'] = {
+                'pressure_pa': pressure, 'reference_pressure_pa': self.REFERENCE_PA, 'temperature_c': 20.0,
+            }
+        return frame
+
+    def floors(self, stage, samples, **kwargs):
+        frames = [self.frame(t, z, **kwargs) for t, z in samples]
+        for frame in frames:
+            stage.process([frame])
+        return frames
+
+    def test_barometer_moves_floor(self):
+        # Słaba pozycja UWB (z bez zmian), barometr pokazuje wejście dwa piętra wyżej
+        stage = FloorStage()
+        frames = [self.frame(t, 0.0, altitude=0.0 if t < 5 else 6.4, accuracy=5.0) for t in range(20)]
+        for frame in frames:
+            stage.process([frame])
+        self.assertEqual(frames[4].payload['floor'], 0)
+        self.assertEqual(frames[-1].payload['floor'], 2)
+        baro = frames[-1].payload['barometer']
+        self.assertEqual(baro['estimated_floor'], 2)
+        self.assertAlmostEqual(baro['altitude_rel_m'], 6.4, places=3)
+        self.assertEqual(baro['floor_confidence_percent'], frames[-1].payload['floor_confidence_percent'])
+        self.assertGreater(baro['floor_confidence_percent'], 50)
+        self.assertIn(frames[8].payload['barometer']['trend'], ('rising', 'stable'))
+
+    def test_position_only(self):
+        stage = FloorStage()
+        frames = self.floors(stage, [(t, 0.0 if t < 5 else 3.2) for t in range(20)])
+        self.assertNotIn('barometer', frames[-1].payload)
+        self.assertEqual(frames[-1].payload['floor'], 1)
+        self.assertGreater(frames[-1].payload['floor_confidence_percent'], 80)
+        self.assertTrue(all('floor_confidence_percent' in f.payload for f in frames))
+
+        IngestPipeline([FloorStage()]).run([self.frame(1000, 3.2)])
+        self.assertIsNotNone(Telemetry.objects.get().position.floor_confidence_percent)
+
+    def test_hysteresis(self):
+        stage = FloorStage()
+        height = settings.FLOOR_HEIGHT_M
+        # Wysokość tuż ponad połową kondygnacji - w marginesie histerezy, piętro bez zmian
+        frames = self.floors(stage, [(t, 0.0 if t < 3 else 0.6 * height) for t in range(30)])
+        self.assertEqual({f.payload['floor'] for f in frames}, {0})
+        self.assertLess(frames[-1].payload['floor_confidence_percent'], 100)
+
+        # Krótki skok (krócej niż FLOOR_DWELL_S) też nie zmienia piętra
+        stage = FloorStage()
+        samples = [(t * 0.5, 0.0) for t in range(10)] + [(5.0, 3 * height), (5.5, 3 * height)]
+        samples += [(6 + t * 0.5, 0.0) for t in range(10)]
+        self.assertEqual({f.payload['floor'] for f in self.floors(stage, samples)}, {0})
+
+
+class ZoneTests(TestCase):
+    SQUARE = [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+    def test_point_in_polygon(self):
+        self.assertTrue(point_in_polygon(5, 5, self.SQUARE))
+        self.assertFalse(point_in_polygon(15, 5, self.SQUARE))
+        self.assertFalse(point_in_polygon(5, -0.1, self.SQUARE))
+        # Wklęsły wielokąt (L): wcięcie jest poza strefą, choć w prostokącie otaczającym
+        shape = [[0, 0], [10, 0], [10, 4], [4, 4], [4, 10], [0, 10]]
+        self.assertTrue(point_in_polygon(2, 8, shape))
+        self.assertFalse(point_in_polygon(8, 8, shape))
+
+    def test_point_on_edge_belongs_to_one_zone(self):
+        # Cztery sąsiednie kwadraty: punkt na wspólnej krawędzi (albo w wierzchołku) należy dokładnie do jednego
+        squares = [[[x, y], [x + 10, y], [x + 10, y + 10], [x, y + 10]] for x in (0, 10) for y in (0, 10)]
+        for point in ((10, 5), (5, 10), (10, 10), (10, 15), (15, 10)):
+            self.assertEqual(sum(point_in_polygon(*point, square) for square in squares), 1, point)
+
+    def test_index_per_floor(self):
+        ground = Zone.objects.create(name='Parter', floor=0, polygon=self.SQUARE)
+        upper = Zone.objects.create(name='Piętro', floor=1, polygon=self.SQUARE)
+        triangle = Zone.objects.create(name='Klatka', floor=0, polygon=[[20, 0], [40, 0], [20, 20]])
+        index = ZoneIndex(list(Zone.objects.all()), cell_size=5.0)
+        self.assertEqual(index.containing(0, 5, 5), {ground.id})
+        self.assertEqual(index.containing(1, 5, 5), {upper.id})
+        self.assertEqual(index.containing(2, 5, 5), set())
+        self.assertEqual(index.containing(0, 22, 2), {triangle.id})
+        self.assertEqual(index.containing(0, 38, 18), set())     # w prostokącie otaczającym, poza trójkątem
+        self.assertIn(triangle, index.cells[(0, 7, 3)])
+
+    def frame(self, t, x, floor=0):
+        frame = Frame.from_message(make_telemetry(0, t, seed=1))
+        frame.payload.update({'pos_x': x, 'pos_y': 5.0, 'floor': floor})
+        return frame
+
+    def test_dwell_alert_raised_and_cleared(self):
+        zone = Zone.objects.create(name='Strop', floor=0, polygon=self.SQUARE, severity='warning', max_dwell_s=10)
+        pipeline = IngestPipeline([ZoneStage()])
+        pipeline.run([self.frame(1000, 20.0), self.frame(1000.5, 5.0, floor=1)])
+        self.assertFalse(Alert.objects.exists())
+
+        pipeline.run([self.frame(1001, 5.0)])
+        entry = Alert.objects.get()
+        self.assertEqual(entry.alert_type, 'zone_entry')
+        self.assertEqual(entry.severity, 'warning')
+        self.assertIn(f'-{zone.id}-', entry.id)
+
+        for t in range(1002, 1011):
+            pipeline.run([self.frame(t, 5.0)])
+        self.assertFalse(Alert.objects.filter(alert_type='zone_dwell').exists())
+        pipeline.run([self.frame(1011, 5.0)])
+        dwell = Alert.objects.get(alert_type='zone_dwell')
+        self.assertEqual(dwell.severity, 'critical')
+        self.assertEqual(Alert.objects.filter(resolved=False).count(), 2)
+
+        pipeline.run([self.frame(1012, 20.0)])
+        self.assertFalse(Alert.objects.filter(resolved=False).exists())
+        # Ponowne wejście to nowa wizyta - nowy alert wejścia, licznik pobytu od nowa
+        pipeline.run([self.frame(1013, 5.0)])
+        self.assertEqual(Alert.objects.filter(resolved=False).get().alert_type, 'zone_entry')
+
+
+@override_settings(RETENTION_BATCH_PAUSE_S=0)
+class PruneTelemetryTests(TestCase):
+    def ingest(self, start, count, step=1.0):
+        frames = []
+        for k in range(count):
+            frame = Frame.from_message(make_telemetry(0, start + k * step, seed=k, uwb=True))
+            position = {'x': frame.payload['pos_x'], 'y': frame.payload['pos_y'], 'z': frame.payload['pos_z']}
+            frame.payload['trilateration'] = {'raw_position': position, 'filtered_position': position}
+            frames.append(frame)
+        IngestPipeline().run(frames)
+
+    def children(self):
+        return {
+            model.__name__: model.objects.count()
+            for model in (Position, Vitals, SCBA, ScbaAlarms, Trilateration, RawPosition, UWBMeasurement)
+        }
+
+    def expected_children(self, frames):
+        return {
+            'Position': frames, 'Vitals': frames, 'SCBA': frames, 'ScbaAlarms': frames,
+            'Trilateration': frames, 'RawPosition': 2 * frames, 'UWBMeasurement': 5 * frames,
+        }
+
+    def test_prune(self):
+        now = time.time()
+        day = 86400
+        self.ingest(now - 7 * day - 3600, 4)                # starsze niż --delete-days: usunięte
+        self.ingest(now - 7 * day + 3600, 1)                # przed granicą usuwania: przerzedzone, zostaje
+        bucket = (now - 2 * day) // 10 * 10
+        self.ingest(bucket, 30)                             # 3 przedziały po 10 s: zostaje po jednej ramce
+        self.ingest(now - 3600, 5)                          # młodsze niż --raw-hours: bez zmian
+        # Ramka usunięta z pominięciem delete_telemetry zostawia osierocone podrekordy
+        self.ingest(now - 600, 1)
+        Telemetry.objects.filter(timestamp__gte=datetime.fromtimestamp(now - 601, tz=dt_timezone.utc)).delete()
+        self.assertEqual(Telemetry.objects.count(), 40)
+
+        options = {'delete_days': 7, 'raw_hours': 24, 'downsample_s': 10, 'batch_size': 7}
+        call_command('prune_telemetry', dry_run=True, stdout=io.StringIO(), **options)
+        self.assertEqual(Telemetry.objects.count(), 40)
+        self.assertEqual(self.children(), self.expected_children(41))
+
+        out = io.StringIO()
+        call_command('prune_telemetry', stdout=out, **options)
+        self.assertIn('Usunięto 4 ramek', out.getvalue())
+        self.assertIn('zachowano 4, usunięto 27', out.getvalue())
+        oldest = Telemetry.objects.order_by('timestamp').first().timestamp.timestamp()
+        self.assertAlmostEqual(oldest, now - 7 * day + 3600, places=3)
+        kept = Telemetry.objects.filter(downsampled=True).order_by('timestamp').values_list('timestamp', flat=True)
+        self.assertEqual([t.timestamp() for t in kept][1:], [bucket, bucket + 10, bucket + 20])
+        self.assertEqual(Telemetry.objects.filter(downsampled=False).count(), 5)
+        self.assertEqual(self.children(), self.expected_children(9))
+
+        # Kolejne uruchomienie nie ma już nic do zrobienia
+        out = io.StringIO()
+        call_command('prune_telemetry', stdout=out, **options)
+        self.assertIn('Usunięto 0 ramek', out.getvalue())
+        self.assertIn('zachowano 0, usunięto 0', out.getvalue())
+        self.assertEqual(Telemetry.objects.count(), 9)
+
+
+class ConditionalHistoryTests(TestCase):
+    def setUp(self):
+        IngestPipeline().run([Frame.from_message(make_telemetry(0, 1000 + t, seed=t)) for t in range(5)])
+        self.alert = Alert.objects.create(
+            id='RULE-test-etag', type='alert', alert_type='man_down', severity='critical',
+            timestamp=timezone.now(), tag_id='TAG-0000',
+        )
+
+    def etag(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_not_modified(self):
+        for path in ('/api/telemetry/', '/api/async/telemetry/', '/api/alerts/', '/api/async/alerts/'):
+            etag = self.etag(path, tag='TAG-0000')
+            response = self.client.get(path, {'tag': 'TAG-0000'}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, path)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(self.client.get(path, {'tag': 'TAG-0000'}, HTTP_IF_NONE_MATCH='W/"other"').status_code, 200)
+
+    def test_sync_and_async_etags_match(self):
+        self.assertEqual(self.etag('/api/telemetry/', tag='TAG-0000'), self.etag('/api/async/telemetry/', tag='TAG-0000'))
+        self.assertEqual(self.etag('/api/alerts/'), self.etag('/api/async/alerts/'))
+        self.assertNotEqual(
+            self.etag('/api/telemetry/', tag='TAG-0000'), self.etag('/api/telemetry/', tag='TAG-0000', format='msgpack'),
+        )
+
+    def test_etag_changes(self):
+        telemetry = self.etag('/api/telemetry/', tag='TAG-0000')
+        IngestPipeline().run([Frame.from_message(make_telemetry(0, 1005, seed=5))])
+        self.assertNotEqual(self.etag('/api/telemetry/', tag='TAG-0000'), telemetry)
+
+        alerts = self.etag('/api/alerts/')
+        Alert.objects.filter(pk=self.alert.pk).update(resolved=True)
+        self.assertNotEqual(self.etag('/api/alerts/'), alerts)
+
+        telemetry = self.etag('/api/telemetry/', tag='TAG-0000')
+        history_cache.bump_epoch()
+        self.assertNotEqual(self.etag('/api/telemetry/', tag='TAG-0000'), telemetry)
+
+
+class RenderingTests(TestCase):
+    PARAMS = {'tag': 'TAG-0000'}
+
+    def setUp(self):
+        IngestPipeline().run([Frame.from_message(make_telemetry(0, 1000 + t, seed=t)) for t in range(20)])
+
+    def get(self, path='/api/telemetry/', encoding=None, **headers):
+        if encoding is not None:
+            headers['HTTP_ACCEPT_ENCODING'] = encoding
+        return self.client.get(path, self.PARAMS, **headers)
+
+    def test_json_and_msgpack_round_trip(self):
+        plain = self.get()
+        self.assertEqual(plain['Content-Type'], 'application/json')
+        records = orjson.loads(plain.content)
+        self.assertEqual(len(records), 20)
+        self.assertEqual(records, json.loads(plain.content))
+
+        packed = self.get(HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(packed['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(packed.content), records)
+        self.assertLess(len(packed.content), len(plain.content))
+        by_format = self.client.get('/api/telemetry/', {**self.PARAMS, 'format': 'msgpack'})
+        self.assertEqual(msgpack.unpackb(by_format.content), records)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip, deflate, br, zstd'), {'gzip', 'deflate', 'br', 'zstd'})
+        self.assertEqual(accepted_encodings('zstd;q=0, GZIP;q=0.5'), {'gzip'})
+        self.assertEqual(accepted_encodings('gzip;q=0.0, identity'), {'identity'})
+        self.assertEqual(accepted_encodings('gzip;q=abc'), set())
+        self.assertEqual(accepted_encodings(''), set())
+
+    def test_encoding_selection(self):
+        body = self.get().content
+        self.assertGreater(len(body), 1024)
+        decoders = {
+            'zstd': zstandard.ZstdDecompressor().decompress,
+            'gzip': gzip.decompress,
+        }
+        for header, expected in (
+            ('gzip, zstd', 'zstd'), ('gzip', 'gzip'), ('zstd;q=0, gzip', 'gzip'),
+            ('zstd;q=0, gzip;q=0', None), ('identity', None), (None, None),
+        ):
+            response = self.get(encoding=header)
+            self.assertEqual(response.get('Content-Encoding'), expected, header)
+            self.assertIn('Accept-Encoding', response['Vary'])
+            content = decoders[expected](response.content) if expected else response.content
+            self.assertEqual(orjson.loads(content), orjson.loads(body), header)
+            self.assertEqual(int(response['Content-Length']), len(response.content))
+            self.assertTrue(response['ETag'].startswith('W/'))
+
+    def test_size_threshold(self):
+        self.PARAMS = {}
+        small = self.get('/api/beacons/', encoding='gzip')
+        self.assertLess(len(small.content), 1024)
+        self.assertFalse(small.has_header('Content-Encoding'))
+        with override_settings(RESPONSE_COMPRESSION_MIN_BYTES=10 ** 7):
+            self.assertFalse(self.get(encoding='gzip').has_header('Content-Encoding'))
+        with override_settings(RESPONSE_COMPRESSION_MIN_BYTES=0):
+            # Skompresowane "[]" byłoby dłuższe od oryginału - zostaje bez kompresji
+            self.assertFalse(self.get('/api/beacons/', encoding='gzip').has_header('Content-Encoding'))
+
+    def test_streaming_compression(self):
+        expected = b''.join(self.get('/api/telemetry/export/').streaming_content)
+        self.assertEqual(len(expected.splitlines()), 20)
+
+        response = self.get('/api/telemetry/export/', encoding='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = [decompressor.decompress(chunk) for chunk in response.streaming_content]
+        # Każdy kawałek jest wypchnięty (flush) - klient może go rozpakować od razu
+        self.assertEqual(b''.join(chunks[:-1]), expected)
+        self.assertTrue(decompressor.eof)
+
+        async def read_async():
+            response = await self.async_client.get(
+                '/api/async/telemetry/export/', self.PARAMS, headers={'Accept-Encoding': 'zstd'})
+            return response['Content-Encoding'], b''.join([chunk async for chunk in response.streaming_content])
+
+        encoding, body = async_to_sync(read_async)()
+        self.assertEqual(encoding, 'zstd')
+        self.assertEqual(zstandard.ZstdDecompressor().decompressobj().decompress(body), expected)
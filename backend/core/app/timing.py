@@ -0,0 +1,95 @@
+# app/timing.py
+"""
+Pomiary czasu pojedynczego żądania API (zbierane przez TimingMiddleware w app/middleware.py).
+
+Stan żądania trzyma ContextVar, więc pomiary działają także w wątkach
+sync_to_async (kontekst jest kopiowany) i w widokach async. Zapytania SQL
+liczy execute-wrapper dokładany do każdego nowego połączenia z bazą
+(sygnał connection_created); poza żądaniem API nic nie mierzy.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Liczniki jednego żądania. Czasy w sekundach."""
+
+    def __init__(self, keep_queries=False):
+        self.start = perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.slowest = 0.0
+        self.slowest_sql = ''
+        self.phases = {}
+        self.statements = [] if keep_queries else None
+
+    def add_query(self, sql, elapsed):
+        self.queries += 1
+        self.sql += elapsed
+        if elapsed > self.slowest:
+            self.slowest, self.slowest_sql = elapsed, sql
+        if self.statements is not None:
+            self.statements.append((sql, elapsed))
+
+    def add(self, name, elapsed):
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    @property
+    def elapsed(self):
+        return perf_counter() - self.start
+
+    def header(self):
+        """Wartość nagłówka Server-Timing (czasy w ms)."""
+        metrics = [
+            f'db;dur={self.sql * 1e3:.1f};desc="queries={self.queries}"',
+            f'db-max;dur={self.slowest * 1e3:.1f}',
+        ]
+        metrics += [f'{name};dur={elapsed * 1e3:.1f}' for name, elapsed in self.phases.items()]
+        metrics.append(f'total;dur={self.elapsed * 1e3:.1f}')
+        return ', '.join(metrics)
+
+    def record(self):
+        """Słownik do logu strukturalnego (czasy w ms)."""
+        record = {
+            'ms': round(self.elapsed * 1e3, 1),
+            'queries': self.queries,
+            'sql_ms': round(self.sql * 1e3, 1),
+            'slowest_ms': round(self.slowest * 1e3, 1),
+            'slowest_sql': self.slowest_sql[:500],
+        }
+        record.update({f'{name}_ms': round(elapsed * 1e3, 1) for name, elapsed in self.phases.items()})
+        return record
+
+
+def record_query(execute, sql, params, many, context):
+    timing = current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(sql, perf_counter() - start)
+
+
+def install(sender, connection, **kwargs):
+    """Odbiornik connection_created."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def phase(name):
+    """Mierzy fragment widoku (np. serializację) bez czasu zapytań SQL wykonanych w jego trakcie."""
+    timing = current.get()
+    if timing is None:
+        yield
+        return
+    start, sql = perf_counter(), timing.sql
+    try:
+        yield
+    finally:
+        timing.add(name, perf_counter() - start - (timing.sql - sql))
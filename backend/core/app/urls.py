@@ -1,7 +1,29 @@
 from django.urls import path
-from app.views import telemetry_list, alert_list
+from app.views import (
+    telemetry_list, alert_list, state_list, occupancy_heatmap, proximity_list, nearest_firefighter, beacon_list,
+    zone_list, incident_list, incident_detail, incident_close, track_list, telemetry_export,
+)
+from app import views_async
 
 urlpatterns = [
     path('telemetry/', telemetry_list, name='telemetry-list'),
+    path('telemetry/export/', telemetry_export, name='telemetry-export'),
+    path('track/', track_list, name='track-list'),
     path('alerts/', alert_list, name='alert-list'),
+    path('state/', state_list, name='state-list'),
+    path('heatmap/', occupancy_heatmap, name='occupancy-heatmap'),
+    path('proximity/', proximity_list, name='proximity-list'),
+    path('nearest/', nearest_firefighter, name='nearest-firefighter'),
+    path('beacons/', beacon_list, name='beacon-list'),
+    path('zones/', zone_list, name='zone-list'),
+    path('incidents/', incident_list, name='incident-list'),
+    path('incidents/<int:pk>/', incident_detail, name='incident-detail'),
+    path('incidents/<int:pk>/close/', incident_close, name='incident-close'),
+
+    # Wersje async (ASGI): te same filtry, odpowiedzi strumieniowe
+    path('async/telemetry/', views_async.telemetry_list, name='telemetry-list-async'),
+    path('async/telemetry/export/', views_async.telemetry_export, name='telemetry-export-async'),
+    path('async/track/', views_async.track_list, name='track-list-async'),
+    path('async/alerts/', views_async.alert_list, name='alert-list-async'),
+    path('async/state/', views_async.state_list, name='state-list-async'),
 ]
\ No newline at end of file
@@ -2,46 +2,179 @@
 from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
+from rest_framework import status
 from django.utils.dateparse import parse_datetime
+import json
+import math
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from app.models.models_telemetry import Telemetry
 from app.models.models_alarm import Alert
-from app.serializers.serializers_telemetry import TelemetrySerializer
+from app.models.models_occupancy import OccupancySnapshot
+from app.models.models_beacon import Beacon
+from app.models.models_zone import Zone
+from app.models.models_incident import Incident
+from app.serializers.serializers_telemetry import TelemetrySerializer, archived_telemetry
 from app.serializers.serializers_alarm import AlertSerializer
+from app.serializers.serializers_beacon import BeaconSerializer
+from app.serializers.serializers_zone import ZoneSerializer
+from app.serializers.serializers_incident import IncidentSerializer
+from app.pipeline.stage_spatial import cells_within
+from app.archive import columnar
+from app.history_cache import cached_history
+from app.resample import parse_fill, resample, resample_telemetry
+from app.conditional import ALERT_EXTRA, conditional_history
+from app.timing import phase
 
-@api_view(['GET'])
-def telemetry_list(request):
-    start_time = request.GET.get('start_time')
-    end_time = request.GET.get('end_time')
+TRACK_FIELDS = ('timestamp', 'x', 'y', 'z', 'floor')
+
+# Wszystko, czego dotyka TelemetrySerializer - bez tego serializacja robi zapytanie na każdą relację każdej ramki
+TELEMETRY_RELATED = (
+    'firefighter', 'position', 'position__trilateration', 'position__trilateration__raw_position',
+    'position__trilateration__filtered_position', 'position__drift', 'position__gps',
+    'imu', 'imu__accel', 'imu__gyro', 'imu__mag', 'imu__orientation',
+    'pass_status', 'barometer', 'vitals', 'scba', 'scba__alarms', 'recco', 'black_box', 'device',
+)
+TELEMETRY_PREFETCH = ('uwb_measurements',)
+ALERT_RELATED = ('firefighter', 'position', 'details')
+
+def telemetry_history(request):
+    """
+    Wspólne filtry historii telemetrii. Zwraca queryset ramek w bazie
+    oraz te same filtry w postaci argumentów dla `columnar.read` (archiwum).
+    """
+    start_dt = parse_datetime(request.GET.get('start_time') or '')
+    end_dt = parse_datetime(request.GET.get('end_time') or '')
     firefighter = request.GET.get('firefighter')
+    tag = request.GET.get('tag')
+    floor = request.GET.get('floor')
+    session = request.GET.get('session')
+    archive = {'start': start_dt, 'end': end_dt, 'firefighter': firefighter, 'tag_id': tag}
 
     queryset = Telemetry.objects.all()
+    if session is not None and session.isdigit():
+        queryset = queryset.filter(incident_id=int(session))
+        archive['incident'] = int(session)
 
-    if start_time:
-        start_dt = parse_datetime(start_time)
-        if start_dt:
-            queryset = queryset.filter(timestamp__gte=start_dt)
-    if end_time:
-        end_dt = parse_datetime(end_time)
-        if end_dt:
-            queryset = queryset.filter(timestamp__lte=end_dt)
+    if start_dt:
+        queryset = queryset.filter(timestamp__gte=start_dt)
+    if end_dt:
+        queryset = queryset.filter(timestamp__lte=end_dt)
     if firefighter:
         queryset = queryset.filter(
             Q(firefighter__name__icontains=firefighter) |
             Q(tag_id__icontains=firefighter)
         )
+    if tag:
+        queryset = queryset.filter(tag_id=tag)
+    if floor is not None and floor.lstrip('-').isdigit():
+        queryset = queryset.filter(position__floor=int(floor))
+        archive['floor'] = int(floor)
+    return queryset, archive
+
+
+def archived_history(archive):
+    """Rekordy archiwum dla historii - tylko z zakresem czasu, akcją albo tagiem, inaczej trzeba by wczytać każdy plik."""
+    if not (archive['start'] or archive['end'] or archive['tag_id'] or archive.get('incident') is not None):
+        return iter(())
+    return columnar.read(**archive)
 
+
+@api_view(['GET'])
+@conditional_history(telemetry_history)
+@cached_history('telemetry')
+def telemetry_list(request):
+    """
+    Historia telemetrii. Ramki z archiwum (w kształcie TelemetrySerializer, `archived: true`)
+    poprzedzają ramki z bazy - archiwum tylko przy zakresie czasu (start_time/end_time),
+    akcji (session) albo tagu (tag). Z ?fill=hold|linear&step=<s> ramki każdego tagu są
+    odtwarzane na regularnej siatce (przy INGEST_DEADBAND w bazie są tylko ramki ze zmianą).
+    """
+    try:
+        fill, step = parse_fill(request.GET)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    queryset, archive = telemetry_history(request)
+    queryset = queryset.select_related(*TELEMETRY_RELATED).prefetch_related(*TELEMETRY_PREFETCH)
     serializer = TelemetrySerializer(queryset, many=True)
-    return Response(serializer.data)
+    archived = archived_telemetry(archived_history(archive))
+    with phase('serialize'):
+        data = archived + serializer.data
+        if fill:
+            try:
+                data = resample_telemetry(data, step, fill, settings.TRACK_FILL_MAX_POINTS)
+            except ValueError as e:
+                return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
 
 
 @api_view(['GET'])
-def alert_list(request):
+@conditional_history(telemetry_history)
+@cached_history('track')
+def track_list(request):
+    """
+    Trasa tagu (?tag=, opcjonalnie zakres czasu / akcja / piętro) - archiwum i baza razem.
+    Z ?fill=hold|linear&step=<s> punkty są odtwarzane na regularnej siatce (app/resample.py).
+    """
+    if not request.GET.get('tag'):
+        return Response({'detail': "Wymagany parametr tag"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fill, step = parse_fill(request.GET)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    queryset, archive = telemetry_history(request)
+
+    points = [
+        {key: record[key] for key in TRACK_FIELDS}
+        for record in columnar.read(**archive)
+    ]
+    with phase('serialize'):
+        points += [
+            {'timestamp': ts.isoformat(), 'x': x, 'y': y, 'z': z, 'floor': floor}
+            for ts, x, y, z, floor in queryset.order_by('timestamp').values_list(
+                'timestamp', 'position__x', 'position__y', 'position__z', 'position__floor')
+        ]
+    if fill:
+        try:
+            points = resample(points, step, fill, settings.TRACK_FILL_MAX_POINTS)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'tag_id': request.GET['tag'], 'points': points})
+
+
+@api_view(['GET'])
+def telemetry_export(request):
+    """
+    Eksport NDJSON płaskich rekordów (te same filtry co historia). Strumieniowo:
+    najpierw archiwum, potem baza, w obu przypadkach tag po tagu według czasu.
+    """
+    queryset, archive = telemetry_history(request)
+
+    def lines():
+        for record in columnar.read(**archive):
+            yield json.dumps(record) + '\n'
+        rows = queryset.order_by('tag_id', 'timestamp').values_list(*columnar.FLAT_VALUES)
+        for row in rows.iterator(chunk_size=2000):
+            yield json.dumps(columnar.flat_record(row)) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+def alert_history(request):
     start_time = request.GET.get('start_time')
     end_time = request.GET.get('end_time')
     firefighter = request.GET.get('firefighter')
+    session = request.GET.get('session')
 
     queryset = Alert.objects.all()
+    if session is not None and session.isdigit():
+        queryset = queryset.filter(incident_id=int(session))
 
     if start_time:
         start_dt = parse_datetime(start_time)
@@ -56,6 +189,285 @@ def alert_list(request):
             Q(firefighter__name__icontains=firefighter) |
             Q(tag_id__icontains=firefighter)
         )
+    return queryset, None
+
+
+@api_view(['GET'])
+@conditional_history(alert_history, ALERT_EXTRA)
+@cached_history('alerts')
+def alert_list(request):
+    queryset, _ = alert_history(request)
+    serializer = AlertSerializer(queryset.select_related(*ALERT_RELATED), many=True)
+    with phase('serialize'):
+        data = serializer.data
+    return Response(data)
+
+
+# Przeskok po indeksie (tag_id, timestamp): kolejny tag to MIN(tag_id) > poprzedni,
+# ostatnia ramka tagu to pierwszy wpis indeksu od końca - jedno zejście po indeksie na tag
+LATEST_IDS_SQL = """
+    WITH RECURSIVE tags(tag_id) AS (
+        SELECT MIN(tag_id) FROM {table}
+        UNION ALL
+        SELECT (SELECT MIN(t.tag_id) FROM {table} t WHERE t.tag_id > tags.tag_id)
+        FROM tags WHERE tags.tag_id IS NOT NULL
+    )
+    SELECT (SELECT t.id FROM {table} t WHERE t.tag_id = tags.tag_id ORDER BY t.timestamp DESC LIMIT 1)
+    FROM tags WHERE tags.tag_id IS NOT NULL
+"""
+
+
+def latest_telemetry():
+    """
+    Ostatnia zapisana ramka telemetrii każdego tagu. Tagi i ich ostatnie ramki
+    bierzemy z indeksu (tag_id, timestamp) - bez grupowania całej tabeli telemetrii
+    przy każdym odpytaniu stanu, także dla tagów spoza ingestu (import, stare dane).
+    """
+    latest_ids = RawSQL(LATEST_IDS_SQL.format(table=Telemetry._meta.db_table), [])
+    return Telemetry.objects.filter(id__in=latest_ids).select_related(
+        *TELEMETRY_RELATED).prefetch_related(*TELEMETRY_PREFETCH)
+
+
+@api_view(['GET'])
+def state_list(request):
+    """Bieżący stan akcji: ostatnia zapisana ramka telemetrii każdego tagu."""
+    serializer = TelemetrySerializer(latest_telemetry(), many=True)
+    with phase('serialize'):
+        data = serializer.data
+    return Response(data)
+
 
-    serializer = AlertSerializer(queryset, many=True)
+@api_view(['GET'])
+def occupancy_heatmap(request):
+    """
+    Siatka czasu przebywania [s] na piętrze w zadanym przedziale czasu,
+    zsumowana z migawek interwałowych. Opcjonalnie wycinek x_min..x_max, y_min..y_max.
+    """
+    floor = request.GET.get('floor')
+    if floor is None or not floor.lstrip('-').isdigit():
+        return Response({'error': 'Parametr floor jest wymagany'}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = OccupancySnapshot.objects.filter(floor=int(floor)).order_by('start')
+    start_dt = parse_datetime(request.GET.get('start_time') or '')
+    end_dt = parse_datetime(request.GET.get('end_time') or '')
+    if start_dt:
+        queryset = queryset.filter(end__gt=start_dt)
+    if end_dt:
+        queryset = queryset.filter(start__lt=end_dt)
+
+    grid = None
+    first = None
+    snapshots = 0
+    for snapshot in queryset:
+        if grid is None:
+            first = snapshot
+            grid = snapshot.decode().astype('float64')
+        elif (snapshot.rows, snapshot.cols, snapshot.origin_x, snapshot.origin_y, snapshot.cell_size_m) == (
+                *grid.shape, first.origin_x, first.origin_y, first.cell_size_m):
+            grid += snapshot.decode()
+        else:
+            # Siatka o innej geometrii (zmienione ustawienia HEATMAP_*) - pomijana
+            continue
+        snapshots += 1
+    if grid is None:
+        return Response({'floor': int(floor), 'snapshots': 0, 'grid': []})
+
+    cell = first.cell_size_m
+    row_min, col_min = 0, 0
+    row_max, col_max = grid.shape
+    try:
+        if request.GET.get('x_min'):
+            col_min = max(0, int((float(request.GET['x_min']) - first.origin_x) // cell))
+        if request.GET.get('x_max'):
+            col_max = min(col_max, int((float(request.GET['x_max']) - first.origin_x) // cell) + 1)
+        if request.GET.get('y_min'):
+            row_min = max(0, int((float(request.GET['y_min']) - first.origin_y) // cell))
+        if request.GET.get('y_max'):
+            row_max = min(row_max, int((float(request.GET['y_max']) - first.origin_y) // cell) + 1)
+    except ValueError:
+        return Response({'error': 'Niepoprawne granice wycinka'}, status=status.HTTP_400_BAD_REQUEST)
+
+    region = grid[row_min:row_max, col_min:col_max]
+    return Response({
+        'floor': int(floor),
+        'snapshots': snapshots,
+        'cell_size_m': cell,
+        'origin': {'x': first.origin_x + col_min * cell, 'y': first.origin_y + row_min * cell},
+        'rows': region.shape[0],
+        'cols': region.shape[1],
+        'total_dwell_s': float(region.sum()),
+        'grid': region.round(2).tolist(),
+    })
+
+
+def parse_float(request, name, default=None):
+    value = request.GET.get(name)
+    if value is None or value == '':
+        return default
+    return float(value)
+
+
+@api_view(['GET'])
+def proximity_list(request):
+    """
+    Strażacy, którzy w przedziale czasu byli w promieniu `radius` od punktu (x, y) na piętrze `floor`.
+    Kandydaci wybierani są z indeksu (floor, cell, timestamp), dystans liczony dokładnie.
+    """
+    try:
+        x, y = parse_float(request, 'x'), parse_float(request, 'y')
+        radius = min(parse_float(request, 'radius', 5.0), settings.PROXIMITY_MAX_RADIUS_M)
+        floor = int(request.GET['floor'])
+    except (KeyError, TypeError, ValueError):
+        return Response({'error': 'Wymagane parametry: x, y, floor (opcjonalnie radius)'}, status=status.HTTP_400_BAD_REQUEST)
+    if x is None or y is None:
+        return Response({'error': 'Wymagane parametry: x, y, floor (opcjonalnie radius)'}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = Telemetry.objects.filter(floor=floor, cell__in=cells_within(x, y, radius))
+    start_dt = parse_datetime(request.GET.get('start_time') or '')
+    end_dt = parse_datetime(request.GET.get('end_time') or '')
+    if start_dt:
+        queryset = queryset.filter(timestamp__gte=start_dt)
+    if end_dt:
+        queryset = queryset.filter(timestamp__lte=end_dt)
+
+    found = {}
+    for tag_id, firefighter_id, name, timestamp, px, py in queryset.values_list(
+        'tag_id', 'firefighter_id', 'firefighter__name', 'timestamp', 'position__x', 'position__y',
+    ):
+        distance = math.hypot(px - x, py - y)
+        if distance > radius:
+            continue
+        entry = found.get(tag_id)
+        if entry is None:
+            found[tag_id] = {
+                'tag_id': tag_id, 'firefighter_id': firefighter_id, 'firefighter_name': name,
+                'min_distance_m': distance, 'first_seen': timestamp, 'last_seen': timestamp, 'samples': 1,
+            }
+        else:
+            entry['min_distance_m'] = min(entry['min_distance_m'], distance)
+            entry['first_seen'] = min(entry['first_seen'], timestamp)
+            entry['last_seen'] = max(entry['last_seen'], timestamp)
+            entry['samples'] += 1
+
+    return Response(sorted(found.values(), key=lambda e: e['min_distance_m']))
+
+
+@api_view(['GET'])
+def nearest_firefighter(request):
+    """
+    Najbliższy strażak (na tym samym piętrze) do ostatniej pozycji tagu `tag_id`.
+    Promień przeszukiwanych komórek rośnie, aż najbliższy kandydat leży w jego zasięgu.
+    Kandydaci to tagi widziane w komórkach; liczy się ich ostatnia pozycja w oknie czasu,
+    nawet jeśli leży już poza przeszukanym obszarem (strażak odszedł).
+    """
+    tag_id = request.GET.get('tag_id')
+    target = (
+        Telemetry.objects.filter(tag_id=tag_id).exclude(position=None)
+        .select_related('position').order_by('-timestamp').first()
+        if tag_id else None
+    )
+    if target is None:
+        return Response({'error': 'Nie znaleziono pozycji tagu'}, status=status.HTTP_404_NOT_FOUND)
+
+    x, y, floor = target.position.x, target.position.y, target.position.floor
+    window = Telemetry.objects.filter(
+        timestamp__gte=target.timestamp - timedelta(seconds=settings.NEAREST_MAX_AGE_S),
+        timestamp__lte=target.timestamp,
+    ).exclude(position=None)
+    radius = settings.SPATIAL_CELL_SIZE_M
+    latest = {}     # tag_id -> ostatnia pozycja w oknie (indeks tag_id, timestamp)
+    best = None
+
+    while radius <= settings.NEAREST_MAX_RADIUS_M:
+        seen = window.filter(floor=floor, cell__in=cells_within(x, y, radius)).exclude(tag_id=tag_id)
+        for other in set(seen.values_list('tag_id', flat=True).distinct()) - latest.keys():
+            latest[other] = window.filter(tag_id=other).order_by('-timestamp').values_list(
+                'firefighter_id', 'firefighter__name', 'timestamp', 'floor', 'position__x', 'position__y',
+            ).first()
+
+        for other, (firefighter_id, name, timestamp, other_floor, px, py) in latest.items():
+            distance = math.hypot(px - x, py - y)
+            if other_floor == floor and distance <= radius and (best is None or distance < best['distance_m']):
+                best = {
+                    'tag_id': other, 'firefighter_id': firefighter_id, 'firefighter_name': name,
+                    'distance_m': distance, 'position': {'x': px, 'y': py, 'floor': floor}, 'timestamp': timestamp,
+                }
+        if best is not None:
+            break
+        radius *= 2
+
+    return Response({
+        'target': {'tag_id': tag_id, 'position': {'x': x, 'y': y, 'floor': floor}, 'timestamp': target.timestamp},
+        'nearest': best,
+    })
+
+
+@api_view(['GET'])
+def beacon_list(request):
+    """Zarejestrowane beacony wraz ze statystykami liczonymi przy ingeście."""
+    queryset = Beacon.objects.all().order_by('id')
+    floor = request.GET.get('floor')
+    if floor is not None and floor.lstrip('-').isdigit():
+        queryset = queryset.filter(floor=int(floor))
+
+    serializer = BeaconSerializer(queryset, many=True)
+    return Response(serializer.data)
+
+
+@api_view(['GET', 'POST'])
+def zone_list(request):
+    """Strefy niebezpieczne / zastrzeżone (GET z opcjonalnym ?floor=, POST tworzy nową)."""
+    if request.method == 'POST':
+        serializer = ZoneSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = Zone.objects.all().order_by('floor', 'name')
+    floor = request.GET.get('floor')
+    if floor is not None and floor.lstrip('-').isdigit():
+        queryset = queryset.filter(floor=int(floor))
+
+    serializer = ZoneSerializer(queryset, many=True)
+    return Response(serializer.data)
+
+
+@api_view(['GET', 'POST'])
+def incident_list(request):
+    """
+    Akcje wraz z podsumowaniem (GET). POST ręcznie otwiera nową akcję,
+    zamykając bieżącą - listener zacznie do niej przypisywać ramki w ciągu INCIDENT_RELOAD_S.
+    """
+    if request.method == 'POST':
+        serializer = IncidentSerializer(data=request.data)
+        if serializer.is_valid():
+            now = timezone.now()
+            with transaction.atomic():
+                Incident.objects.filter(ended_at=None).update(ended_at=now)
+                serializer.save(started_at=now, last_activity_at=now, opened_manually=True)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = Incident.objects.all().order_by('-started_at')
+    if request.GET.get('open') == 'true':
+        queryset = queryset.filter(ended_at=None)
+
+    serializer = IncidentSerializer(queryset, many=True)
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+def incident_detail(request, pk):
+    serializer = IncidentSerializer(get_object_or_404(Incident, pk=pk))
     return Response(serializer.data)
+
+
+@api_view(['POST'])
+def incident_close(request, pk):
+    """Ręczne zamknięcie akcji. Kolejna telemetria otworzy nową akcję automatycznie."""
+    incident = get_object_or_404(Incident, pk=pk)
+    if incident.ended_at is None:
+        incident.ended_at = timezone.now()
+        incident.save(update_fields=['ended_at'])
+    return Response(IncidentSerializer(incident).data)
@@ -0,0 +1,253 @@
+# app/views_async.py
+"""
+Asynchroniczne wersje endpointów odczytu (do uruchamiania pod ASGI).
+
+DRF nie obsługuje widoków async, więc są to zwykłe widoki Django z tymi samymi
+filtrami co wersje synchroniczne (`telemetry_history` / `alert_history`).
+Wiersze pobierane są porcjami przez `aiterator()` i od razu wysyłane jako
+odpowiedź strumieniowa - wątek zajęty jest tylko na czas pobrania porcji,
+a między porcjami pętla zdarzeń obsługuje inne żądania (np. /state).
+Serializacja to praca CPU (pod GIL), więc naraz obsługiwanych jest co najwyżej
+ASYNC_HISTORY_CONCURRENCY strumieni - pozostałe czekają w kolejce bez zajmowania
+wątku, a krótkie zapytania nie muszą dzielić procesora z każdym z nich.
+Odpowiedzi strumieniowe nie trafiają do cache historii (nie są składane w pamięci),
+ale walidatory ETag / Last-Modified działają tak samo jak w wersji synchronicznej.
+"""
+import asyncio
+import itertools
+import json
+import weakref
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from rest_framework.utils.encoders import JSONEncoder
+
+from app.archive import columnar
+from app.conditional import ALERT_EXTRA, validators
+from app.resample import parse_fill, resample, resample_telemetry
+from app.serializers.serializers_alarm import AlertSerializer
+from app.serializers.serializers_telemetry import TelemetrySerializer, archived_telemetry
+from app.timing import phase
+from app.views import (
+    ALERT_RELATED, TELEMETRY_PREFETCH, TELEMETRY_RELATED, TRACK_FIELDS, alert_history, archived_history,
+    latest_telemetry, telemetry_history,
+)
+
+CHUNK_SIZE = 500
+SLICE_SIZE = 50
+
+# Jak JSONRenderer DRF (kompaktowo, UTF-8 bez escapowania)
+encoder = JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+_slots = weakref.WeakKeyDictionary()
+
+
+def history_slots():
+    """Semafor strumieni historii (osobny dla każdej pętli zdarzeń)."""
+    loop = asyncio.get_running_loop()
+    slots = _slots.get(loop)
+    if slots is None:
+        slots = _slots[loop] = asyncio.Semaphore(settings.ASYNC_HISTORY_CONCURRENCY)
+    return slots
+
+
+async def limited(body):
+    """
+    Miejsce w semaforze zajmowane tylko na czas przygotowania kolejnego kawałka, a nie
+    wysyłki - wolny klient nie blokuje innych strumieni, gdy serwer czeka na jego odbiór.
+    """
+    slots = history_slots()
+    try:
+        while True:
+            async with slots:
+                try:
+                    part = await anext(body)
+                except StopAsyncIteration:
+                    return
+            yield part
+    finally:
+        await body.aclose()
+
+
+async def not_modified(request, queryset, archive=None, extra=None):
+    """
+    (odpowiedź 304 albo None, nagłówki walidatorów do dołączenia). Widoki async
+    odpowiadają tylko JSON-em - ETag jak dla ?format=json w wersji synchronicznej.
+    """
+    etag, last_modified = await sync_to_async(validators)(queryset, archive, extra, 'json')
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if timestamp is not None:
+        headers['Last-Modified'] = http_date(timestamp)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        for name, value in headers.items():
+            response[name] = value
+    return response, headers
+
+
+async def json_array(records, rows, serialize):
+    """Tablica JSON wysyłana porcjami: najpierw gotowe rekordy, potem wiersze z `aiterator`."""
+    yield '['
+    separator = ''
+    for record in records:
+        yield separator + encoder.encode(record)
+        separator = ','
+    batch = []
+    async for row in rows:
+        with phase('serialize'):
+            batch.append(encoder.encode(serialize(row)))
+        if len(batch) >= SLICE_SIZE:
+            yield separator + ','.join(batch)
+            separator, batch = ',', []
+            # Serializacja zajmuje pętlę zdarzeń - oddajemy ją innym żądaniom po każdym kawałku
+            await asyncio.sleep(0)
+    if batch:
+        yield separator + ','.join(batch)
+    yield ']'
+
+
+async def value_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """
+    Krotki jak z `values_list(*fields)`. `values_list().aiterator()` wykonuje zapytanie
+    jeszcze w kontekście async (SynchronousOnlyOperation), `values()` - już w wątku.
+    """
+    async for row in queryset.values(*fields).aiterator(chunk_size=chunk_size):
+        yield tuple(row[field] for field in fields)
+
+
+def read_archive(archive):
+    return list(columnar.read(**archive))
+
+
+def read_chunk(records, size=CHUNK_SIZE):
+    """Kolejna porcja generatora rekordów archiwum (w wątku - czyta pliki i bazę)."""
+    return list(itertools.islice(records, size))
+
+
+def read_archived_telemetry(archive):
+    return archived_telemetry(archived_history(archive))
+
+
+@require_GET
+async def telemetry_list(request):
+    """
+    Jak /api/telemetry/, ale strumieniowo: ramki z archiwum, potem ramki z bazy.
+    Z ?fill= ramki są odtwarzane na siatce w całości, więc odpowiedź nie jest strumieniowa.
+    """
+    try:
+        fill, step = parse_fill(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(json.dumps({'detail': str(e)}), content_type='application/json')
+    queryset, archive = telemetry_history(request)
+    response, headers = await not_modified(request, queryset, archive)
+    if response is not None:
+        return response
+    records = await sync_to_async(read_archived_telemetry)(archive)
+    rows = (queryset.select_related(*TELEMETRY_RELATED).prefetch_related(*TELEMETRY_PREFETCH)
+            .aiterator(chunk_size=CHUNK_SIZE))
+    # Jeden serializer na całe żądanie - budowanie pól zagnieżdżonych na każdy wiersz jest kosztowne
+    serialize = TelemetrySerializer().to_representation
+    if fill:
+        records += [serialize(row) async for row in rows]
+        try:
+            with phase('serialize'):
+                records = resample_telemetry(records, step, fill, settings.TRACK_FILL_MAX_POINTS)
+        except ValueError as e:
+            return HttpResponseBadRequest(json.dumps({'detail': str(e)}), content_type='application/json')
+        return HttpResponse(encoder.encode(records), content_type='application/json', headers=headers)
+    body = json_array(records, rows, serialize)
+    return StreamingHttpResponse(limited(body), content_type='application/json', headers=headers)
+
+
+@require_GET
+async def track_list(request):
+    """
+    Jak /api/track/ - obiekt {tag_id, points}, z punktami wysyłanymi porcjami.
+    Z ?fill= trasa jest odtwarzana na siatce w całości, więc odpowiedź nie jest strumieniowa.
+    """
+    tag = request.GET.get('tag')
+    if not tag:
+        return HttpResponseBadRequest(json.dumps({'detail': "Wymagany parametr tag"}), content_type='application/json')
+    try:
+        fill, step = parse_fill(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(json.dumps({'detail': str(e)}), content_type='application/json')
+    queryset, archive = telemetry_history(request)
+    response, headers = await not_modified(request, queryset, archive)
+    if response is not None:
+        return response
+    records = [{key: record[key] for key in TRACK_FIELDS} for record in await sync_to_async(read_archive)(archive)]
+    rows = value_rows(queryset.order_by('timestamp'),
+                      ('timestamp', 'position__x', 'position__y', 'position__z', 'position__floor'))
+
+    def point(row):
+        ts, x, y, z, floor = row
+        return {'timestamp': ts.isoformat(), 'x': x, 'y': y, 'z': z, 'floor': floor}
+
+    if fill:
+        points = records + [point(row) async for row in rows]
+        try:
+            with phase('serialize'):
+                points = resample(points, step, fill, settings.TRACK_FILL_MAX_POINTS)
+        except ValueError as e:
+            return HttpResponseBadRequest(json.dumps({'detail': str(e)}), content_type='application/json')
+        return HttpResponse(encoder.encode({'tag_id': tag, 'points': points}), content_type='application/json',
+                            headers=headers)
+
+    async def body():
+        yield '{"tag_id":' + encoder.encode(tag) + ',"points":'
+        async for part in json_array(records, rows, point):
+            yield part
+        yield '}'
+
+    return StreamingHttpResponse(limited(body()), content_type='application/json', headers=headers)
+
+
+@require_GET
+async def telemetry_export(request):
+    """Jak /api/telemetry/export/ - NDJSON płaskich rekordów."""
+    queryset, archive = telemetry_history(request)
+
+    async def lines():
+        # Archiwum porcjami, jak w wersji synchronicznej - bez wczytywania go w całości
+        records = columnar.read(**archive)
+        while chunk := await sync_to_async(read_chunk)(records):
+            yield ''.join(json.dumps(record) + '\n' for record in chunk)
+        rows = value_rows(queryset.order_by('tag_id', 'timestamp'), columnar.FLAT_VALUES, chunk_size=2000)
+        batch = []
+        async for row in rows:
+            batch.append(json.dumps(columnar.flat_record(row)) + '\n')
+            if len(batch) >= CHUNK_SIZE:
+                yield ''.join(batch)
+                batch = []
+        if batch:
+            yield ''.join(batch)
+
+    return StreamingHttpResponse(limited(lines()), content_type='application/x-ndjson')
+
+
+@require_GET
+async def alert_list(request):
+    queryset, _ = alert_history(request)
+    response, headers = await not_modified(request, queryset, extra=ALERT_EXTRA)
+    if response is not None:
+        return response
+    rows = queryset.select_related(*ALERT_RELATED).aiterator(chunk_size=CHUNK_SIZE)
+    body = json_array([], rows, AlertSerializer().to_representation)
+    return StreamingHttpResponse(limited(body), content_type='application/json', headers=headers)
+
+
+@require_GET
+async def state_list(request):
+    """Jak /api/state/ - mała odpowiedź, bez strumieniowania."""
+    queryset = latest_telemetry()
+    serializer = TelemetrySerializer()
+    rows = [telemetry async for telemetry in queryset.aiterator(chunk_size=CHUNK_SIZE)]
+    with phase('serialize'):
+        data = [serializer.to_representation(telemetry) for telemetry in rows]
+    return HttpResponse(encoder.encode(data), content_type='application/json')
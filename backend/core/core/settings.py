@@ -10,12 +10,31 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def load_env(path):
+    """Wczytuje KLUCZ=wartość z pliku .env (bez nadpisywania zmiennych już ustawionych)."""
+    if not path.exists():
+        return
+    for line in path.read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if line and not line.startswith('#') and '=' in line:
+            key, value = line.split('=', 1)
+            os.environ.setdefault(key.strip(), value.strip().strip('"\''))
+
+
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+load_env(BASE_DIR.parent / '.env')
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
 
@@ -48,6 +67,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'app.middleware.TimingMiddleware',
+    'app.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,13 +101,73 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Backend wybierany zmienną DB_ENGINE (sqlite | postgres), patrz backend/.env.example
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DB_POOL = env_bool('DB_POOL', False)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'telemetry'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Pula połączeń (psycopg_pool) wyklucza CONN_MAX_AGE - wtedy połączenia trzyma pula
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    # WAL: listener pisze, a API czyta równolegle bez "database is locked".
+    # IMMEDIATE: transakcja zapisu od razu bierze blokadę, zamiast wywracać się przy jej podnoszeniu.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT_S', 20)),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join([
+                    f"PRAGMA journal_mode={'WAL' if env_bool('SQLITE_WAL', True) else 'DELETE'}",
+                    f"PRAGMA synchronous={os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+                    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+                    "PRAGMA temp_store=MEMORY",
+                ]),
+            },
+        }
     }
+
+# Cache: 'history' - wyniki endpointów historii (LRU w pamięci procesu API),
+# 'generations' - liczniki generacji podbijane przez listener (na dysku, wspólne dla procesów)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'history': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'history',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 256, 'CULL_FREQUENCY': 8},
+    },
+    'generations': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'generations',
+        'TIMEOUT': None,
+    },
 }
 
+# Zapis paczek telemetrii przez COPY zamiast INSERT (tylko PostgreSQL, app/pipeline/bulk.py)
+DB_BULK_COPY = DB_ENGINE == 'postgres' and env_bool('DB_BULK_COPY', True)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -123,3 +204,152 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+
+# Telemetry ingest
+# Listener buforuje ramki i zapisuje je paczkami co INGEST_FLUSH_INTERVAL_S
+
+INGEST_FLUSH_INTERVAL_S = 0.5
+INGEST_MAX_BATCH_SIZE = 500
+INGEST_STORE_UWB_MEASUREMENTS = True    # zapis surowych pomiarów UWB przy każdej ramce
+INGEST_SHUTDOWN_TIMEOUT_S = 10          # czas na zapis buforów po SIGINT / SIGTERM
+
+# Tryb wieloprocesowy listenera (--workers N, app/pipeline/workers.py)
+INGEST_WORKER_QUEUE_SIZE = 10000        # ramek w kolejce jednego workera (potem backpressure)
+INGEST_WORKER_HEALTH_INTERVAL_S = 5
+INGEST_WORKER_STALL_S = 60              # worker bez heartbeatu dłużej jest restartowany
+
+# Filtr UKF pozycji (app/filters/ukf_filter.py)
+UKF_PROCESS_NOISE = 0.5                 # wariancja przyspieszenia [m^2/s^4]
+UKF_DEFAULT_MEASUREMENT_SIGMA_M = 0.3   # gdy ramka nie podaje accuracy_m
+UKF_MAX_GAP_S = 10.0                    # po dłuższej przerwie filtr startuje od nowa
+UKF_CONFIDENCE_SCALE_M = 2.0            # confidence = exp(-accuracy_m / skala)
+
+# Trilateracja UWB (app/filters/trilateration.py)
+TRILATERATION_MAX_ITERATIONS = 10
+TRILATERATION_TOLERANCE_M = 1e-3
+TRILATERATION_MIN_BEACONS = 3
+
+# Reguły alarmowe (app/pipeline/stage_rules.py)
+# Alert powstaje po przekroczeniu progu, a rozwiązuje się dopiero po powrocie za próg histerezy
+ALERT_MAN_DOWN_S = 30
+ALERT_MAN_DOWN_CLEAR_S = 5
+ALERT_SCBA_LOW_BAR = 60
+ALERT_SCBA_CRITICAL_BAR = 30
+ALERT_SCBA_HYSTERESIS_BAR = 10
+ALERT_HR_HIGH_BPM = 180
+ALERT_HR_LOW_BPM = 40
+ALERT_HR_HYSTERESIS_BPM = 10
+ALERT_TEMPERATURE_HIGH_C = 60.0
+ALERT_TEMPERATURE_HYSTERESIS_C = 5.0
+
+# Prognoza zapasu powietrza SCBA (app/pipeline/stage_scba.py)
+SCBA_CYLINDER_VOLUME_L = 6.8    # pojemność wodna butli
+SCBA_RESERVE_BAR = 0            # ciśnienie uznawane za "pustą" butlę
+SCBA_HALF_LIFE_S = 60.0         # okres półtrwania wag w regresji
+SCBA_REFILL_JUMP_BAR = 20       # skok ciśnienia w górę = nowa butla
+
+# Estymacja piętra (app/pipeline/stage_floor.py)
+FLOOR_HEIGHT_M = 3.2
+FLOOR_BARO_SIGMA_M = 1.0        # niepewność wysokości barometrycznej
+FLOOR_SMOOTHING_S = 2.0         # stała czasowa wygładzania wysokości
+FLOOR_HYSTERESIS = 0.15         # margines (w kondygnacjach) ponad połowę piętra
+FLOOR_DWELL_S = 2.0             # jak długo nowe piętro musi się utrzymać
+
+# Anomalie parametrów życiowych (app/pipeline/stage_vitals.py)
+VITALS_WINDOW_SAMPLES = 120     # efektywna długość okna bazy
+VITALS_WARMUP_SAMPLES = 30      # ile próbek zanim zaczniemy oceniać
+VITALS_Z_RAISE = 3.0
+VITALS_Z_CLEAR = 2.0
+VITALS_SUSTAIN_SAMPLES = 5      # ile kolejnych próbek poza normą = anomalia
+
+# Mapa zajętości pięter (app/pipeline/stage_occupancy.py)
+HEATMAP_ORIGIN = (0.0, 0.0)     # róg budynku [m]
+HEATMAP_WIDTH_M = 60.0
+HEATMAP_DEPTH_M = 40.0
+HEATMAP_CELL_SIZE_M = 1.0
+HEATMAP_INTERVAL_S = 60         # co ile zapisywana jest migawka siatki
+HEATMAP_MAX_DT_S = 5.0          # dłuższe przerwy między ramkami nie liczą się do czasu przebywania
+
+# Indeks przestrzenny i zapytania o sąsiedztwo (app/pipeline/stage_spatial.py)
+SPATIAL_CELL_SIZE_M = 2.0
+PROXIMITY_MAX_RADIUS_M = 50.0
+NEAREST_MAX_AGE_S = 30          # "teraz" = ostatnie ramki z tego okna
+NEAREST_MAX_RADIUS_M = 100.0
+
+# Statystyki beaconów (app/pipeline/stage_beacons.py)
+BEACON_STATS_WINDOW = 200       # efektywne okno średnich kroczących [pomiary]
+
+# Strefy / geofencing (app/pipeline/stage_zones.py)
+ZONE_INDEX_CELL_SIZE_M = 5.0
+ZONE_RELOAD_S = 10              # co ile sprawdzamy, czy strefy się zmieniły
+
+# Akcje / sesje (app/pipeline/stage_incident.py)
+INCIDENT_IDLE_CLOSE_S = 900     # akcja zamykana automatycznie po tylu sekundach bez telemetrii
+INCIDENT_RELOAD_S = 5           # co ile sprawdzamy, czy akcję otwarto / zamknięto ręcznie
+
+# Kompresja zapisu telemetrii filtrem deadband (app/pipeline/stage_deadband.py)
+# Ramka jest zapisywana po przekroczeniu którejś tolerancji, zmianie stanu albo co DEADBAND_MAX_INTERVAL_S
+INGEST_DEADBAND = env_bool('INGEST_DEADBAND', False)
+DEADBAND_MAX_INTERVAL_S = 5.0
+DEADBAND_POSITION_M = 0.5
+DEADBAND_HEART_RATE_BPM = 3
+DEADBAND_SKIN_TEMPERATURE_C = 0.2
+DEADBAND_SCBA_BAR = 5
+DEADBAND_TEMPERATURE_C = 1.0
+DEADBAND_BATTERY_PERCENT = 1
+TRACK_FILL_MAX_POINTS = 100000  # limit punktów trasy odtwarzanej na siatce (?fill=hold|linear&step=)
+
+# Retencja telemetrii (app/management/commands/prune_telemetry.py)
+RETENTION_RAW_HOURS = 24        # pełna rozdzielczość przez tyle godzin
+RETENTION_DOWNSAMPLE_S = 10     # później jedna ramka na tag na tyle sekund
+RETENTION_DELETE_DAYS = None    # po tylu dniach ramki są usuwane całkowicie (None = nigdy)
+RETENTION_BATCH_SIZE = 2000     # rekordów na transakcję
+RETENTION_BATCH_PAUSE_S = 0.05  # przerwa między paczkami
+RETENTION_INTERVAL_S = 3600     # tryb cykliczny (--loop)
+
+# Archiwum kolumnowe (app/archive/columnar.py, app/management/commands/archive_telemetry.py)
+ARCHIVE_DIR = BASE_DIR / 'archive'
+ARCHIVE_AFTER_DAYS = 7          # pełne dni starsze niż tyle trafiają do plików .npz
+
+# Admin dużych tabel (app/admin_paging.py): dokładny COUNT tylko do tylu wierszy
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Cache historii (app/history_cache.py)
+HISTORY_CACHE_SETTLE_S = 60     # zakres kończący się wcześniej niż tyle sekund temu jest niezmienny
+HISTORY_CACHE_MAX_ROWS = 20000  # większych wyników nie cache'ujemy
+
+# Widoki async (app/views_async.py)
+# Tyle strumieni historii serializuje się naraz w procesie, reszta czeka bez zajmowania wątku.
+# Serializacja jest ograniczona przez GIL - więcej nie zwiększa przepustowości, a spowalnia krótkie zapytania.
+ASYNC_HISTORY_CONCURRENCY = 1
+
+# Renderery i kompresja odpowiedzi (app/renderers.py, app/middleware.py)
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'app.renderers.ORJSONRenderer',
+        'app.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+RESPONSE_COMPRESSION_MIN_BYTES = 1024   # mniejszych odpowiedzi nie kompresujemy
+RESPONSE_GZIP_LEVEL = 6
+RESPONSE_ZSTD_LEVEL = 3
+
+# Pomiary żądań API: Server-Timing, log 'app.timing', profile wolnych żądań (app/middleware.py)
+REQUEST_TIMING_PATH_PREFIX = '/api/'
+REQUEST_TIMING_LOG = env_bool('REQUEST_TIMING_LOG', False)    # linia JSON na żądanie; Server-Timing jest zawsze
+REQUEST_PROFILE_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILE_SAMPLE_RATE', 0))   # 0 = wyłączone
+REQUEST_PROFILE_SLOW_MS = 500   # zapisywane są tylko profile żądań dłuższych niż tyle
+REQUEST_PROFILE_DIR = BASE_DIR / 'profiles'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'app.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}